@@ -1,6 +1,43 @@
-from route_find import city_to_coordinates, osrm_route_100_points
-from weather_on_route import weather_for_route_to_numpy, COLUMN_NAMES
-from risk import score_route_risk
+import asyncio
+from datetime import date, datetime, time
+from concurrent.futures import Executor
+from typing import List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from route_find import (
+    city_to_coordinates,
+    osrm_route_100_points,
+    osrm_route_adaptive_points,
+    osrm_route_points_with_times,
+    osrm_route_alternatives,
+    resample_polylines_batch,
+    geometry_point_count,
+    polyline_length_m,
+    Coord,
+)
+from weather_on_route import (
+    weather_for_route_to_numpy,
+    weather_for_route_to_numpy_async,
+    weather_for_route_range_to_numpy,
+    weather_for_route_range_to_numpy_async,
+    weather_for_route_timed_to_numpy,
+    weather_for_route_timed_to_numpy_async,
+    date_range,
+    cell_index,
+    COLUMN_NAMES,
+)
+from risk import score_route_risk, score_routes_batch
+from geocode import normalise_place
+from weather_archive import get_weather_archive
+
+# Open-Meteo forecasts reach 16 days ahead
+MAX_WINDOW_DAYS = 16
+# Alternatives requested from OSRM on top of the primary route
+MAX_ALTERNATIVES = 2
+# Departure time assumed when only a ship date is given (UTC)
+DEFAULT_DEPARTURE_TIME = time(8, 0)
 
 
 def risk_level(score: int) -> str:
@@ -11,26 +48,294 @@ def risk_level(score: int) -> str:
     return "high"
 
 
-def run_analysis(ship_from_city: str, ship_to_city: str, ship_date: str) -> dict:
+def geocode_uk_city(city: str) -> Optional[Coord]:
     # Add country to reduce geocoding ambiguity
-    start_q = f"{ship_from_city}, United Kingdom"
-    end_q = f"{ship_to_city}, United Kingdom"
+    return city_to_coordinates(f"{city}, United Kingdom")
 
-    start = city_to_coordinates(start_q)
+
+def _geocode_pair(ship_from_city: str, ship_to_city: str) -> Tuple[Coord, Coord]:
+    start = geocode_uk_city(ship_from_city)
     if start is None:
-        raise ValueError(f"Could not geocode start city: {start_q}")
+        raise ValueError(f"Could not geocode start city: {ship_from_city}, United Kingdom")
 
-    end = city_to_coordinates(end_q)
+    end = geocode_uk_city(ship_to_city)
     if end is None:
-        raise ValueError(f"Could not geocode destination city: {end_q}")
+        raise ValueError(f"Could not geocode destination city: {ship_to_city}, United Kingdom")
+
+    return start, end
+
+
+def _result(score: int) -> dict:
+    return {
+        "risk_score": int(score),
+        "risk_level": risk_level(int(score)),
+    }
 
-    route_points = osrm_route_100_points(start, end, n_points=100)
+
+def route_key(ship_from_city: str, ship_to_city: str) -> str:
+    """Archive key for a city pair: normalised names, 'from|to'."""
+    return f"{normalise_place(ship_from_city)}|{normalise_place(ship_to_city)}"
+
+
+def archive_weather(records: List[Tuple[str, str, np.ndarray, int]]) -> None:
+    """
+    Append (route key, ship date, weather matrix, score) records to the
+    WEATHER_ARCHIVE_DIR archive for backtesting; no-op when it is not set.
+    A failed write is logged, never raised into the analysis.
+    """
+    archive = get_weather_archive()
+    if archive is None:
+        return
+    try:
+        for key, day, weather, score in records:
+            archive.append(key, day, weather, score)
+    except Exception as e:
+        print(f"Weather archive write failed: {e!r}")
+
+
+def sample_route(start: Coord, end: Coord, n_points: Optional[int] = None) -> List[Coord]:
+    # n_points=None: sample by route length (about one point per weather grid cell)
+    if n_points is None:
+        return osrm_route_adaptive_points(start, end)
+    return osrm_route_100_points(start, end, n_points=n_points)
+
+
+def run_analysis(ship_from_city: str, ship_to_city: str, ship_date: str, n_points: Optional[int] = None) -> dict:
+    start, end = _geocode_pair(ship_from_city, ship_to_city)
+
+    route_points = sample_route(start, end, n_points)
 
     weather_np = weather_for_route_to_numpy(route_points, ship_date)
 
     score = score_route_risk(weather_np, COLUMN_NAMES)
 
+    archive_weather([(route_key(ship_from_city, ship_to_city), ship_date, weather_np, score)])
+
+    return _result(score)
+
+
+async def run_analysis_async(
+    ship_from_city: str,
+    ship_to_city: str,
+    ship_date: str,
+    n_points: Optional[int] = None,
+    *,
+    client: Optional[httpx.AsyncClient] = None,
+    executor: Optional[Executor] = None,
+) -> dict:
+    """
+    Awaitable run_analysis for the API.
+
+    Geocoding and routing (blocking libraries) run in `executor` (default loop
+    executor); the weather fan-out runs on the event loop via the async engine,
+    reusing `client`'s connection pool when given. Cancelling the task stops
+    any outstanding weather requests.
+    """
+    loop = asyncio.get_running_loop()
+
+    start, end = await loop.run_in_executor(executor, _geocode_pair, ship_from_city, ship_to_city)
+
+    route_points = await loop.run_in_executor(executor, sample_route, start, end, n_points)
+
+    weather_np = await weather_for_route_to_numpy_async(route_points, ship_date, client=client)
+
+    score = score_route_risk(weather_np, COLUMN_NAMES)
+
+    if get_weather_archive() is not None:
+        record = (route_key(ship_from_city, ship_to_city), ship_date, weather_np, score)
+        await loop.run_in_executor(executor, archive_weather, [record])
+
+    return _result(score)
+
+
+def _window_days(start_date: str, end_date: str) -> list:
+    days = date_range(start_date, end_date)
+    if len(days) > MAX_WINDOW_DAYS:
+        raise ValueError(f"Departure window is limited to {MAX_WINDOW_DAYS} days")
+    return days
+
+
+def _window_result(days: list, scores) -> dict:
+    per_day = [{"date": d, **_result(int(s))} for d, s in zip(days, scores)]
+    best = min(per_day, key=lambda r: r["risk_score"])  # earliest day wins ties
     return {
-        "risk_score": int(score),
-        "risk_level": risk_level(int(score)),
+        "best_date": best["date"],
+        "risk_score": best["risk_score"],
+        "risk_level": best["risk_level"],
+        "days": per_day,
     }
+
+
+def run_departure_window_analysis(ship_from_city: str, ship_to_city: str, start_date: str, end_date: str) -> dict:
+    """
+    Score every departure day from start_date to end_date (inclusive) and pick the safest.
+
+    The route is geocoded/routed once, the weather for all days comes from one
+    multi-day fetch, and all days are scored in one score_routes_batch pass.
+    """
+    days = _window_days(start_date, end_date)
+    start, end = _geocode_pair(ship_from_city, ship_to_city)
+
+    route_points = sample_route(start, end)
+
+    weather_days = weather_for_route_range_to_numpy(route_points, start_date, end_date)
+
+    return _window_result(days, score_routes_batch(weather_days, COLUMN_NAMES))
+
+
+async def run_departure_window_analysis_async(
+    ship_from_city: str,
+    ship_to_city: str,
+    start_date: str,
+    end_date: str,
+    *,
+    client: Optional[httpx.AsyncClient] = None,
+    executor: Optional[Executor] = None,
+) -> dict:
+    """Awaitable run_departure_window_analysis (same split as run_analysis_async)."""
+    days = _window_days(start_date, end_date)
+    loop = asyncio.get_running_loop()
+
+    start, end = await loop.run_in_executor(executor, _geocode_pair, ship_from_city, ship_to_city)
+
+    route_points = await loop.run_in_executor(executor, sample_route, start, end)
+
+    weather_days = await weather_for_route_range_to_numpy_async(route_points, start_date, end_date, client=client)
+
+    return _window_result(days, score_routes_batch(weather_days, COLUMN_NAMES))
+
+
+def parse_departure(departure: str) -> datetime:
+    """
+    ISO departure 'YYYY-MM-DDTHH:MM[:SS][+00:00]' or plain 'YYYY-MM-DD'
+    (departing at DEFAULT_DEPARTURE_TIME UTC).
+    """
+    if len(departure.strip()) == 10:
+        return datetime.combine(date.fromisoformat(departure.strip()), DEFAULT_DEPARTURE_TIME)
+    return datetime.fromisoformat(departure.strip())
+
+
+def run_time_aware_analysis(ship_from_city: str, ship_to_city: str, departure: str) -> dict:
+    """
+    Like run_analysis, but each route point is scored against the hourly
+    forecast around the time the shipment is expected to reach it (OSRM
+    travel times from `departure`) instead of the calendar day's aggregate.
+    The TIMED_WINDOW_HOURS around each arrival are reduced to daily-equivalent
+    values, so scores are comparable with run_analysis.
+    """
+    dep = parse_departure(departure)
+    start, end = _geocode_pair(ship_from_city, ship_to_city)
+
+    route_points, offsets_s = osrm_route_points_with_times(start, end)
+
+    weather_np = weather_for_route_timed_to_numpy(route_points.tolist(), offsets_s, dep)
+
+    score = score_route_risk(weather_np, COLUMN_NAMES)
+
+    return {**_result(score), "departure": dep.isoformat(), "duration_s": float(offsets_s[-1])}
+
+
+async def run_time_aware_analysis_async(
+    ship_from_city: str,
+    ship_to_city: str,
+    departure: str,
+    *,
+    client: Optional[httpx.AsyncClient] = None,
+    executor: Optional[Executor] = None,
+) -> dict:
+    """Awaitable run_time_aware_analysis (same split as run_analysis_async)."""
+    dep = parse_departure(departure)
+    loop = asyncio.get_running_loop()
+
+    start, end = await loop.run_in_executor(executor, _geocode_pair, ship_from_city, ship_to_city)
+
+    route_points, offsets_s = await loop.run_in_executor(executor, osrm_route_points_with_times, start, end)
+
+    weather_np = await weather_for_route_timed_to_numpy_async(route_points.tolist(), offsets_s, dep, client=client)
+
+    score = score_route_risk(weather_np, COLUMN_NAMES)
+
+    return {**_result(score), "departure": dep.isoformat(), "duration_s": float(offsets_s[-1])}
+
+
+def _alternative_points(start: Coord, end: Coord, max_alternatives: int):
+    """
+    Resampled (routes, n_points, 2) points plus each route's (distance_m, duration_s).
+    n_points is the adaptive count of the longest route, so every route is
+    sampled at least as densely as the weather grid needs.
+    """
+    geoms = osrm_route_alternatives(start, end, max_alternatives=max_alternatives)
+    n_points = max(geometry_point_count(g) for g in geoms)
+    points = resample_polylines_batch([g[:, :2] for g in geoms], n_points)
+    meta = [(polyline_length_m(g), float(g[-1, 2])) for g in geoms]
+    return points, meta
+
+
+def _route_weather(points: np.ndarray, cell_weather: np.ndarray, inverse: np.ndarray) -> np.ndarray:
+    """Expand per-cell weather back to (routes, n_points, m), keeping each point's own lat/lon."""
+    weather = cell_weather[inverse].reshape(points.shape[0], points.shape[1], -1)
+    weather[..., :2] = points
+    return weather
+
+
+def _alternatives_result(scores, meta: List[Tuple[float, float]], n_lookups: int) -> dict:
+    routes = [
+        {"route": i, **_result(int(s)), "distance_km": round(d / 1000.0, 1), "duration_s": round(t)}
+        for i, (s, (d, t)) in enumerate(zip(scores, meta))
+    ]
+    best = min(routes, key=lambda r: r["risk_score"])  # primary route wins ties
+    return {
+        "best_route": best["route"],
+        "risk_score": best["risk_score"],
+        "risk_level": best["risk_level"],
+        "routes": routes,
+        "weather_lookups": n_lookups,
+    }
+
+
+def run_alternatives_analysis(
+    ship_from_city: str,
+    ship_to_city: str,
+    ship_date: str,
+    max_alternatives: int = MAX_ALTERNATIVES,
+) -> dict:
+    """
+    Score OSRM's primary route and its alternatives and pick the safest.
+
+    Alternatives usually share most of their length, so the resampled points
+    of all routes go through one grid-cell index (cell_index) and the weather
+    is fetched once per distinct cell. All routes are then scored together in
+    one score_routes_batch pass (same scoring as score_route_risk).
+    """
+    start, end = _geocode_pair(ship_from_city, ship_to_city)
+
+    points, meta = _alternative_points(start, end, max_alternatives)
+    reps, inverse = cell_index(points.reshape(-1, 2))
+
+    cell_weather = weather_for_route_to_numpy(reps, ship_date)
+
+    weather = _route_weather(points, cell_weather, inverse)
+    return _alternatives_result(score_routes_batch(weather, COLUMN_NAMES), meta, len(reps))
+
+
+async def run_alternatives_analysis_async(
+    ship_from_city: str,
+    ship_to_city: str,
+    ship_date: str,
+    max_alternatives: int = MAX_ALTERNATIVES,
+    *,
+    client: Optional[httpx.AsyncClient] = None,
+    executor: Optional[Executor] = None,
+) -> dict:
+    """Awaitable run_alternatives_analysis (same split as run_analysis_async)."""
+    loop = asyncio.get_running_loop()
+
+    start, end = await loop.run_in_executor(executor, _geocode_pair, ship_from_city, ship_to_city)
+
+    points, meta = await loop.run_in_executor(executor, _alternative_points, start, end, max_alternatives)
+    reps, inverse = cell_index(points.reshape(-1, 2))
+
+    cell_weather = await weather_for_route_to_numpy_async(reps, ship_date, client=client)
+
+    weather = _route_weather(points, cell_weather, inverse)
+    return _alternatives_result(score_routes_batch(weather, COLUMN_NAMES), meta, len(reps))
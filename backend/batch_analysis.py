@@ -0,0 +1,223 @@
+import io
+import sys
+import csv
+import json
+import asyncio
+import argparse
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from cleaner import clean_shipment
+from geocode import normalise_place
+from analysis_pipeline import geocode_uk_city, sample_route, risk_level, route_key, archive_weather
+from weather_archive import get_weather_archive
+from weather_on_route import weather_for_route_to_numpy_async, cell_index, make_async_client, COLUMN_NAMES
+from risk import score_routes_batch
+
+# Geocoding / routing calls in flight at once (blocking, run in the executor)
+BATCH_CONCURRENCY = 8
+# Ship dates whose weather is fetched at once (each fans out its own requests)
+BATCH_WEATHER_DATES = 2
+# Rows accepted per /analysis/batch request
+MAX_BATCH_ROWS = 1_000
+
+# Column aliases accepted in CSV headers / JSONL keys
+FIELD_ALIASES = {
+    "ship_from_city": ("ship_from_city", "from", "from_city", "origin"),
+    "ship_to_city": ("ship_to_city", "to", "to_city", "destination"),
+    "ship_date": ("ship_date", "date"),
+}
+
+PairKey = Tuple[str, str]  # normalised (from, to)
+
+
+def _canonical(row: Dict[str, Any]) -> Dict[str, Any]:
+    # JSONL values may be numbers ("date": 20260207); clean_shipment expects strings
+    lowered = {str(k).strip().lower(): (v if v is None else str(v)) for k, v in row.items()}
+    return {field: next((lowered[a] for a in aliases if lowered.get(a)), None) for field, aliases in FIELD_ALIASES.items()}
+
+
+def parse_shipments(text: str, fmt: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Rows of a CSV (with a header) or JSONL document as
+    {ship_from_city, ship_to_city, ship_date} dicts (raw, not yet cleaned).
+    `fmt` is "csv" or "jsonl"; by default it is sniffed from the first character.
+    """
+    text = text.lstrip("\ufeff")
+    if fmt is None:
+        fmt = "jsonl" if text.lstrip().startswith("{") else "csv"
+
+    if fmt == "jsonl":
+        rows = []
+        for n, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {n}: invalid JSON ({e.msg})")
+            if not isinstance(obj, dict):
+                raise ValueError(f"line {n}: expected a JSON object")
+            rows.append(_canonical(obj))
+        return rows
+    if fmt == "csv":
+        return [_canonical(r) for r in csv.DictReader(io.StringIO(text))]
+    raise ValueError(f"Unknown shipment format: {fmt}")
+
+
+def _row_result(index: int, shipment: Dict[str, Any], score: Optional[int] = None, error: Optional[str] = None) -> dict:
+    out = {"index": index, **shipment, "risk_score": None, "risk_level": None, "error": error}
+    if score is not None:
+        out["risk_score"] = int(score)
+        out["risk_level"] = risk_level(int(score))
+    return out
+
+
+async def analyse_shipments(
+    rows: Iterable[Dict[str, Any]],
+    *,
+    client: Optional[httpx.AsyncClient] = None,
+    executor: Optional[Executor] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    weather_dates: int = BATCH_WEATHER_DATES,
+) -> AsyncIterator[dict]:
+    """
+    Score many shipments with the run_analysis building blocks, sharing work across rows.
+
+    Stages, each de-duplicated and bounded:
+      1. geocode each distinct city once (`concurrency` at a time)
+      2. route each distinct city pair once (`concurrency` at a time)
+      3. per ship date, fetch weather once per distinct grid cell over all of
+         that date's routes and score them in one score_routes_batch pass
+         (`weather_dates` dates at a time)
+    Yields one result dict per input row (with its input `index`) as soon as
+    its date is scored, so results arrive out of order. Rows that fail get
+    `error` set instead of a score.
+    """
+    if concurrency < 1 or weather_dates < 1:
+        raise ValueError("concurrency and weather_dates must be >= 1")
+
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+
+    shipments: List[Tuple[int, Dict[str, Any]]] = []
+    for i, row in enumerate(rows):
+        s = clean_shipment(row)
+        if not (s["ship_from_city"] and s["ship_to_city"] and s["ship_date"]):
+            yield _row_result(i, s, error="Row needs ship_from_city, ship_to_city and a valid ship_date")
+            continue
+        shipments.append((i, s))
+    if not shipments:
+        return
+
+    def pair_key(s: Dict[str, Any]) -> PairKey:
+        return (normalise_place(s["ship_from_city"]), normalise_place(s["ship_to_city"]))
+
+    async def in_executor(fn, *args):
+        async with sem:
+            return await loop.run_in_executor(executor, fn, *args)
+
+    # 1. Geocoding: one lookup per distinct city
+    cities: Dict[str, str] = {}
+    for _, s in shipments:
+        for city in (s["ship_from_city"], s["ship_to_city"]):
+            cities.setdefault(normalise_place(city), city)
+    found = await asyncio.gather(*(in_executor(geocode_uk_city, c) for c in cities.values()), return_exceptions=True)
+    coords = {k: c for k, c in zip(cities, found) if isinstance(c, tuple)}
+
+    # 2. Routing: one route per distinct (from, to)
+    pairs = list(dict.fromkeys(pair_key(s) for _, s in shipments if all(k in coords for k in pair_key(s))))
+    routed = await asyncio.gather(
+        *(in_executor(sample_route, coords[a], coords[b]) for a, b in pairs), return_exceptions=True
+    )
+    routes: Dict[PairKey, Any] = dict(zip(pairs, routed))
+
+    by_date: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    for i, s in shipments:
+        a, b = pair_key(s)
+        if a not in coords or b not in coords:
+            missing = s["ship_from_city"] if a not in coords else s["ship_to_city"]
+            yield _row_result(i, s, error=f"Could not geocode city: {missing}, United Kingdom")
+        elif isinstance(routes[(a, b)], Exception):
+            yield _row_result(i, s, error=f"Routing failed: {routes[(a, b)]}")
+        else:
+            by_date.setdefault(s["ship_date"], []).append((i, s))
+
+    # 3. Weather + scoring: one fetch per distinct (cell, date)
+    date_slots = asyncio.Semaphore(weather_dates)
+    owns_client = client is None
+    if owns_client:
+        client = make_async_client()
+
+    async def score_date(day: str, items: List[Tuple[int, Dict[str, Any]]]):
+        day_pairs = list(dict.fromkeys(pair_key(s) for _, s in items))
+        points = [np.asarray(routes[p], dtype=np.float64) for p in day_pairs]
+        offsets = np.concatenate(([0], np.cumsum([len(p) for p in points]))).astype(np.int64)
+        stacked = np.concatenate(points, axis=0)
+        reps, inverse = cell_index(stacked)
+        try:
+            async with date_slots:
+                cell_weather = await weather_for_route_to_numpy_async(reps, day, client=client)
+        except Exception as e:
+            return items, None, f"Weather fetch failed: {e!r}"
+        weather = cell_weather[inverse]
+        weather[:, :2] = stacked
+        scores = score_routes_batch(weather, COLUMN_NAMES, offsets=offsets)
+        if get_weather_archive() is not None:
+            records = [
+                (route_key(*p), day, weather[offsets[r] : offsets[r + 1]], int(scores[r]))
+                for r, p in enumerate(day_pairs)
+            ]
+            await loop.run_in_executor(executor, archive_weather, records)
+        return items, dict(zip(day_pairs, scores)), None
+
+    tasks = [asyncio.ensure_future(score_date(day, items)) for day, items in by_date.items()]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            items, scores, error = await fut
+            for i, s in items:
+                if scores is None:
+                    yield _row_result(i, s, error=error)
+                else:
+                    yield _row_result(i, s, score=scores[pair_key(s)])
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if owns_client:
+            await client.aclose()
+
+
+async def _run_cli(args: argparse.Namespace) -> int:
+    with open(args.input, encoding="utf-8") as f:
+        rows = parse_shipments(f.read(), args.format)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failed = 0
+    try:
+        async for result in analyse_shipments(rows, concurrency=args.concurrency):
+            failed += result["error"] is not None
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Scored {len(rows) - failed}/{len(rows)} shipments", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Score a CSV/JSONL of shipments (from, to, date); writes JSONL.")
+    parser.add_argument("input", help="CSV with a header row, or JSONL")
+    parser.add_argument("-o", "--output", help="JSONL output path (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="input format (default: sniffed)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    return asyncio.run(_run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
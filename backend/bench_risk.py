@@ -0,0 +1,368 @@
+import sys
+import json
+import time
+import argparse
+import platform
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from weather_on_route import COLUMN_NAMES
+from risk import score_route_risk, score_routes_batch
+
+FIXTURES_PATH = Path(__file__).resolve().parent / "data" / "risk_fixtures.json"
+
+# Route sizes (points per route) benchmarked by default
+BENCH_SIZES = (10, 100, 1_000, 10_000)
+# Points scored per size; routes per size = BENCH_POINTS // size
+BENCH_POINTS = 100_000
+# Timed runs per measurement (best run is reported)
+BENCH_REPEATS = 3
+# Single-route calls sampled for the latency percentiles
+LATENCY_SAMPLES = 200
+
+# Per-column uniform ranges (low, high) and weathercodes for each synthetic regime
+REGIMES: Dict[str, Dict[str, Any]] = {
+    "calm": {
+        "temp_min": (4, 14), "precip_mm": (0, 1), "precip_prob_max": (0, 30), "snowfall_mm": (0, 0),
+        "wind_speed_max": (5, 25), "wind_gusts_max": (10, 40), "visibility_min": (8000, 24000),
+        "weathercode": (0, 1, 2, 3),
+    },
+    "wet": {
+        "temp_min": (3, 12), "precip_mm": (4, 40), "precip_prob_max": (60, 100), "snowfall_mm": (0, 0),
+        "wind_speed_max": (15, 45), "wind_gusts_max": (30, 75), "visibility_min": (2000, 12000),
+        "weathercode": (51, 61, 63, 65, 80, 81),
+    },
+    "winter": {
+        "temp_min": (-8, 2), "precip_mm": (0, 10), "precip_prob_max": (20, 90), "snowfall_mm": (0, 30),
+        "wind_speed_max": (10, 40), "wind_gusts_max": (20, 65), "visibility_min": (800, 10000),
+        "weathercode": (45, 56, 66, 71, 73, 75, 85),
+    },
+    "storm": {
+        "temp_min": (5, 16), "precip_mm": (10, 60), "precip_prob_max": (80, 100), "snowfall_mm": (0, 0),
+        "wind_speed_max": (40, 90), "wind_gusts_max": (60, 130), "visibility_min": (500, 6000),
+        "weathercode": (82, 95, 96, 99),
+    },
+}
+
+
+def synthetic_weather(
+    n_points: int,
+    regime: str = "mixed",
+    rng: Optional[np.random.Generator] = None,
+    missing: float = 0.0,
+) -> np.ndarray:
+    """
+    A (n_points, COLUMN_NAMES) float64 weather matrix shaped like
+    weather_for_route_to_numpy output, drawn from one of REGIMES.
+
+    "mixed" strings together runs of random regimes (a route crossing
+    fronts). `missing` is the fraction of weather values set to NaN, as
+    when a point's lookup fails; lat/lon are never missing.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    ci = {name: i for i, name in enumerate(COLUMN_NAMES)}
+    out = np.empty((n_points, len(COLUMN_NAMES)), dtype=np.float64)
+
+    # Straight line across the UK
+    start = rng.uniform((50.0, -5.0), (55.0, 1.0))
+    end = rng.uniform((50.0, -5.0), (55.0, 1.0))
+    t = np.linspace(0.0, 1.0, n_points)[:, None]
+    out[:, [ci["lat"], ci["lon"]]] = start + (end - start) * t
+
+    if regime == "mixed":
+        labels = np.empty(n_points, dtype=object)
+        pos = 0
+        while pos < n_points:
+            run = int(rng.integers(1, max(2, n_points // 4) + 1))
+            labels[pos : pos + run] = rng.choice(list(REGIMES))
+            pos += run
+    elif regime in REGIMES:
+        labels = np.full(n_points, regime, dtype=object)
+    else:
+        raise ValueError(f"Unknown regime: {regime}")
+
+    for name in REGIMES:
+        rows = np.flatnonzero(labels == name)
+        if rows.size == 0:
+            continue
+        spec = REGIMES[name]
+        for col, bounds in spec.items():
+            if col == "weathercode":
+                out[rows, ci[col]] = rng.choice(bounds, size=rows.size)
+            else:
+                out[rows, ci[col]] = rng.uniform(bounds[0], bounds[1], size=rows.size)
+        out[rows, ci["temp_max"]] = out[rows, ci["temp_min"]] + rng.uniform(2, 10, size=rows.size)
+
+    if missing > 0:
+        values = out[:, 2:]
+        values[rng.random(values.shape) < missing] = np.nan
+    return out
+
+
+def fixture_routes(seed: int = 2026) -> List[Tuple[str, np.ndarray]]:
+    """Named routes for the recorded fixture set: every regime at a few sizes plus edge cases."""
+    rng = np.random.default_rng(seed)
+    routes = []
+    for regime in list(REGIMES) + ["mixed"]:
+        for n in (1, 7, 40):
+            routes.append((f"{regime}-{n}", synthetic_weather(n, regime, rng)))
+    routes.append(("mixed-missing-25", synthetic_weather(25, "mixed", rng, missing=0.3)))
+
+    all_nan = synthetic_weather(5, "calm", rng)
+    all_nan[:, 2:] = np.nan
+    routes.append(("all-missing-5", all_nan))
+
+    ci = {name: i for i, name in enumerate(COLUMN_NAMES)}
+    ice = synthetic_weather(12, "calm", rng)
+    ice[:, ci["temp_min"]] = -1.0
+    ice[:, ci["precip_mm"]] = 0.5
+    routes.append(("ice-12", ice))
+
+    # Risk concentrated in the top quarter: median and 75th percentile disagree
+    tail = synthetic_weather(16, "calm", rng)
+    tail[12:] = synthetic_weather(4, "storm", rng)
+    routes.append(("storm-tail-16", tail))
+    return routes
+
+
+def archive_routes(archive_dir: str, limit: int = 50) -> List[Tuple[str, np.ndarray]]:
+    """Recorded routes from a WeatherArchive (most recent `limit`), named route@date."""
+    from weather_archive import WeatherArchive
+
+    archive = WeatherArchive(archive_dir)
+    try:
+        return [
+            (f"{e['route_key']}@{e['date']}", np.array(archive.matrix(e), dtype=np.float64))
+            for e in archive.entries()[-limit:]
+        ]
+    finally:
+        archive.close()
+
+
+def _to_json_rows(weather: np.ndarray) -> List[List[Optional[float]]]:
+    return [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in weather]
+
+
+def _from_json_rows(rows: List[List[Optional[float]]]) -> np.ndarray:
+    return np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=np.float64).reshape(
+        len(rows), len(COLUMN_NAMES)
+    )
+
+
+def load_fixtures(path: Path = FIXTURES_PATH) -> List[Dict[str, Any]]:
+    """Fixture routes with their weather as float64 arrays and the recorded scores."""
+    doc = json.loads(Path(path).read_text(encoding="utf-8"))
+    if doc["columns"] != COLUMN_NAMES:
+        raise ValueError(f"{path} was recorded with columns {doc['columns']}")
+    return [{**r, "weather": _from_json_rows(r["weather"])} for r in doc["routes"]]
+
+
+def record_fixtures(path: Path, routes: List[Tuple[str, np.ndarray]], scorers: Dict[str, "Scorer"]) -> None:
+    """Write `routes` with every scorer's current scores as the new expected values."""
+    weathers = [np.round(w, 4) for _, w in routes]  # what the JSON round-trip will hold
+    expected = {name: s.score(weathers) for name, s in scorers.items()}
+    lines = [
+        json.dumps({"name": name, "expected": {k: int(v[i]) for k, v in expected.items()}, "weather": _to_json_rows(w)})
+        for i, ((name, _), w) in enumerate(zip(routes, weathers))
+    ]
+    # One route per line keeps fixture diffs reviewable
+    text = '{"columns": %s,\n "routes": [\n  %s\n ]}\n' % (json.dumps(COLUMN_NAMES), ",\n  ".join(lines))
+    Path(path).write_text(text, encoding="utf-8")
+
+
+def _ragged(routes: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.concatenate(([0], np.cumsum([len(w) for w in routes]))).astype(np.int64)
+    return np.ascontiguousarray(np.concatenate(routes, axis=0), dtype=np.float64), offsets
+
+
+class Scorer:
+    """
+    One scoring implementation: `prepare` turns a list of route matrices
+    into its input (untimed), `run` scores that input and returns one score
+    per route.
+    """
+
+    def __init__(self, name: str, prepare: Callable[[List[np.ndarray]], Any], run: Callable[[Any], Sequence[int]]):
+        self.name = name
+        self.prepare = prepare
+        self.run = run
+
+    def score(self, routes: List[np.ndarray]) -> np.ndarray:
+        return np.asarray(self.run(self.prepare(routes)), dtype=np.int64)
+
+
+def make_scorers(use_c: bool = True) -> Tuple[Dict[str, Scorer], Optional[str]]:
+    """
+    The implementations to compare, keyed by name, plus the reason the C
+    scorers are missing (None when they loaded):
+      python   risk.score_route_risk per route (median, max-combination)
+      batch    risk.score_routes_batch over the ragged matrix
+      c        c_risk.score_route_in_c per route (75th percentile, gamma 1.6, scale 0.75)
+      c_batch  c_risk.score_routes_in_c, one FFI call for all routes
+               (left out for a library built without the batch export)
+    """
+    scorers = {
+        "python": Scorer("python", list, lambda rs: [score_route_risk(w, COLUMN_NAMES) for w in rs]),
+        "batch": Scorer("batch", _ragged, lambda wo: score_routes_batch(wo[0], COLUMN_NAMES, offsets=wo[1])),
+    }
+    if not use_c:
+        return scorers, "disabled (--no-c)"
+    try:
+        from c_risk import get_binding, score_route_in_c, score_routes_in_c
+
+        binding = get_binding()
+    except (OSError, RuntimeError, AttributeError) as e:
+        return scorers, f"shipping_core library unavailable: {e}"
+
+    scorers["c"] = Scorer("c", list, lambda rs: [score_route_in_c(w, binding)[0] for w in rs])
+    if binding.score_routes_batch is not None:
+        scorers["c_batch"] = Scorer("c_batch", _ragged, lambda wo: score_routes_in_c(wo[0], wo[1], binding)[0])
+    return scorers, None
+
+
+def _best_of(fn: Callable[[], Any], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_scorer(scorer: Scorer, routes: List[np.ndarray], repeats: int = BENCH_REPEATS) -> Dict[str, Any]:
+    """
+    Throughput: all `routes` in one go (best of `repeats`).
+    Latency: single-route calls through the same API, p50/p95/max in microseconds.
+    """
+    prepared = scorer.prepare(routes)
+    seconds = _best_of(lambda: scorer.run(prepared), repeats)
+    n_points = sum(len(w) for w in routes)
+
+    samples = []
+    for w in routes[:LATENCY_SAMPLES]:
+        one = scorer.prepare([w])
+        t0 = time.perf_counter()
+        scorer.run(one)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    lat = np.array(samples)
+
+    return {
+        "seconds": round(seconds, 6),
+        "routes_per_s": round(len(routes) / seconds, 1) if seconds > 0 else None,
+        "points_per_s": round(n_points / seconds, 1) if seconds > 0 else None,
+        "latency_us": {
+            "p50": round(float(np.percentile(lat, 50)), 2),
+            "p95": round(float(np.percentile(lat, 95)), 2),
+            "max": round(float(lat.max()), 2),
+        },
+    }
+
+
+def score_diffs(scores: Dict[str, np.ndarray], reference: str = "python") -> Dict[str, Dict[str, Any]]:
+    """Per implementation: how its scores differ from `reference` (and c_batch from c)."""
+    pairs = [(name, reference) for name in scores if name != reference]
+    if "c" in scores and "c_batch" in scores:
+        pairs.append(("c_batch", "c"))
+    out = {}
+    for a, b in pairs:
+        d = scores[a].astype(np.int64) - scores[b].astype(np.int64)
+        out[f"{a}-{b}"] = {
+            "routes": int(d.size),
+            "equal_frac": round(float(np.mean(d == 0)), 4) if d.size else None,
+            "mean_diff": round(float(d.mean()), 3) if d.size else None,
+            "mean_abs_diff": round(float(np.abs(d).mean()), 3) if d.size else None,
+            "max_abs_diff": int(np.abs(d).max()) if d.size else None,
+        }
+    return out
+
+
+def check_fixtures(fixtures: List[Dict[str, Any]], scorers: Dict[str, Scorer]) -> Dict[str, Any]:
+    """Re-score the recorded fixtures; any score that moved is a regression."""
+    weathers = [f["weather"] for f in fixtures]
+    scores = {name: s.score(weathers) for name, s in scorers.items()}
+    mismatches = []
+    for name, got in scores.items():
+        for f, g in zip(fixtures, got):
+            want = f["expected"].get(name)
+            if want is not None and int(g) != want:
+                mismatches.append({"route": f["name"], "scorer": name, "expected": want, "got": int(g)})
+    return {"routes": len(fixtures), "mismatches": mismatches, "diffs": score_diffs(scores)}
+
+
+def run_benchmarks(
+    scorers: Dict[str, Scorer],
+    sizes: Sequence[int] = BENCH_SIZES,
+    total_points: int = BENCH_POINTS,
+    repeats: int = BENCH_REPEATS,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """One entry per route size: timings per scorer and the score diffs on those routes."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in sizes:
+        routes = [synthetic_weather(n, "mixed", rng, missing=0.01) for _ in range(max(1, total_points // n))]
+        scores = {name: s.score(routes) for name, s in scorers.items()}
+        results.append({
+            "points_per_route": n,
+            "routes": len(routes),
+            "scorers": {name: bench_scorer(s, routes, repeats) for name, s in scorers.items()},
+            "diffs": score_diffs(scores),
+        })
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark and cross-check the route risk scorers; writes JSON.")
+    parser.add_argument("-o", "--output", help="JSON output path (default: stdout)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(BENCH_SIZES), help="points per route")
+    parser.add_argument("--points", type=int, default=BENCH_POINTS, help="points scored per size")
+    parser.add_argument("--repeats", type=int, default=BENCH_REPEATS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-c", action="store_true", help="skip the C scorers")
+    parser.add_argument("--fixtures", default=str(FIXTURES_PATH))
+    parser.add_argument("--record-fixtures", action="store_true",
+                        help="rewrite the fixtures (and their expected scores) from the current scorers")
+    parser.add_argument("--from-archive", help="with --record-fixtures: add routes from this WeatherArchive dir")
+    args = parser.parse_args()
+
+    scorers, c_missing = make_scorers(not args.no_c)
+
+    if args.record_fixtures:
+        routes = fixture_routes()
+        if args.from_archive:
+            routes += archive_routes(args.from_archive)
+        record_fixtures(Path(args.fixtures), routes, scorers)
+        print(f"Recorded {len(routes)} fixture routes to {args.fixtures}", file=sys.stderr)
+        return 0
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "scorers": list(scorers),
+            "c_unavailable": c_missing,
+            "repeats": args.repeats,
+            "seed": args.seed,
+        },
+        "fixtures": check_fixtures(load_fixtures(Path(args.fixtures)), scorers),
+        "benchmarks": run_benchmarks(scorers, args.sizes, args.points, args.repeats, args.seed),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    failed = len(report["fixtures"]["mismatches"])
+    if failed:
+        print(f"{failed} fixture score(s) changed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,62 @@
 import os
 import sys
 import ctypes
+import threading
+from pathlib import Path
+from typing import Sequence
+
 import numpy as np
 
+_DOUBLE_ARRAY = np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")
+_INT64_ARRAY = np.ctypeslib.ndpointer(dtype=np.int64, ndim=1, flags="C_CONTIGUOUS")
+_INT32_ARRAY = np.ctypeslib.ndpointer(dtype=np.int32, ndim=1, flags=("C_CONTIGUOUS", "WRITEABLE"))
+
+# Mirrors SegmentDetail in shipping_core.h (C struct layout, hence align=True)
+SEGMENT_DETAIL_DTYPE = np.dtype(
+    [
+        ("risk", np.float64),
+        ("risk_level", np.int32),
+        ("temperature_c", np.int32),
+        ("wind_kph", np.uint32),
+        ("precipitation_mm", np.uint32),
+        ("visibility_km", np.uint32),
+        ("distance_km", np.uint32),
+        ("expected_delay_minutes", np.uint32),
+        ("base_cost_cents", np.uint32),
+        ("delay_cost_cents", np.uint32),
+        ("expected_segment_cost_cents", np.uint32),
+    ],
+    align=True,
+)
+_SEGMENT_ARRAY = np.ctypeslib.ndpointer(dtype=SEGMENT_DETAIL_DTYPE, ndim=1, flags=("C_CONTIGUOUS", "WRITEABLE"))
+
+# RiskLevel names (models.h), indexed by SegmentDetail.risk_level
+RISK_LEVELS = ("LOW", "MEDIUM", "HIGH")
+
+# SHIPPING_ERR_* codes from shipping_core.h
+ERR_INVALID_ARG = -1
+ERR_CAPACITY = -2
+ERR_NOMEM = -3
+# Rows a heap-backed Route can grow to (models.h MAX_SEGMENTS)
+MAX_ROUTE_ROWS = 1 << 24
+# Segment cap of builds from before the Route was heap-backed (e.g. the bundled dylib/exe)
+LEGACY_MAX_ROUTE_ROWS = 32
+
+
+def _raise_for_score(score: int, binding: "CoreBinding") -> None:
+    if score >= 0:
+        return
+    if score == ERR_CAPACITY:
+        if binding.legacy:
+            raise ValueError(
+                f"this shipping_core build caps routes at {LEGACY_MAX_ROUTE_ROWS} rows; "
+                "rebuild it from shipping_core.c (see README)"
+            )
+        raise ValueError(f"C route model could not grow its segment buffer (routes are capped at {MAX_ROUTE_ROWS} rows)")
+    if score == ERR_NOMEM:
+        raise MemoryError("C scorer could not allocate its route buffers")
+    raise ValueError(f"C scorer rejected the weather matrix (error {score})")
+
 
 def _default_lib_name() -> str:
     if os.name == "nt":
@@ -13,35 +67,191 @@ def _default_lib_name() -> str:
 
 
 def load_lib(path: str | None = None):
-    lib_path = path or _default_lib_name()
-    return ctypes.CDLL(lib_path)
+    if path is None:
+        # Prefer the library built next to this module, else let the loader search
+        local = Path(__file__).resolve().parent / _default_lib_name()
+        path = str(local) if local.exists() else _default_lib_name()
+    return ctypes.CDLL(path)
 
 
-def score_route_in_c(weather_np: np.ndarray, lib=None) -> tuple[int, str]:
+def _optional_export(lib, name: str):
+    """An export added after the first shipped builds, or None when `lib` predates it."""
+    try:
+        return getattr(lib, name)
+    except AttributeError:
+        return None
+
+
+class CoreBinding:
+    """
+    Typed view of the shipping_core exports.
+    argtypes/restype are configured once and the score -> label table is read
+    from the library once, so per-call overhead is just the FFI call itself.
+
+    Only score_route_from_weather_matrix and risk_label_from_score are
+    required. Older builds (e.g. the bundled dylib/exe) lack the batch and
+    segment exports: batch scoring then falls back to one call per route and
+    segment details raise a RuntimeError asking for a rebuild.
+    """
+
+    def __init__(self, lib):
+        self.lib = lib
+
+        self.score_route = lib.score_route_from_weather_matrix
+        self.score_route.argtypes = [_DOUBLE_ARRAY, ctypes.c_int, ctypes.c_int]
+        self.score_route.restype = ctypes.c_int
+
+        self.score_routes_batch = _optional_export(lib, "score_routes_from_weather_matrix_batch")
+        # Builds without the batch export also predate the heap-backed Route
+        self.legacy = self.score_routes_batch is None
+        if self.score_routes_batch is not None:
+            self.score_routes_batch.argtypes = [
+                _DOUBLE_ARRAY,
+                _INT64_ARRAY,
+                ctypes.c_int,
+                ctypes.c_int,
+                _INT32_ARRAY,
+                _INT32_ARRAY,
+            ]
+            self.score_routes_batch.restype = ctypes.c_int
+
+        self.segment_details = _optional_export(lib, "route_segments_from_weather_matrix")
+        detail_size = _optional_export(lib, "segment_detail_size")
+        if self.segment_details is not None and detail_size is not None:
+            self.segment_details.argtypes = [
+                _DOUBLE_ARRAY,
+                ctypes.c_int,
+                ctypes.c_int,
+                ctypes.c_uint32,
+                _SEGMENT_ARRAY,
+                ctypes.c_int,
+            ]
+            self.segment_details.restype = ctypes.c_int
+            detail_size.restype = ctypes.c_int
+            if detail_size() != SEGMENT_DETAIL_DTYPE.itemsize:
+                raise RuntimeError("SegmentDetail layout in shipping_core does not match SEGMENT_DETAIL_DTYPE")
+        else:
+            self.segment_details = None
+
+        label_from_score = lib.risk_label_from_score
+        label_from_score.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        label_from_score.restype = ctypes.c_int
+        label_code = _optional_export(lib, "risk_label_code_from_score")
+        if label_code is not None:
+            label_code.argtypes = [ctypes.c_int]
+            label_code.restype = ctypes.c_int
+
+        # Scores are 1..100, so every label the library can produce is known up front
+        buf = ctypes.create_string_buffer(64)
+        self.score_labels: list[str] = []
+        self.code_labels: dict[int, str] = {}
+        for score in range(101):
+            label_from_score(score, buf, len(buf))
+            label = buf.value.decode("utf-8")
+            self.score_labels.append(label)
+            if label_code is not None:
+                self.code_labels[label_code(score)] = label
+
+    def label(self, score: int) -> str:
+        return self.score_labels[min(max(score, 0), 100)]
+
+
+_binding: CoreBinding | None = None
+_binding_lock = threading.Lock()
+
+
+def get_binding(path: str | None = None) -> CoreBinding:
+    """Process-wide binding; the library is loaded on first use only."""
+    global _binding
+    with _binding_lock:
+        if _binding is None:
+            _binding = CoreBinding(load_lib(path))
+        return _binding
+
+
+def _resolve(lib) -> CoreBinding:
     if lib is None:
-        lib = load_lib()
+        return get_binding()
+    if isinstance(lib, CoreBinding):
+        return lib
+    return CoreBinding(lib)
+
+
+def score_route_in_c(weather_np: np.ndarray, lib=None) -> tuple[int, str]:
+    b = _resolve(lib)
 
+    # No copy when the matrix is already C-contiguous float64
     a = np.ascontiguousarray(weather_np, dtype=np.float64)
     rows, cols = a.shape
 
-    lib.score_route_from_weather_matrix.argtypes = [
-        ctypes.POINTER(ctypes.c_double),
-        ctypes.c_int,
-        ctypes.c_int,
-    ]
-    lib.score_route_from_weather_matrix.restype = ctypes.c_int
-
-    score = lib.score_route_from_weather_matrix(
-        a.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
-        rows,
-        cols,
-    )
-
-    # label
-    lib.risk_label_from_score.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
-    lib.risk_label_from_score.restype = ctypes.c_int
-    buf = ctypes.create_string_buffer(64)
-    lib.risk_label_from_score(score, buf, 64)
-    label = buf.value.decode("utf-8")
-
-    return score, label
+    score = b.score_route(a, rows, cols)
+    _raise_for_score(score, b)
+    return score, b.label(score)
+
+
+def segment_details_in_c(
+    weather_np: np.ndarray,
+    delay_cost_per_minute_cents: int = 20,
+    lib=None,
+) -> np.ndarray:
+    """
+    Per-segment details from the C Route model, one record per weather row.
+
+    Returns a structured array with SEGMENT_DETAIL_DTYPE (risk, risk_level,
+    weather summary and segment costs). Slower than score_route_in_c, which
+    skips building the Route model; call this only when details are needed.
+    """
+    b = _resolve(lib)
+    if b.segment_details is None:
+        raise RuntimeError("This shipping_core build has no route_segments_from_weather_matrix; rebuild it")
+
+    a = np.ascontiguousarray(weather_np, dtype=np.float64)
+    rows, cols = a.shape
+    out = np.zeros(rows, dtype=SEGMENT_DETAIL_DTYPE)
+
+    n = b.segment_details(a, rows, cols, delay_cost_per_minute_cents, out, rows)
+    _raise_for_score(n, b)
+    return out
+
+
+def score_routes_in_c(
+    weather: np.ndarray,
+    offsets: Sequence[int] | np.ndarray,
+    lib=None,
+) -> tuple[np.ndarray, list[str]]:
+    """
+    Score many routes with a single FFI call.
+
+    `weather` is the ragged (total_points, cols) matrix of all routes stacked
+    row-wise and route r is weather[offsets[r]:offsets[r + 1]]. Inputs are
+    passed to C without copying when they are already C-contiguous float64 /
+    int64. Returns (int32 scores, labels); a negative score is the ERR_* code
+    for a route the C scorer rejected (label ""), e.g. an empty route.
+    """
+    b = _resolve(lib)
+
+    a = np.ascontiguousarray(weather, dtype=np.float64)
+    offs = np.ascontiguousarray(offsets, dtype=np.int64)
+    if a.ndim != 2 or offs.ndim != 1 or offs.size == 0:
+        raise ValueError("weather must be (total_points, cols) and offsets 1-D with routes + 1 entries")
+    if offs[0] != 0 or offs[-1] != a.shape[0] or np.any(np.diff(offs) < 0):
+        raise ValueError("offsets must start at 0, be non-decreasing and end at len(weather)")
+
+    n_routes = offs.size - 1
+    if b.score_routes_batch is None:
+        # Older library: same results, one FFI call per route
+        scores = np.array(
+            [b.score_route(a[offs[r] : offs[r + 1]], int(offs[r + 1] - offs[r]), a.shape[1]) for r in range(n_routes)],
+            dtype=np.int32,
+        )
+        return scores, [b.label(int(s)) if s >= 0 else "" for s in scores]
+
+    scores = np.empty(n_routes, dtype=np.int32)
+    codes = np.empty(n_routes, dtype=np.int32)
+
+    rc = b.score_routes_batch(a, offs, n_routes, a.shape[1], scores, codes)
+    if rc != 0:
+        raise ValueError(f"score_routes_from_weather_matrix_batch failed ({rc})")
+
+    labels = [b.code_labels.get(int(c), "") for c in codes]
+    return scores, labels
@@ -1,6 +1,11 @@
+import re
+from datetime import date
 from typing import Any, Dict, Optional
 from dateutil import parser as dtparser
 
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_ISO_BASIC_DATE = re.compile(r"^(\d{4})(\d{2})(\d{2})$")  # 20260207, e.g. a number in a JSON row
+
 
 def clean_city(raw: Optional[str]) -> Optional[str]:
     if not raw:
@@ -25,7 +30,19 @@ def clean_date_iso(raw: Optional[str]) -> Optional[str]:
     if not raw:
         return None
 
-    # If already ISO-ish, dateutil will parse it fine anyway.
+    # ISO dates must skip dayfirst parsing, which reads 2026-02-07 as 2 July
+    if _ISO_DATE.match(raw):
+        try:
+            return date.fromisoformat(raw).isoformat()
+        except ValueError:
+            return None
+    m = _ISO_BASIC_DATE.match(raw)
+    if m:
+        try:
+            return date(*map(int, m.groups())).isoformat()
+        except ValueError:
+            return None
+
     try:
         dt = dtparser.parse(raw, dayfirst=True, fuzzy=True)
         return dt.date().isoformat()  # YYYY-MM-DD
@@ -0,0 +1,214 @@
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from cleaner import clean_shipment, clean_date_iso
+from geocode import Gazetteer, normalise_place
+
+# Longest place name (in words) tried against the gazetteer
+MAX_PLACE_WORDS = 4
+
+# Words that mark the next place as origin / destination
+FROM_MARKERS = {"from", "leaving", "departing", "out of"}
+TO_MARKERS = {"to", "into", "towards", "for", "destination"}
+
+_MONTH = (
+    r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+)
+_DAY = r"\d{1,2}(?:st|nd|rd|th)?"
+_WEEKDAY_NAME = r"(?:mon|tues?|wed(?:nes)?|thu(?:rs?)?|fri|sat(?:ur)?|sun)(?:day)?"
+_WEEKDAY = rf"(?:{_WEEKDAY_NAME},?\s+)?"
+
+# Explicit date phrases only; dateutil's fuzzy mode on a whole message is too eager
+DATE_PATTERNS = [
+    re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b"),
+    re.compile(r"\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}\b"),
+    re.compile(rf"\b{_WEEKDAY}{_DAY}\s+(?:of\s+)?{_MONTH}\.?(?:,?\s+\d{{4}})?\b", re.IGNORECASE),
+    re.compile(rf"\b{_WEEKDAY}{_MONTH}\.?\s+{_DAY}(?:,?\s+\d{{4}})?\b", re.IGNORECASE),
+]
+_RELATIVE_DAYS = {"today": 0, "tomorrow": 1}
+_YEAR = re.compile(r"\d{4}|[/.]\d{2}$")  # 4-digit year, or dd/mm/yy
+_LEAP_YEAR = 2000
+
+# Capitalised words that may look like place names (checked against the gazetteer)
+_CAPITALISED = re.compile(r"\b[A-Z][a-z]+(?:['-][A-Za-z]+)*")
+# Capitalised words that are not places: calendar words
+_NOT_PLACES = re.compile(rf"(?:{_MONTH}|{_WEEKDAY_NAME}|today|tomorrow)", re.IGNORECASE)
+
+
+def _next_occurrence(iso: str, today: date) -> str:
+    """A date given without a year: this year's, or next year's if it has passed."""
+    d = date.fromisoformat(iso)
+    for year in range(today.year, today.year + 5):  # 29 Feb needs a leap year
+        try:
+            candidate = d.replace(year=year)
+        except ValueError:
+            continue
+        if candidate >= today:
+            return candidate.isoformat()
+    return iso
+
+
+def find_date(text: str, today: Optional[date] = None) -> Optional[str]:
+    """
+    First explicit date in `text` as YYYY-MM-DD (parsed by cleaner.clean_date_iso),
+    else None. A date without a year ('3rd of March') is its next occurrence.
+    """
+    today = today or date.today()
+    for pattern in DATE_PATTERNS:
+        m = pattern.search(text or "")
+        if m:
+            if _YEAR.search(m.group(0)):
+                iso = clean_date_iso(m.group(0))
+                if iso:
+                    return iso
+            else:
+                # Parsed in a leap year so 29 Feb is valid, then moved to its next occurrence
+                iso = clean_date_iso(f"{m.group(0)} {_LEAP_YEAR}")
+                if iso:
+                    return _next_occurrence(iso, today)
+    words = set(normalise_place(text).split())
+    for word, days in _RELATIVE_DAYS.items():
+        if word in words:
+            return (today + timedelta(days=days)).isoformat()
+    return None
+
+
+def _place_spans(words: List[str], gazetteer: Gazetteer) -> List[Tuple[int, int, str]]:
+    """(word position, word count, canonical name) of each gazetteer place in `words`."""
+    found: List[Tuple[int, int, str]] = []
+    i = 0
+    while i < len(words):
+        for n in range(min(MAX_PLACE_WORDS, len(words) - i), 0, -1):
+            entry = gazetteer.index.get(" ".join(words[i : i + n]))
+            if entry is not None:
+                found.append((i, n, entry.name))
+                i += n
+                break
+        else:
+            i += 1
+    return found
+
+
+def find_places(text: str, gazetteer: Gazetteer) -> List[Tuple[int, str]]:
+    """
+    Gazetteer places mentioned in `text`, as (word position, canonical name),
+    longest match first at each position and in reading order.
+    """
+    return [(i, name) for i, _, name in _place_spans(normalise_place(text).split(), gazetteer)]
+
+
+def unknown_place_words(text: str, gazetteer: Gazetteer) -> List[str]:
+    """
+    Capitalised words in `text` that could name a place but are not part of a
+    gazetteer match ('make it Bordeaux'). Sentence-initial words and calendar
+    words are skipped.
+    """
+    words = normalise_place(text).split()
+    known = {w for i, n, _ in _place_spans(words, gazetteer) for w in words[i : i + n]}
+    unknown = []
+    for m in _CAPITALISED.finditer(text or ""):
+        before = text[: m.start()].rstrip()
+        if not before or before[-1] in ".!?:" or _NOT_PLACES.fullmatch(m.group(0)):
+            continue
+        if not all(w in known for w in normalise_place(m.group(0)).split()):
+            unknown.append(m.group(0))
+    return unknown
+
+
+def _marker_before(words: List[str], pos: int) -> Optional[str]:
+    for n in (2, 1):
+        if pos - n >= 0:
+            w = " ".join(words[pos - n : pos])
+            if w in FROM_MARKERS:
+                return "from"
+            if w in TO_MARKERS:
+                return "to"
+    return None
+
+
+def _marked_places(text: str, gazetteer: Gazetteer) -> List[Tuple[str, Optional[str]]]:
+    """(canonical name, 'from' / 'to' / None) for each place in `text`, in reading order."""
+    words = normalise_place(text).split()
+    return [(name, _marker_before(words, pos)) for pos, name in find_places(text, gazetteer)]
+
+
+def roles_are_certain(text: str, gazetteer: Gazetteer) -> bool:
+    """
+    True when extract_shipment's place roles for `text` are not a guess: at
+    most one origin and one destination, each either marked ('from X' /
+    'to Y') or the one unmarked place left once the other role is marked.
+    Three or more places, or an unmarked place whose role depends on word
+    order alone, are not certain.
+    """
+    places = _marked_places(text, gazetteer)
+    if len(places) > 2 or len({name for name, _ in places}) != len(places):
+        return False
+    markers = [marker for _, marker in places]
+    if len(markers) < 2:
+        return None not in markers
+    return markers.count(None) < 2 and markers[0] != markers[1]
+
+
+def certain_shipment(text: str, gazetteer: Gazetteer, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """
+    extract_shipment(text) when the message on its own states from, to and
+    date without guessing (roles_are_certain, no unknown_place_words), else
+    None. Only such a message may skip the LLM; earlier turns never fill gaps.
+    """
+    shipment = extract_shipment(text, gazetteer, today)
+    if not is_complete(shipment) or not roles_are_certain(text, gazetteer):
+        return None
+    if unknown_place_words(text, gazetteer):
+        return None
+    return shipment
+
+
+def extract_shipment(text: str, gazetteer: Gazetteer, today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Deterministic shipment extraction from one user message.
+
+    Places come from the offline gazetteer; 'from X' / 'to Y' decide the
+    roles, and two unmarked places are read as origin then destination.
+    Fields it cannot tell are None. Output is cleaned with clean_shipment.
+    The roles are a best guess; see roles_are_certain before trusting them.
+    """
+    ship_from: Optional[str] = None
+    ship_to: Optional[str] = None
+    unmarked: List[str] = []
+    for name, marker in _marked_places(text, gazetteer):
+        if marker == "from" and ship_from is None:
+            ship_from = name
+        elif marker == "to" and ship_to is None:
+            ship_to = name
+        else:
+            unmarked.append(name)
+
+    for name in unmarked:
+        if ship_from is None and name != ship_to:
+            ship_from = name
+        elif ship_to is None and name != ship_from:
+            ship_to = name
+
+    return clean_shipment(
+        {
+            "ship_from_city": ship_from,
+            "ship_to_city": ship_to,
+            "ship_date": find_date(text, today),
+        }
+    )
+
+
+def merge_shipments(*shipments: Dict[str, Any]) -> Dict[str, Any]:
+    """Field-wise merge; later non-null values win."""
+    out: Dict[str, Any] = {"ship_from_city": None, "ship_to_city": None, "ship_date": None}
+    for s in shipments:
+        for k in out:
+            if s.get(k):
+                out[k] = s[k]
+    return out
+
+
+def is_complete(shipment: Dict[str, Any]) -> bool:
+    return bool(shipment.get("ship_from_city") and shipment.get("ship_to_city") and shipment.get("ship_date"))
@@ -0,0 +1,228 @@
+import os
+import re
+import csv
+import time
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from geopy.geocoders import Nominatim
+from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+
+Coord = Tuple[float, float]  # (lat, lon)
+
+GAZETTEER_PATH = Path(__file__).resolve().parent / "data" / "uk_cities.csv"
+GEOCODE_DB_PATH = Path("out") / "geocode_cache.sqlite"
+
+# Nominatim usage policy: at most one request per second
+NOMINATIM_MIN_INTERVAL_S = 1.0
+NOMINATIM_USER_AGENT = "city_to_coords_app"
+
+# Trailing ", <country>" parts that still mean "look in the UK gazetteer"
+UK_QUALIFIERS = {
+    "united kingdom",
+    "uk",
+    "u k",
+    "great britain",
+    "gb",
+    "britain",
+    "england",
+    "scotland",
+    "wales",
+    "northern ireland",
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalise_place(name: str) -> str:
+    """
+    Canonical lookup form of a place name:
+    lowercase, accents stripped, punctuation/hyphens collapsed to single spaces.
+    'Newcastle-upon-Tyne ' -> 'newcastle upon tyne'
+    """
+    s = unicodedata.normalize("NFKD", name or "")
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = s.replace("&", " and ")
+    return _NON_ALNUM.sub(" ", s.lower()).strip()
+
+
+def split_uk_query(query: str) -> Optional[str]:
+    """
+    Normalised place part of a query if it is UK (or unqualified), else None.
+    'Leeds, United Kingdom' -> 'leeds'; 'Paris, France' -> None.
+    """
+    parts = [normalise_place(p) for p in (query or "").split(",")]
+    parts = [p for p in parts if p]
+    if not parts:
+        return None
+    while len(parts) > 1 and parts[-1] in UK_QUALIFIERS:
+        parts.pop()
+    if len(parts) > 1:
+        return None
+    return parts[0]
+
+
+@dataclass(frozen=True)
+class GazetteerEntry:
+    name: str
+    lat: float
+    lon: float
+
+
+class Gazetteer:
+    """
+    Bundled offline list of UK cities (name, aliases, lat, lon).
+    Names and aliases are indexed by normalise_place() for O(1) lookups.
+    """
+
+    def __init__(self, entries: List[GazetteerEntry], index: Dict[str, GazetteerEntry]):
+        self.entries = entries
+        self.index = index
+
+    @classmethod
+    def load(cls, path: Path = GAZETTEER_PATH) -> "Gazetteer":
+        entries: List[GazetteerEntry] = []
+        index: Dict[str, GazetteerEntry] = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                entry = GazetteerEntry(row["name"], float(row["lat"]), float(row["lon"]))
+                entries.append(entry)
+                names = [row["name"]] + [a for a in (row.get("aliases") or "").split("|") if a]
+                for n in names:
+                    index.setdefault(normalise_place(n), entry)
+        return cls(entries, index)
+
+    def lookup(self, name: str) -> Optional[GazetteerEntry]:
+        return self.index.get(normalise_place(name))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class GeocodeStore:
+    """Persistent SQLite map of normalised query -> (lat, lon)."""
+
+    def __init__(self, db_path: Path):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocode (
+                query TEXT PRIMARY KEY,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                source TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+    def get(self, query: str) -> Optional[Coord]:
+        with self._lock:
+            row = self._db.execute("SELECT lat, lon FROM geocode WHERE query=?", (query,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, query: str, coord: Coord, source: str = "nominatim") -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)",
+                (query, coord[0], coord[1], source, time.time()),
+            )
+            self._db.commit()
+
+
+class Geocoder:
+    """
+    City name -> (lat, lon), cheapest source first:
+      1. in-process memo
+      2. bundled UK gazetteer (no network)
+      3. persistent SQLite store of earlier Nominatim answers
+      4. Nominatim (rate limited), written back to the store
+    """
+
+    def __init__(
+        self,
+        gazetteer: Optional[Gazetteer] = None,
+        store: Optional[GeocodeStore] = None,
+        user_agent: str = NOMINATIM_USER_AGENT,
+    ):
+        self.gazetteer = gazetteer
+        self.store = store
+        self._memo: Dict[str, Optional[Coord]] = {}
+        self._geolocator = Nominatim(user_agent=user_agent)
+        self._nominatim_lock = threading.Lock()
+        self._last_nominatim = 0.0
+
+    def lookup_offline(self, query: str) -> Optional[Coord]:
+        """Memo / gazetteer / store only; never touches the network."""
+        key = normalise_place(query)
+        if key in self._memo:
+            return self._memo[key]
+
+        coord: Optional[Coord] = None
+        uk_name = split_uk_query(query)
+        if self.gazetteer is not None and uk_name is not None:
+            entry = self.gazetteer.index.get(uk_name)
+            if entry is not None:
+                coord = (entry.lat, entry.lon)
+        if coord is None and self.store is not None:
+            coord = self.store.get(key)
+
+        if coord is not None:
+            self._memo[key] = coord
+        return coord
+
+    def geocode(self, query: str) -> Optional[Coord]:
+        coord = self.lookup_offline(query)
+        if coord is not None:
+            return coord
+
+        coord = self._nominatim(query)
+        if coord is not None:
+            key = normalise_place(query)
+            self._memo[key] = coord
+            if self.store is not None:
+                self.store.put(key, coord)
+        return coord
+
+    def _nominatim(self, query: str) -> Optional[Coord]:
+        with self._nominatim_lock:
+            wait = NOMINATIM_MIN_INTERVAL_S - (time.monotonic() - self._last_nominatim)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                location = self._geolocator.geocode(query)
+            except (GeocoderTimedOut, GeocoderServiceError):
+                return None
+            finally:
+                self._last_nominatim = time.monotonic()
+
+        if location is None:
+            return None
+        return (location.latitude, location.longitude)
+
+
+_default_geocoder: Optional[Geocoder] = None
+_default_lock = threading.Lock()
+
+
+def get_geocoder() -> Geocoder:
+    """
+    Process-wide geocoder used by route_find.city_to_coordinates.
+    GEOCODE_DB overrides the SQLite store path (set it to an empty string to disable).
+    """
+    global _default_geocoder
+    with _default_lock:
+        if _default_geocoder is None:
+            db_path = os.getenv("GEOCODE_DB", str(GEOCODE_DB_PATH))
+            _default_geocoder = Geocoder(
+                gazetteer=Gazetteer.load(),
+                store=GeocodeStore(Path(db_path)) if db_path else None,
+            )
+        return _default_geocoder
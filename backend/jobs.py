@@ -0,0 +1,120 @@
+import time
+import uuid
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from geocode import normalise_place
+
+# Finished jobs stay pollable for this long
+JOB_TTL_S = 15 * 60.0
+JOB_TIMEOUT_S = 60.0
+
+JobKey = Tuple[str, str, str]  # (from, to, date), normalised
+Runner = Callable[[str, str, str], Awaitable[dict]]
+
+
+def job_key(ship_from_city: str, ship_to_city: str, ship_date: str) -> JobKey:
+    return (normalise_place(ship_from_city), normalise_place(ship_to_city), ship_date)
+
+
+@dataclass
+class AnalysisJob:
+    id: str
+    ship_from_city: str
+    ship_to_city: str
+    ship_date: str
+    status: str = "pending"  # pending | running | done | error
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "shipment": {
+                "ship_from_city": self.ship_from_city,
+                "ship_to_city": self.ship_to_city,
+                "ship_date": self.ship_date,
+            },
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class AnalysisJobManager:
+    """
+    Runs route risk analyses as background asyncio tasks.
+
+    Identical in-flight (from, to, date) submissions share one job. Finished
+    jobs are kept for `ttl_s` so clients can poll or stream the result.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, runner: Runner, timeout_s: float = JOB_TIMEOUT_S, ttl_s: float = JOB_TTL_S):
+        self.runner = runner
+        self.timeout_s = timeout_s
+        self.ttl_s = ttl_s
+        self._jobs: Dict[str, AnalysisJob] = {}
+        self._inflight: Dict[JobKey, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, ship_from_city: str, ship_to_city: str, ship_date: str) -> AnalysisJob:
+        self._prune()
+        key = job_key(ship_from_city, ship_to_city, ship_date)
+        job_id = self._inflight.get(key)
+        if job_id is not None:
+            return self._jobs[job_id]
+
+        job = AnalysisJob(uuid.uuid4().hex, ship_from_city, ship_to_city, ship_date)
+        self._jobs[job.id] = job
+        self._inflight[key] = job.id
+        self._tasks[job.id] = asyncio.create_task(self._run(job, key))
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: AnalysisJob, timeout: Optional[float] = None) -> bool:
+        """True once the job has finished; False if `timeout` passed first."""
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _run(self, job: AnalysisJob, key: JobKey) -> None:
+        job.status = "running"
+        try:
+            job.result = await asyncio.wait_for(
+                self.runner(job.ship_from_city, job.ship_to_city, job.ship_date),
+                self.timeout_s,
+            )
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "error"
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e) or type(e).__name__
+        finally:
+            job.finished_at = time.time()
+            self._inflight.pop(key, None)
+            self._tasks.pop(job.id, None)
+            job.done.set()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        stale = [j.id for j in self._jobs.values() if j.finished_at is not None and j.finished_at < cutoff]
+        for job_id in stale:
+            del self._jobs[job_id]
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,97 @@
+import json
+from typing import List
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonStringFieldStream:
+    """
+    Incrementally decodes one top-level string field (e.g. "reply") from JSON
+    text that arrives in arbitrary chunks, so the value can be forwarded
+    while the model is still generating the rest of the object.
+
+    feed() returns the newly decoded characters of the field (possibly "").
+    Only the first occurrence of the key is read; nested objects are not
+    tracked, which is fine for the flat reply-first format build_prompt asks for.
+    """
+
+    def __init__(self, field: str):
+        self._key = json.dumps(field)
+        self._buf = ""
+        self._pos = 0
+        self._state = "key"  # key -> colon -> open -> value -> done
+        self.value = ""
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> str:
+        self._buf += chunk
+        out: List[str] = []
+
+        while self._state != "done":
+            if self._state == "key":
+                i = self._buf.find(self._key, self._pos)
+                if i < 0:
+                    # Keep a tail long enough to hold a key split across chunks
+                    self._pos = max(self._pos, len(self._buf) - len(self._key) + 1)
+                    break
+                self._pos = i + len(self._key)
+                self._state = "colon"
+            elif self._state in ("colon", "open"):
+                while self._pos < len(self._buf) and self._buf[self._pos].isspace():
+                    self._pos += 1
+                if self._pos >= len(self._buf):
+                    break
+                expected = ":" if self._state == "colon" else '"'
+                if self._buf[self._pos] != expected:
+                    # Not a string value (e.g. null): nothing to stream
+                    self._state = "done"
+                    break
+                self._pos += 1
+                self._state = "open" if self._state == "colon" else "value"
+            else:
+                if not self._read_value(out):
+                    break
+
+        text = "".join(out)
+        self.value += text
+        return text
+
+    def _read_value(self, out: List[str]) -> bool:
+        """Decode as much of the string as is complete; False when more input is needed."""
+        buf = self._buf
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            if ch == '"':
+                self._pos += 1
+                self._state = "done"
+                return True
+            if ch != "\\":
+                out.append(ch)
+                self._pos += 1
+                continue
+            # Escape sequence: wait until it is complete
+            if self._pos + 1 >= len(buf):
+                return False
+            esc = buf[self._pos + 1]
+            if esc == "u":
+                if self._pos + 6 > len(buf):
+                    return False
+                code = int(buf[self._pos + 2 : self._pos + 6], 16)
+                # Surrogate pair: needs the following \uXXXX as well
+                if 0xD800 <= code < 0xDC00:
+                    if self._pos + 12 > len(buf):
+                        return False
+                    if buf[self._pos + 6 : self._pos + 8] == "\\u":
+                        low = int(buf[self._pos + 8 : self._pos + 12], 16)
+                        out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        self._pos += 12
+                        continue
+                out.append(chr(code))
+                self._pos += 6
+            else:
+                out.append(_ESCAPES.get(esc, esc))
+                self._pos += 2
+        return False
@@ -68,12 +68,14 @@ int main(void)
     if (!route_add_segment(&route, &s1))
     {
         printf("Failed to add segment 1\n");
+        route_free(&route);
         return 1;
     }
 
     if (!route_add_segment(&route, &s2))
     {
         printf("Failed to add segment 2\n");
+        route_free(&route);
         return 1;
     }
 
@@ -83,5 +85,6 @@ int main(void)
     route_recalculate_totals(&route, delay_cost_per_minute_cents);
     print_route(&route);
 
+    route_free(&route);
     return 0;
 }
@@ -1,21 +1,80 @@
 import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Optional
 from dotenv import load_dotenv
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from google import genai
 from cleaner import clean_shipment
-
-from analysis_pipeline import run_analysis
+from extractor import extract_shipment, certain_shipment, merge_shipments, is_complete
+from geocode import get_geocoder
+from response_cache import ResponseCache, content_key
+from sessions import Session, SessionStore
+from json_stream import JsonStringFieldStream
+
+from analysis_pipeline import (
+    run_analysis_async,
+    run_departure_window_analysis_async,
+    run_alternatives_analysis_async,
+    run_time_aware_analysis_async,
+    MAX_ALTERNATIVES,
+)
+from batch_analysis import analyse_shipments, parse_shipments, MAX_BATCH_ROWS
+from jobs import AnalysisJob, AnalysisJobManager
+from weather_on_route import make_async_client, WEATHER_CONCURRENCY
 
 
 # Load environment variables (expects GEMINI_API_KEY in .env)
 load_dotenv()
 
-app = FastAPI()
+# Request-level time budgets (seconds)
+GEMINI_TIMEOUT_S = 30.0
+ANALYSIS_TIMEOUT_S = 60.0
+# How often a pending request checks whether the client went away
+DISCONNECT_POLL_S = 0.5
+# SSE keep-alive comment interval while a job is still running
+SSE_HEARTBEAT_S = 15.0
+
+# Blocking analysis stages (geocoding, routing) run here; bounds threads per process
+ANALYSIS_WORKERS = 8
+# Analyses allowed to run at once (each fans out its own weather requests)
+MAX_CONCURRENT_ANALYSES = 16
+
+# Bulk uploads run one at a time, each holding an analysis slot and half the
+# analysis workers, so one large batch cannot starve interactive chats
+MAX_CONCURRENT_BATCHES = 1
+BATCH_WORKERS = max(1, ANALYSIS_WORKERS // 2)
+BATCH_TIMEOUT_S = 600.0
+# Request body limit for /analysis/batch (rows are also capped by MAX_BATCH_ROWS)
+MAX_BATCH_BYTES = 1 << 20
+
+_analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+_analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+_batch_slots = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+# Shared pooled HTTP client for weather requests (created in lifespan)
+_weather_client = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _weather_client
+    _weather_client = make_async_client(WEATHER_CONCURRENCY * 4)
+    try:
+        yield
+    finally:
+        await jobs.shutdown()
+        await _weather_client.aclose()
+        _analysis_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Dev-only CORS (lets Live Server / local frontend call the API)
 app.add_middleware(
@@ -31,6 +90,14 @@ client = genai.Client()
 # Cheap + fast model
 MODEL = "gemini-2.5-flash"
 
+# Gemini answers for identical prompts (same model + transcript)
+_llm_cache = ResponseCache()
+
+# Conversation turns included in each prompt (the shipment state carries the rest)
+PROMPT_TURNS = 6
+
+sessions = SessionStore()
+
 
 class Msg(BaseModel):
     role: str  # "user" or "assistant"
@@ -38,7 +105,8 @@ class Msg(BaseModel):
 
 
 class ChatPayload(BaseModel):
-    messages: list[Msg]
+    session_id: str | None = None  # omitted / expired -> a new session is started
+    message: str
 
 
 def flatten(messages: list[Msg]) -> str:
@@ -66,11 +134,83 @@ def parse_json_loose(text: str) -> dict:
         return {}
 
 
-@app.post("/chat")
-def chat(payload: ChatPayload):
-    transcript = flatten(payload.messages)
+class ClientDisconnected(Exception):
+    pass
+
+
+async def run_until_disconnect(request: Request, aw: Awaitable[Any], timeout: float) -> Any:
+    """
+    Await `aw` with a timeout, cancelling it if the HTTP client disconnects first.
+    Raises asyncio.TimeoutError or ClientDisconnected.
+    """
+    task = asyncio.ensure_future(asyncio.wait_for(aw, timeout))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_S)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def analyse_route(ship_from_city: str, ship_to_city: str, ship_date: str) -> dict:
+    """Bounded, non-blocking run_analysis (the background job runner)."""
+    async with _analysis_slots:
+        return await run_analysis_async(
+            ship_from_city,
+            ship_to_city,
+            ship_date,
+            client=_weather_client,
+            executor=_analysis_executor,
+        )
+
+
+# Background route analyses, de-duplicated per (from, to, date)
+jobs = AnalysisJobManager(analyse_route, timeout_s=ANALYSIS_TIMEOUT_S)
+
+
+async def run_analysis_request(request: Request, aw: Awaitable[dict]) -> Any:
+    """
+    Run one synchronous-style analysis endpoint: bounded by _analysis_slots and
+    ANALYSIS_TIMEOUT_S, cancelled if the client goes away. Bad input -> 400.
+    """
+    async with _analysis_slots:
+        try:
+            return await run_until_disconnect(request, aw, ANALYSIS_TIMEOUT_S)
+        except ClientDisconnected:
+            return Response(status_code=499)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Analysis timed out")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
 
-    prompt = f"""
+class WindowPayload(BaseModel):
+    ship_from_city: str
+    ship_to_city: str
+    start_date: str  # YYYY-MM-DD, first departure day
+    end_date: str  # YYYY-MM-DD, last departure day (inclusive)
+
+
+class TimedPayload(BaseModel):
+    ship_from_city: str
+    ship_to_city: str
+    departure: str  # ISO 'YYYY-MM-DDTHH:MM' (UTC unless an offset is given) or 'YYYY-MM-DD'
+
+
+class AlternativesPayload(BaseModel):
+    ship_from_city: str
+    ship_to_city: str
+    ship_date: str  # YYYY-MM-DD
+    max_alternatives: int = MAX_ALTERNATIVES  # OSRM alternatives on top of the primary route
+
+
+def build_prompt(transcript: str, shipment: dict | None = None) -> str:
+    known = json.dumps(shipment or {"ship_from_city": None, "ship_to_city": None, "ship_date": None})
+    return f"""
 You are a shipping assistant.
 
 You must do TWO things:
@@ -94,49 +234,125 @@ Rules:
 - If unknown, use null.
 - If the user gave a date like 'Saturday 7th Feb 2026', convert it to YYYY-MM-DD if you can.
 - Do not ask for package weight/dimensions; only focus on from/to/date.
+- Keep the known shipment details below unless the user changes them. They may include a
+  guess from the latest message; correct it if the conversation says otherwise.
+
+Known shipment details so far:
+{known}
 
-Conversation:
+Recent conversation:
 {transcript}
 """.strip()
 
+
+def pre_extract(text: str) -> dict:
+    """Deterministic extraction from one user message (all fields None if no gazetteer)."""
+    gazetteer = get_geocoder().gazetteer
+    if gazetteer is None:
+        return merge_shipments()
+    return extract_shipment(text, gazetteer)
+
+
+async def generate_text(prompt: str) -> str:
+    """Gemini response text, served from _llm_cache for a prompt seen recently."""
+    key = content_key(MODEL, prompt)
+    text = _llm_cache.get(key)
+    if text is not None:
+        return text
+
+    resp = await client.aio.models.generate_content(model=MODEL, contents=prompt)
+    text = resp.text or ""
+    # Only cache answers we could use
+    if parse_json_loose(text):
+        _llm_cache.put(key, text)
+    return text
+
+
+async def stream_text(prompt: str) -> AsyncIterator[str]:
+    """Streaming generate_text: yields Gemini's text chunks (one chunk on a cache hit)."""
+    key = content_key(MODEL, prompt)
+    text = _llm_cache.get(key)
+    if text is not None:
+        yield text
+        return
+
+    parts = []
+    stream = await client.aio.models.generate_content_stream(model=MODEL, contents=prompt)
+    async for chunk in stream:
+        part = chunk.text or ""
+        parts.append(part)
+        yield part
+
+    text = "".join(parts)
+    if parse_json_loose(text):
+        _llm_cache.put(key, text)
+
+
+async def iterate_with_deadline(ait: AsyncIterator[Any], timeout: float) -> AsyncIterator[Any]:
+    """Re-yield `ait`, raising asyncio.TimeoutError if it is not exhausted within `timeout` seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
     try:
-        resp = client.models.generate_content(model=MODEL, contents=prompt)
-    except Exception as e:
-        # If Gemini call fails, don't crash the app
-        print("Gemini error:", repr(e))
-        return {
-            "reply": "Temporary connection issue to the AI service. Please send that again.",
-            "shipment": {"ship_from_city": None, "ship_to_city": None, "ship_date": None},
-            "error": str(e),
-        }
-
-    data = parse_json_loose(resp.text or "")
+        while True:
+            try:
+                item = await asyncio.wait_for(ait.__anext__(), max(deadline - loop.time(), 0.0))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await ait.aclose()
+
+
+GEMINI_ERROR_REPLY = "Temporary connection issue to the AI service. Please send that again."
+ANALYSIS_NOTE = "\n\nChecking the route risk now…"
+
+
+def start_turn(payload: ChatPayload) -> tuple[Session, dict, dict]:
+    """Record the user message; returns (session, shipment before this turn, pre-extracted shipment)."""
+    session = sessions.get_or_create(payload.session_id)
+    known = dict(session.shipment)
+    session.add("user", payload.message)
+    return session, known, merge_shipments(known, pre_extract(payload.message))
+
+
+def fast_path_reply(known: dict, pre: dict, message: str) -> Optional[str]:
+    # This message alone stated from/to/date without guessing: no LLM call needed.
+    # Otherwise pre only reaches the model as a hint (turn_prompt).
+    gazetteer = get_geocoder().gazetteer
+    if gazetteer is None or pre == known or certain_shipment(message, gazetteer) is None:
+        return None
+    return f"Got it: {pre['ship_from_city']} to {pre['ship_to_city']} on {pre['ship_date']}."
+
+
+def turn_prompt(session: Session, pre: dict) -> str:
+    # Only the shipment state and the last few turns go to the model
+    turns = [Msg(**t) for t in session.recent(PROMPT_TURNS)]
+    return build_prompt(flatten(turns), pre)
+
+
+def parse_turn(text: str, pre: dict) -> tuple[str, dict]:
+    data = parse_json_loose(text)
 
     reply = (data.get("reply") or "").strip()
 
     shipment_raw = data.get("shipment") if isinstance(data.get("shipment"), dict) else {}
-    shipment_clean = clean_shipment(shipment_raw)
+    # The model wins where it found a value; known state and the pre-extractor fill its gaps
+    return reply, merge_shipments(pre, clean_shipment(shipment_raw))
 
-    analysis = None
-    if shipment_clean["ship_from_city"] and shipment_clean["ship_to_city"] and shipment_clean["ship_date"]:
-        try:
-            analysis = run_analysis(
-                shipment_clean["ship_from_city"],
-                shipment_clean["ship_to_city"],
-                shipment_clean["ship_date"],
-            )
 
-            # Simple: append analysis into the reply (no extra Gemini call)
-            reply = (
-                reply
-                + f"\n\nRoute risk: {analysis['risk_score']}/100 ({analysis['risk_level']})."
-            )
-
-        except Exception as e:
-            # Don't crash the chatbot if analysis fails
-            analysis = {"error": str(e)}
-            reply = reply + "\n\nI couldn’t run route analysis right now (service error)."
+def finish_turn(session: Session, reply: str, shipment_clean: dict) -> Optional[AnalysisJob]:
+    """Store the turn, start the route analysis once from/to/date are known, persist the shipment."""
+    session.shipment = shipment_clean
+    session.add("assistant", reply)
 
+    job = None
+    if is_complete(shipment_clean):
+        # Reply now; the risk score arrives via /analysis/{id} (poll) or /analysis/{id}/events (SSE)
+        job = jobs.submit(
+            shipment_clean["ship_from_city"],
+            shipment_clean["ship_to_city"],
+            shipment_clean["ship_date"],
+        )
 
     # Persist JSON for other scripts
     out_dir = Path("out")
@@ -145,6 +361,223 @@ Conversation:
         json.dumps(shipment_clean, indent=2),
         encoding="utf-8",
     )
+    return job
+
+
+@app.post("/chat")
+async def chat(payload: ChatPayload, request: Request):
+    session, known, pre = start_turn(payload)
+
+    reply = fast_path_reply(known, pre, payload.message)
+    shipment_clean = pre
+    if reply is None:
+        try:
+            text = await run_until_disconnect(request, generate_text(turn_prompt(session, pre)), GEMINI_TIMEOUT_S)
+        except ClientDisconnected:
+            return Response(status_code=499)
+        except Exception as e:
+            # If Gemini call fails, don't crash the app
+            print("Gemini error:", repr(e))
+            return {
+                "reply": GEMINI_ERROR_REPLY,
+                "shipment": pre,
+                "session_id": session.id,
+                "error": str(e) or type(e).__name__,
+            }
+        reply, shipment_clean = parse_turn(text, pre)
+
+    job = finish_turn(session, reply, shipment_clean)
+    if job is not None:
+        reply = reply + ANALYSIS_NOTE
+
+    return {
+        "reply": reply,
+        "shipment": shipment_clean,
+        "session_id": session.id,
+        "analysis": None,
+        "analysis_job": job.to_dict() if job is not None else None,
+    }
+
+
+@app.post("/chat/stream")
+async def chat_stream(payload: ChatPayload):
+    """
+    Server-Sent Events version of /chat:
+      session     {"session_id"} straight away
+      token       {"text"} reply text as Gemini generates it
+      reply       {"reply"} the complete reply
+      shipment    {"shipment"} the extracted shipment
+      analysis_job / analysis   the job when submitted, then again when finished
+      error       {"reply", "shipment", "error"} if Gemini fails
+      done        {}
+    Starlette cancels the generator (and the Gemini stream) if the client disconnects.
+    """
+    session, known, pre = start_turn(payload)
+
+    async def events():
+        yield sse_event("session", {"session_id": session.id})
+
+        reply = fast_path_reply(known, pre, payload.message)
+        shipment_clean = pre
+        if reply is not None:
+            yield sse_event("token", {"text": reply})
+        else:
+            field = JsonStringFieldStream("reply")
+            parts = []
+            try:
+                async for part in iterate_with_deadline(stream_text(turn_prompt(session, pre)), GEMINI_TIMEOUT_S):
+                    parts.append(part)
+                    delta = field.feed(part)
+                    if delta:
+                        yield sse_event("token", {"text": delta})
+            except Exception as e:
+                print("Gemini error:", repr(e))
+                yield sse_event("error", {"reply": GEMINI_ERROR_REPLY, "shipment": pre, "error": str(e) or type(e).__name__})
+                return
+            reply, shipment_clean = parse_turn("".join(parts), pre)
+
+        job = finish_turn(session, reply, shipment_clean)
+        if job is not None:
+            yield sse_event("token", {"text": ANALYSIS_NOTE})
+            reply = reply + ANALYSIS_NOTE
+
+        yield sse_event("reply", {"reply": reply})
+        yield sse_event("shipment", {"shipment": shipment_clean})
+
+        if job is not None:
+            yield sse_event("analysis_job", job.to_dict())
+            while not await jobs.wait(job, SSE_HEARTBEAT_S):
+                yield ": keep-alive\n\n"
+            yield sse_event("analysis", job.to_dict())
+
+        yield sse_event("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/analysis/batch")
+async def analysis_batch(request: Request):
+    """
+    Bulk scoring. Body is a CSV (header: ship_from_city, ship_to_city, ship_date)
+    or JSONL of shipments; the response streams one JSON result per line
+    (application/x-ndjson) as soon as each ship date is scored.
+
+    Batches wait for _batch_slots and hold one _analysis_slots slot while they
+    run. A batch that exceeds BATCH_TIMEOUT_S ends with a final {"error": ...}
+    line, and one whose client disconnects is cancelled.
+    """
+    if int(request.headers.get("content-length") or 0) > MAX_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail=f"Batch body over {MAX_BATCH_BYTES} bytes")
+    body = await request.body()
+    if len(body) > MAX_BATCH_BYTES:
+        raise HTTPException(status_code=413, detail=f"Batch body over {MAX_BATCH_BYTES} bytes")
+    body = body.decode("utf-8", errors="replace")
+    content_type = request.headers.get("content-type", "")
+    fmt = "csv" if "csv" in content_type else "jsonl" if ("ndjson" in content_type or "jsonl" in content_type) else None
+    try:
+        rows = parse_shipments(body, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} shipments per batch")
+
+    async def lines():
+        async with _batch_slots, _analysis_slots:
+            results = analyse_shipments(
+                rows, client=_weather_client, executor=_analysis_executor, concurrency=BATCH_WORKERS
+            )
+            try:
+                async for result in iterate_with_deadline(results, BATCH_TIMEOUT_S):
+                    if await request.is_disconnected():
+                        return
+                    yield json.dumps(result) + "\n"
+            except asyncio.TimeoutError:
+                yield json.dumps({"error": f"Batch timed out after {BATCH_TIMEOUT_S:.0f}s"}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/analysis/window")
+async def analysis_window(payload: WindowPayload, request: Request):
+    """Score each departure day from start_date to end_date and return the safest (see run_departure_window_analysis)."""
+    return await run_analysis_request(
+        request,
+        run_departure_window_analysis_async(
+            payload.ship_from_city,
+            payload.ship_to_city,
+            payload.start_date,
+            payload.end_date,
+            client=_weather_client,
+            executor=_analysis_executor,
+        ),
+    )
+
+
+@app.post("/analysis/alternatives")
+async def analysis_alternatives(payload: AlternativesPayload, request: Request):
+    """Score the primary route and its OSRM alternatives and return the safest (see run_alternatives_analysis)."""
+    return await run_analysis_request(
+        request,
+        run_alternatives_analysis_async(
+            payload.ship_from_city,
+            payload.ship_to_city,
+            payload.ship_date,
+            payload.max_alternatives,
+            client=_weather_client,
+            executor=_analysis_executor,
+        ),
+    )
+
+
+@app.post("/analysis/timed")
+async def analysis_timed(payload: TimedPayload, request: Request):
+    """Score the route against the forecast around each point's arrival time (see run_time_aware_analysis)."""
+    return await run_analysis_request(
+        request,
+        run_time_aware_analysis_async(
+            payload.ship_from_city,
+            payload.ship_to_city,
+            payload.departure,
+            client=_weather_client,
+            executor=_analysis_executor,
+        ),
+    )
+
+
+@app.get("/analysis/{job_id}")
+async def get_analysis(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired analysis job")
+    return job.to_dict()
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    return {"reply": reply, "shipment": shipment_clean, "analysis": analysis}
+
+@app.get("/analysis/{job_id}/events")
+async def stream_analysis(job_id: str, request: Request):
+    """Server-Sent Events: one `status` event now, one `result` event when the job finishes."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired analysis job")
+
+    async def events():
+        yield sse_event("status", job.to_dict())
+        while not await jobs.wait(job, SSE_HEARTBEAT_S):
+            if await request.is_disconnected():
+                return
+            yield ": keep-alive\n\n"
+        yield sse_event("result", job.to_dict())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
@@ -1,6 +1,7 @@
 #include "models.h"
 
 #include <stdio.h>
+#include <stdlib.h>
 #include <string.h>
 
 static void copy_str(char *dst, size_t dst_size, const char *src)
@@ -40,14 +41,56 @@ void route_init(Route *route, const char *route_id)
     route->overall_risk = RISK_LOW;
 }
 
-int route_add_segment(Route *route, const RouteSegment *seg)
+void route_free(Route *route)
+{
+    if (route == NULL) return;
+
+    free(route->segments);
+    route->segments = NULL;
+    route->segment_count = 0;
+    route->segment_capacity = 0;
+}
+
+RouteStatus route_reserve(Route *route, size_t capacity)
 {
-    if (route == NULL || seg == NULL) return 0;
-    if (route->segment_count >= MAX_SEGMENTS) return 0;
+    RouteSegment *grown;
+
+    if (route == NULL) return ROUTE_ERR_INVALID;
+    if (capacity <= route->segment_capacity) return ROUTE_OK;
+    if (capacity > MAX_SEGMENTS) return ROUTE_ERR_CAPACITY;
+
+    grown = (RouteSegment *)realloc(route->segments, capacity * sizeof(RouteSegment));
+    if (grown == NULL) return ROUTE_ERR_NOMEM;
+
+    route->segments = grown;
+    route->segment_capacity = capacity;
+    return ROUTE_OK;
+}
+
+RouteStatus route_push_segment(Route *route, const RouteSegment *seg)
+{
+    if (route == NULL || seg == NULL) return ROUTE_ERR_INVALID;
+
+    if (route->segment_count == route->segment_capacity)
+    {
+        size_t want = route->segment_capacity ? route->segment_capacity * 2 : 8;
+        RouteStatus st;
+
+        if (want > MAX_SEGMENTS) want = MAX_SEGMENTS;
+        if (want <= route->segment_count) return ROUTE_ERR_CAPACITY;
+
+        st = route_reserve(route, want);
+        if (st != ROUTE_OK) return st;
+    }
 
     route->segments[route->segment_count] = *seg;
     route->segment_count++;
-    return 1;
+    return ROUTE_OK;
+}
+
+int route_add_segment(Route *route, const RouteSegment *seg)
+{
+    return route_push_segment(route, seg) == ROUTE_OK;
 }
 
 void segment_recalculate_cost(RouteSegment *seg, uint32_t delay_cost_per_minute_cents)
@@ -6,7 +6,16 @@
 
 #define MAX_NAME_LEN         64
 #define MAX_REGION_CODE_LEN  16
-#define MAX_SEGMENTS         32
+/* Hard cap on segments per route; segment storage itself grows on the heap */
+#define MAX_SEGMENTS         (1u << 24)
+
+typedef enum
+{
+    ROUTE_OK           = 0,
+    ROUTE_ERR_INVALID  = -1,
+    ROUTE_ERR_CAPACITY = -2,   /* more than MAX_SEGMENTS */
+    ROUTE_ERR_NOMEM    = -3
+} RouteStatus;
 
 typedef enum
 {
@@ -79,8 +88,9 @@ typedef struct
 {
     char route_id[32];
 
-    RouteSegment segments[MAX_SEGMENTS];
+    RouteSegment *segments;        /* heap array owned by the route; release with route_free */
     size_t segment_count;
+    size_t segment_capacity;
 
     uint32_t total_distance_km;
     uint32_t total_expected_delay_minutes;
@@ -94,7 +104,10 @@ typedef struct
 void region_init(Region *r, const char *code, const char *name);
 
 void route_init(Route *route, const char *route_id);
-int  route_add_segment(Route *route, const RouteSegment *seg);
+void route_free(Route *route);
+RouteStatus route_reserve(Route *route, size_t capacity);
+RouteStatus route_push_segment(Route *route, const RouteSegment *seg);
+int  route_add_segment(Route *route, const RouteSegment *seg);   /* 1 on success, 0 on failure */
 
 void segment_recalculate_cost(RouteSegment *seg, uint32_t delay_cost_per_minute_cents);
 void route_recalculate_totals(Route *route, uint32_t delay_cost_per_minute_cents);
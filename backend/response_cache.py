@@ -0,0 +1,75 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Identical transcripts within this window reuse the earlier model answer
+RESPONSE_CACHE_TTL_S = 10 * 60.0
+RESPONSE_CACHE_MAX_ENTRIES = 5_000
+
+
+def content_key(model: str, prompt: str) -> str:
+    """sha256 of the model name and full prompt text."""
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    In-memory LRU of LLM response texts keyed by content_key(model, prompt),
+    with a per-entry TTL. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl_s: float = RESPONSE_CACHE_TTL_S):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                stored_at, text = entry
+                if now - stored_at <= self.ttl_s:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return text
+                del self._mem[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            self._mem[key] = (time.time(), text)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._mem),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
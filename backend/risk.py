@@ -1,5 +1,5 @@
 import numpy as np
-from typing import Sequence, Dict
+from typing import Sequence, Dict, Optional
 
 # Calibration: push scores lower without changing ordering too much
 RISK_GAMMA: float = 1   # >1 compresses mid/high risks downwards
@@ -10,9 +10,10 @@ def _col_idx(column_names: Sequence[str]) -> Dict[str, int]:
 
 
 def _safe_col(a: np.ndarray, idx: int) -> np.ndarray:
-    if idx < 0 or idx >= a.shape[1]:
-        return np.full((a.shape[0],), np.nan, dtype=np.float64)
-    return a[:, idx]
+    """Column `idx` of the last axis (works for (points, cols) and (routes, points, cols))."""
+    if idx < 0 or idx >= a.shape[-1]:
+        return np.full(a.shape[:-1], np.nan, dtype=np.float64)
+    return a[..., idx]
 
 
 def _weathercode_baseline(code: float) -> float:
@@ -31,25 +32,27 @@ def _weathercode_baseline(code: float) -> float:
     return 0.30
 
 
-def _clip01(x: np.ndarray) -> np.ndarray:
-    return np.clip(x, 0.0, 1.0)
+# Precomputed baseline for weathercodes 0..99 (WMO codes all fall in this range)
+_WEATHERCODE_LUT = np.array([_weathercode_baseline(c) for c in range(100)], dtype=np.float64)
 
 
-def score_route_risk(weather_np: np.ndarray, column_names: Sequence[str]) -> int:
-    """
-    Return a single route risk score in the range 1..100.
+def _weathercode_baseline_np(wcode: np.ndarray) -> np.ndarray:
+    """Vectorised _weathercode_baseline: one gather from _WEATHERCODE_LUT."""
+    codes = np.asarray(wcode, dtype=np.float64)
+    nan = np.isnan(codes)
+    c = np.trunc(np.where(nan, -1.0, codes))  # int() truncation; NaN routed out of range
+    in_range = (c >= 0) & (c < len(_WEATHERCODE_LUT))
+    base = _WEATHERCODE_LUT[np.where(in_range, c, 0).astype(np.intp)]
+    base = np.where(in_range, base, 0.30)
+    return np.where(nan, 0.2, base)
 
-    Deterministic heuristic:
-      - Baseline from weathercode
-      - Adds risk from gusts, precipitation, low visibility, freezing+precip, snow
-      - Aggregates conservatively along the route (90th percentile)
 
-    Assumed Open-Meteo units:
-      - temps °C, precip mm, wind km/h, visibility meters, probability %
-    """
-    if weather_np is None or not isinstance(weather_np, np.ndarray) or weather_np.size == 0:
-        return 1
+def _clip01(x: np.ndarray) -> np.ndarray:
+    return np.clip(x, 0.0, 1.0)
 
+
+def _point_risk(weather_np: np.ndarray, column_names: Sequence[str]) -> np.ndarray:
+    """Per-point risk in [0,1] over the last axis; shape is weather_np.shape[:-1]."""
     ci = _col_idx(column_names)
 
     temp_min = _safe_col(weather_np, ci.get("temp_min", -1))
@@ -68,7 +71,7 @@ def score_route_risk(weather_np: np.ndarray, column_names: Sequence[str]) -> int
     gusts = np.nan_to_num(gusts, nan=0.0)
     visibility = np.nan_to_num(visibility, nan=10000.0)
 
-    base = np.array([_weathercode_baseline(c) for c in wcode], dtype=np.float64)
+    base = _weathercode_baseline_np(wcode)
 
     # Gust risk: 40 km/h mild, 70 high, 100 severe
     gust_r = _clip01((gusts - 40.0) / 60.0)
@@ -95,16 +98,92 @@ def score_route_risk(weather_np: np.ndarray, column_names: Sequence[str]) -> int
     point_risk = np.maximum(point_risk, vis_r * 0.9)
     point_risk = np.maximum(point_risk, ice_r)
     point_risk = np.maximum(point_risk, snow_r)
-    point_risk = _clip01(point_risk)
+    return _clip01(point_risk)
 
-    route_risk = float(np.quantile(point_risk, 0.5))
 
+def _calibrated_scores(route_risk: np.ndarray) -> np.ndarray:
+    """Route risk in [0,1] -> integer scores 1..100."""
     # Apply calibration curve to weight the final score lower
     # - gamma > 1 reduces mid/high values more than low values
     # - scale < 1 lowers everything
-    calibrated = (route_risk ** RISK_GAMMA) * RISK_SCALE
-    calibrated = float(np.clip(calibrated, 0.0, 1.0))
+    calibrated = (np.asarray(route_risk, dtype=np.float64) ** RISK_GAMMA) * RISK_SCALE
+    calibrated = np.clip(calibrated, 0.0, 1.0)
+
+    score = np.rint(1 + calibrated * 99).astype(np.int64)
+    return np.clip(score, 1, 100)
 
-    score = int(round(1 + calibrated * 99))
-    return max(1, min(100, score))
 
+def score_route_risk(weather_np: np.ndarray, column_names: Sequence[str]) -> int:
+    """
+    Return a single route risk score in the range 1..100.
+
+    Deterministic heuristic:
+      - Baseline from weathercode
+      - Adds risk from gusts, precipitation, low visibility, freezing+precip, snow
+      - Aggregates along the route (median)
+
+    Assumed Open-Meteo units:
+      - temps °C, precip mm, wind km/h, visibility meters, probability %
+    """
+    if weather_np is None or not isinstance(weather_np, np.ndarray) or weather_np.size == 0:
+        return 1
+
+    point_risk = _point_risk(weather_np, column_names)
+    route_risk = float(np.quantile(point_risk, 0.5))
+    return int(_calibrated_scores(route_risk))
+
+
+def score_routes_batch(
+    weather: np.ndarray,
+    column_names: Sequence[str],
+    offsets: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Score many routes in one vectorised pass; returns an int64 array of scores 1..100.
+
+    Two layouts:
+      - offsets is None: `weather` is stacked (routes, points, cols)
+      - offsets given:   `weather` is ragged (total_points, cols) and route r is
+                         weather[offsets[r]:offsets[r + 1]] (len(offsets) == routes + 1)
+
+    Each route's score equals score_route_risk on that route alone;
+    routes with no points score 1.
+    """
+    weather = np.asarray(weather, dtype=np.float64)
+
+    if offsets is None:
+        if weather.ndim != 3:
+            raise ValueError("stacked weather must have shape (routes, points, cols)")
+        if weather.shape[0] == 0:
+            return np.empty(0, dtype=np.int64)
+        if weather.shape[1] == 0:
+            return np.ones(weather.shape[0], dtype=np.int64)
+        point_risk = _point_risk(weather, column_names)
+        return _calibrated_scores(np.quantile(point_risk, 0.5, axis=1))
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if weather.ndim != 2 or offsets.ndim != 1 or offsets.size == 0:
+        raise ValueError("ragged weather must be (total_points, cols) with 1-D offsets")
+    if offsets[0] != 0 or offsets[-1] != weather.shape[0] or np.any(np.diff(offsets) < 0):
+        raise ValueError("offsets must start at 0, be non-decreasing and end at len(weather)")
+
+    lens = np.diff(offsets)
+    if weather.shape[0] == 0:
+        return np.ones(lens.size, dtype=np.int64)
+    point_risk = _point_risk(weather, column_names)
+
+    # Sort risks within each route, then take the median (linear interpolation, as np.quantile)
+    route_id = np.repeat(np.arange(lens.size), lens)
+    sorted_risk = point_risk[np.lexsort((point_risk, route_id))]
+
+    nonempty = lens > 0
+    pos = 0.5 * np.maximum(lens - 1, 0)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    # Empty routes point at a valid row and are overridden below
+    start = np.minimum(offsets[:-1], len(sorted_risk) - 1)
+    a = sorted_risk[np.minimum(start + lo, len(sorted_risk) - 1)]
+    b = sorted_risk[np.minimum(start + hi, len(sorted_risk) - 1)]
+    route_risk = a + (b - a) * (pos - lo)
+
+    return np.where(nonempty, _calibrated_scores(route_risk), 1)
@@ -0,0 +1,169 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+Coord = Tuple[float, float]  # (lat, lon)
+
+# Endpoints are snapped to this grid (~110 m) so repeat lanes share one entry
+ROUTE_CACHE_SNAP_DEG = 0.001
+# Road networks change slowly; a week keeps closures from sticking around forever
+ROUTE_CACHE_TTL_S = 7 * 24 * 3600.0
+# In-memory budget for cached geometries (float32 arrays)
+ROUTE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+RouteKey = Tuple[str, int, int, int, int]  # (profile, start lat/lon cell, end lat/lon cell)
+
+
+def snap(coord: Coord, snap_deg: float = ROUTE_CACHE_SNAP_DEG) -> Tuple[int, int]:
+    return (int(round(coord[0] / snap_deg)), int(round(coord[1] / snap_deg)))
+
+
+class RouteCache:
+    """
+    LRU cache of OSRM route geometries keyed by (profile, snapped start, snapped end).
+
+    Geometries are stored as compact float32 arrays of shape (n_vertices, k)
+    (k >= 2: lat, lon, ...), so any n_points can be resampled from one entry.
+    Memory use is bounded by `max_bytes`; an optional SQLite tier keeps
+    entries across restarts. Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = ROUTE_CACHE_MAX_BYTES,
+        ttl_s: float = ROUTE_CACHE_TTL_S,
+        snap_deg: float = ROUTE_CACHE_SNAP_DEG,
+        db_path: Optional[str] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.snap_deg = snap_deg
+
+        self._mem: "OrderedDict[RouteKey, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS route_cache (
+                    profile TEXT NOT NULL,
+                    s_lat INTEGER NOT NULL,
+                    s_lon INTEGER NOT NULL,
+                    e_lat INTEGER NOT NULL,
+                    e_lon INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    n_cols INTEGER NOT NULL,
+                    geometry BLOB NOT NULL,
+                    PRIMARY KEY (profile, s_lat, s_lon, e_lat, e_lon)
+                )
+                """
+            )
+            self._db.commit()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, profile: str, start: Coord, end: Coord) -> RouteKey:
+        return (profile, *snap(start, self.snap_deg), *snap(end, self.snap_deg))
+
+    def get(self, key: RouteKey) -> Optional[np.ndarray]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                stored_at, geom = entry
+                if now - stored_at <= self.ttl_s:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return geom
+                self._mem_pop(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT stored_at, n_cols, geometry FROM route_cache "
+                    "WHERE profile=? AND s_lat=? AND s_lon=? AND e_lat=? AND e_lon=?",
+                    key,
+                ).fetchone()
+                if row is not None and now - row[0] <= self.ttl_s:
+                    geom = np.frombuffer(row[2], dtype=np.float32).reshape(-1, row[1])
+                    self._mem_put(key, row[0], geom)
+                    self.disk_hits += 1
+                    return geom
+
+            self.misses += 1
+            return None
+
+    def put(self, key: RouteKey, geometry: np.ndarray) -> np.ndarray:
+        """Store a (n_vertices, k) geometry; returns the read-only float32 copy that was cached."""
+        geom = np.array(geometry, dtype=np.float32, copy=True)
+        if geom.ndim != 2 or geom.shape[1] < 2:
+            raise ValueError("geometry must have shape (n_vertices, k>=2)")
+        geom.flags.writeable = False
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, now, geom)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO route_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*key, now, geom.shape[1], geom.tobytes()),
+                )
+                self._db.commit()
+        return geom
+
+    def _mem_put(self, key: RouteKey, stored_at: float, geom: np.ndarray) -> None:
+        if key in self._mem:
+            self._mem_pop(key)
+        self._mem[key] = (stored_at, geom)
+        self._bytes += geom.nbytes
+        while self._bytes > self.max_bytes and len(self._mem) > 1:
+            old_key = next(iter(self._mem))
+            self._mem_pop(old_key)
+            self.evictions += 1
+
+    def _mem_pop(self, key: RouteKey) -> None:
+        _, geom = self._mem.pop(key)
+        self._bytes -= geom.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM route_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._mem),
+                "bytes": self._bytes,
+            }
+
+
+_default_cache: Optional[RouteCache] = None
+_default_lock = threading.Lock()
+
+
+def get_route_cache() -> RouteCache:
+    """
+    Process-wide cache used by route_find.
+    Set ROUTE_CACHE_DB to a file path to enable the SQLite tier.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = RouteCache(db_path=os.getenv("ROUTE_CACHE_DB") or None)
+        return _default_cache
@@ -1,12 +1,20 @@
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import requests
+import numpy as np
 from math import radians, sin, cos, asin, sqrt
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Sequence
 from dataclasses import dataclass
+from geocode import get_geocoder
+from route_cache import get_route_cache
+from weather_cache import WEATHER_CACHE_GRID_DEG
 
 Coord = Tuple[float, float]  # (lat, lon)
 
+# Adaptive sampling: bounds on the number of points taken along a route
+ADAPTIVE_MIN_POINTS = 2
+ADAPTIVE_MAX_POINTS = 400
+# Meters per degree of latitude
+_M_PER_DEG = 111_195.0
+
 
 # --- New: record type + builder (from earlier) ---
 @dataclass
@@ -62,17 +70,11 @@ def city_to_coordinates(city_name: str) -> Optional[Coord]:
     """
     Convert a city name to (latitude, longitude).
     Returns None if not found / error.
-    """
-    geolocator = Nominatim(user_agent="city_to_coords_app")
 
-    try:
-        location = geolocator.geocode(city_name)
-        if location is None:
-            return None
-        return (location.latitude, location.longitude)
-
-    except (GeocoderTimedOut, GeocoderServiceError):
-        return None
+    Resolved through the shared geocode.Geocoder: memo, bundled UK gazetteer
+    and SQLite store first, Nominatim only as a fallback.
+    """
+    return get_geocoder().geocode(city_name)
 
 
 def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -86,56 +88,116 @@ def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return 2 * R * asin(sqrt(a))
 
 
-def _resample_polyline_evenly(coords: List[Coord], n: int) -> List[Coord]:
+def _haversine_m_np(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Element-wise great-circle distance in meters (array version of _haversine_m)."""
+    R = 6371008.8
+    phi1, lam1 = np.radians(lat1), np.radians(lon1)
+    phi2, lam2 = np.radians(lat2), np.radians(lon2)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+def _as_polyline(coords) -> np.ndarray:
+    pts = np.asarray(coords, dtype=np.float64)
+    if pts.ndim != 2 or pts.shape[0] == 0 or pts.shape[1] < 2:
+        raise ValueError("coords must be a non-empty (n, 2+) array of (lat, lon, ...) rows")
+    return pts
+
+
+def resample_polyline_np(coords: np.ndarray, n: int) -> np.ndarray:
     """
-    Resample a polyline (lat,lon) into n points evenly spaced by along-track distance.
-    Linear interpolation is done in lat/lon for each segment.
+    Resample a polyline of shape (m, k) into n rows evenly spaced by along-track distance.
+
+    Distance comes from the (lat, lon) in the first two columns; every column
+    (including any extra ones, e.g. timestamps) is linearly interpolated.
+    Returns an array of shape (n, k).
     """
     if n <= 0:
         raise ValueError("n must be >= 1")
-    if not coords:
-        raise ValueError("coords must be a non-empty list")
-    if len(coords) == 1:
-        return [coords[0]] * n
+    pts = _as_polyline(coords)
+    if len(pts) == 1:
+        return np.repeat(pts, n, axis=0)
 
-    # Build cumulative distance array (meters)
-    cum = [0.0]
-    for i in range(1, len(coords)):
-        lat0, lon0 = coords[i - 1]
-        lat1, lon1 = coords[i]
-        cum.append(cum[-1] + _haversine_m(lat0, lon0, lat1, lon1))
+    # Cumulative distance at each vertex (meters)
+    seg = _haversine_m_np(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1])
+    cum = np.concatenate(([0.0], np.cumsum(seg)))
 
     total = cum[-1]
     if total == 0:
-        return [coords[0]] * n
+        return np.repeat(pts[:1], n, axis=0)
 
     # Target distances
     step = total / (n - 1) if n > 1 else 0.0
-    targets = [i * step for i in range(n)]
+    targets = np.arange(n) * step
     targets[-1] = total  # guard against floating error
 
-    # Walk along the polyline and interpolate
-    out: List[Coord] = []
-    seg_i = 0
+    # Segment i covers cum[i] < t <= cum[i + 1]
+    idx = np.clip(np.searchsorted(cum, targets, side="left") - 1, 0, len(pts) - 2)
+    d0 = cum[idx]
+    span = cum[idx + 1] - d0
+    frac = np.divide(targets - d0, span, out=np.zeros_like(targets), where=span > 0)
 
-    for t in targets:
-        while seg_i < len(cum) - 2 and cum[seg_i + 1] < t:
-            seg_i += 1
+    p0 = pts[idx]
+    return p0 + frac[:, None] * (pts[idx + 1] - p0)
 
-        d0, d1 = cum[seg_i], cum[seg_i + 1]
-        lat0, lon0 = coords[seg_i]
-        lat1, lon1 = coords[seg_i + 1]
 
-        if d1 == d0:
-            out.append((lat0, lon0))
-            continue
+def resample_polylines_batch(polylines: Sequence[np.ndarray], n: int) -> np.ndarray:
+    """
+    Resample many polylines (each (m_i, k), same k) to n rows each in one vectorised pass.
+    Returns an array of shape (len(polylines), n, k).
+    """
+    if n <= 0:
+        raise ValueError("n must be >= 1")
+    parts = [_as_polyline(p) for p in polylines]
+    if not parts:
+        return np.empty((0, n, 2), dtype=np.float64)
+
+    lens = np.array([len(p) for p in parts])
+    starts = np.concatenate(([0], np.cumsum(lens)[:-1]))
+    ends = starts + lens
+    pts = np.concatenate(parts, axis=0)
+
+    # One cumulative distance over all vertices; the jumps between polylines count as 0 m
+    seg = _haversine_m_np(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1])
+    seg[ends[:-1] - 1] = 0.0
+    cum = np.concatenate(([0.0], np.cumsum(seg)))
+
+    base = cum[starts]
+    totals = cum[ends - 1] - base
+
+    step = totals / (n - 1) if n > 1 else np.zeros_like(totals)
+    targets = np.arange(n)[None, :] * step[:, None]
+    targets[:, -1] = totals
+    targets += base[:, None]
+
+    lo = starts[:, None]
+    hi = np.maximum(ends - 2, starts)[:, None]
+    idx = np.clip(np.searchsorted(cum, targets, side="left") - 1, lo, hi)
+    nxt = np.minimum(idx + 1, (ends - 1)[:, None])
+    d0 = cum[idx]
+    span = cum[nxt] - d0
+    frac = np.divide(targets - d0, span, out=np.zeros_like(targets), where=span > 0)
+
+    p0 = pts[idx]
+    out = p0 + frac[..., None] * (pts[nxt] - p0)
+
+    # Single-vertex / zero-length polylines collapse to their first vertex
+    degenerate = (lens == 1) | (totals == 0)
+    out[degenerate] = pts[starts[degenerate]][:, None, :]
+    return out
 
-        frac = (t - d0) / (d1 - d0)
-        lat = lat0 + frac * (lat1 - lat0)
-        lon = lon0 + frac * (lon1 - lon0)
-        out.append((lat, lon))
 
-    return out
+def _resample_polyline_evenly(coords: List[Coord], n: int) -> List[Coord]:
+    """
+    Resample a polyline (lat,lon) into n points evenly spaced by along-track distance.
+    Linear interpolation is done in lat/lon for each segment.
+    List-of-tuples wrapper around resample_polyline_np.
+    """
+    if n <= 0:
+        raise ValueError("n must be >= 1")
+    if not coords:
+        raise ValueError("coords must be a non-empty list")
+    return [(lat, lon) for lat, lon in resample_polyline_np(coords, n)[:, :2].tolist()]
 
 
 def osrm_route_100_points(
@@ -147,16 +209,193 @@ def osrm_route_100_points(
     timeout: float = 20.0,
     overview: str = "full",
     geometries: str = "geojson",
+    use_cache: bool = True,
 ) -> List[Coord]:
     """
     Use OSRM to find a route between two coordinates and return n_points evenly
     distributed along that route.
+
+    The raw route geometry is cached per (profile, snapped start, snapped end),
+    so repeat lanes are resampled locally without calling OSRM.
     """
     if overview == "false":
         raise ValueError("overview cannot be 'false' because we need route geometry.")
     if n_points < 1:
         raise ValueError("n_points must be >= 1")
 
+    geom = _route_geometry(start, end, profile, base_url, timeout, overview, geometries, use_cache)
+    points = resample_polyline_np(geom[:, :2], n_points)
+    return [(lat, lon) for lat, lon in points.tolist()]
+
+
+def adaptive_point_count(length_m: float, mid_lat: float, grid_deg: float = WEATHER_CACHE_GRID_DEG) -> int:
+    """
+    Number of evenly spaced samples that puts at least one point in every
+    weather grid cell the route crosses: spacing is half the smaller cell side
+    at `mid_lat`, bounded to ADAPTIVE_MIN_POINTS..ADAPTIVE_MAX_POINTS.
+    """
+    cell_m = grid_deg * _M_PER_DEG * min(1.0, max(cos(radians(mid_lat)), 0.1))
+    n = int(np.ceil(length_m / (cell_m / 2.0))) + 1
+    return int(min(max(n, ADAPTIVE_MIN_POINTS), ADAPTIVE_MAX_POINTS))
+
+
+def geometry_point_count(geom: np.ndarray, grid_deg: float = WEATHER_CACHE_GRID_DEG) -> int:
+    """adaptive_point_count for a route geometry (columns lat, lon, ...)."""
+    latlon = np.asarray(geom, dtype=np.float64)[:, :2]
+    return adaptive_point_count(polyline_length_m(latlon), float(latlon[:, 0].mean()), grid_deg)
+
+
+def merge_points_by_cell(points: np.ndarray, grid_deg: float = WEATHER_CACHE_GRID_DEG) -> np.ndarray:
+    """Keep the first point (in route order) of each weather grid cell; returns (k, cols)."""
+    pts = _as_polyline(points)
+    cells = np.round(pts[:, :2] / grid_deg).astype(np.int64)
+    _, first = np.unique(cells, axis=0, return_index=True)
+    return pts[np.sort(first)]
+
+
+def osrm_route_adaptive_points(
+    start: Coord,
+    end: Coord,
+    grid_deg: float = WEATHER_CACHE_GRID_DEG,
+    profile: str = "driving",
+    base_url: str = "https://router.project-osrm.org",
+    timeout: float = 20.0,
+    overview: str = "full",
+    geometries: str = "geojson",
+    use_cache: bool = True,
+) -> List[Coord]:
+    """
+    Route points sampled by route length instead of a fixed count: about one
+    point per weather grid cell crossed (see adaptive_point_count), with points
+    that land in the same cell merged. A 5 km city hop needs a handful of
+    weather lookups; an 800 km haul still gets every cell along the way.
+    """
+    if overview == "false":
+        raise ValueError("overview cannot be 'false' because we need route geometry.")
+
+    geom = _route_geometry(start, end, profile, base_url, timeout, overview, geometries, use_cache)
+    latlon = geom[:, :2].astype(np.float64)
+    points = merge_points_by_cell(resample_polyline_np(latlon, geometry_point_count(latlon, grid_deg)), grid_deg)
+    return [(lat, lon) for lat, lon in points.tolist()]
+
+
+def osrm_route_points_with_times(
+    start: Coord,
+    end: Coord,
+    n_points: Optional[int] = None,
+    profile: str = "driving",
+    base_url: str = "https://router.project-osrm.org",
+    timeout: float = 20.0,
+    overview: str = "full",
+    geometries: str = "geojson",
+    use_cache: bool = True,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Like osrm_route_100_points, but also estimates when each point is reached.
+
+    Returns (points, offsets_s): points is (n_points, 2) lat/lon and offsets_s
+    is (n_points,) seconds after departure, interpolated from OSRM's
+    per-segment durations along the route. n_points=None sizes the sample by
+    route length (geometry_point_count), like osrm_route_adaptive_points.
+    """
+    if overview == "false":
+        raise ValueError("overview cannot be 'false' because we need route geometry.")
+    if n_points is not None and n_points < 1:
+        raise ValueError("n_points must be >= 1")
+
+    geom = _route_geometry(start, end, profile, base_url, timeout, overview, geometries, use_cache)
+    if n_points is None:
+        n_points = geometry_point_count(geom)
+    timed = resample_polyline_np(geom[:, :3], n_points)
+    return timed[:, :2], timed[:, 2]
+
+
+def _route_geometry(
+    start: Coord,
+    end: Coord,
+    profile: str,
+    base_url: str,
+    timeout: float,
+    overview: str,
+    geometries: str,
+    use_cache: bool,
+) -> np.ndarray:
+    """(lat, lon, seconds) route vertices, from the route cache when possible."""
+    cache = get_route_cache() if use_cache else None
+    geom = None
+    if cache is not None:
+        key = cache.key(f"{profile}/{overview}", start, end)
+        geom = cache.get(key)
+    # Entries without the time column predate duration annotations; refetch them
+    if geom is None or geom.shape[1] < 3:
+        geom = osrm_route_geometry(start, end, profile=profile, base_url=base_url,
+                                   timeout=timeout, overview=overview, geometries=geometries)
+        if cache is not None:
+            geom = cache.put(key, geom)
+    return geom
+
+
+def osrm_route_geometry(
+    start: Coord,
+    end: Coord,
+    profile: str = "driving",
+    base_url: str = "https://router.project-osrm.org",
+    timeout: float = 20.0,
+    overview: str = "full",
+    geometries: str = "geojson",
+) -> np.ndarray:
+    """
+    Fetch the first OSRM route between two coordinates.
+    Returns the route vertices as an array of shape (n_vertices, 3):
+    (lat, lon, seconds from the start of the route), the times accumulated
+    from OSRM's per-segment duration annotations.
+    """
+    routes = _osrm_routes(start, end, profile, base_url, timeout, overview, geometries, alternatives=0)
+    return _route_vertices(routes[0])
+
+
+def osrm_route_alternatives(
+    start: Coord,
+    end: Coord,
+    max_alternatives: int = 2,
+    profile: str = "driving",
+    base_url: str = "https://router.project-osrm.org",
+    timeout: float = 20.0,
+    overview: str = "full",
+    geometries: str = "geojson",
+) -> List[np.ndarray]:
+    """
+    Fetch the OSRM route plus up to `max_alternatives` alternatives in one request.
+    Returns one (n_vertices, 3) (lat, lon, seconds) array per route, primary first.
+    OSRM may return fewer alternatives than asked for (or none).
+    """
+    if max_alternatives < 0:
+        raise ValueError("max_alternatives must be >= 0")
+    routes = _osrm_routes(start, end, profile, base_url, timeout, overview, geometries, alternatives=max_alternatives)
+    return [_route_vertices(route) for route in routes[: max_alternatives + 1]]
+
+
+def polyline_length_m(coords) -> float:
+    """Along-track length in meters of a (lat, lon, ...) polyline."""
+    pts = _as_polyline(coords)
+    if len(pts) < 2:
+        return 0.0
+    return float(_haversine_m_np(pts[:-1, 0], pts[:-1, 1], pts[1:, 0], pts[1:, 1]).sum())
+
+
+def _osrm_routes(
+    start: Coord,
+    end: Coord,
+    profile: str,
+    base_url: str,
+    timeout: float,
+    overview: str,
+    geometries: str,
+    alternatives: int,
+) -> List[Dict]:
+    if geometries != "geojson":
+        raise ValueError("This function currently supports geometries='geojson' only.")
+
     s_lat, s_lon = start
     e_lat, e_lon = end
 
@@ -166,6 +405,8 @@ def osrm_route_100_points(
         "overview": overview,
         "geometries": geometries,
         "steps": "false",
+        "annotations": "duration",
+        "alternatives": str(alternatives) if alternatives > 0 else "false",
     }
 
     r = requests.get(url, params=params, timeout=timeout)
@@ -176,15 +417,31 @@ def osrm_route_100_points(
         msg = data.get("message", "OSRM did not return a valid route.")
         raise RuntimeError(f"OSRM error: {msg}")
 
-    geom = data["routes"][0]["geometry"]
-    if geometries != "geojson":
-        raise ValueError("This function currently supports geometries='geojson' only.")
+    return data["routes"]
 
-    # GeoJSON coordinates are [lon, lat]
-    route_coords_lonlat = geom["coordinates"]
-    route_coords: List[Coord] = [(lat, lon) for lon, lat in route_coords_lonlat]
 
-    return _resample_polyline_evenly(route_coords, n_points)
+def _route_vertices(route: Dict) -> np.ndarray:
+    """(n_vertices, 3) (lat, lon, seconds) array from one OSRM GeoJSON route object."""
+    # GeoJSON coordinates are [lon, lat]
+    route_coords_lonlat = np.asarray(route["geometry"]["coordinates"], dtype=np.float64).reshape(-1, 2)
+    latlon = route_coords_lonlat[:, ::-1]
+
+    # One duration per consecutive vertex pair when overview=full
+    durations = [
+        d
+        for leg in route.get("legs", [])
+        for d in (leg.get("annotation") or {}).get("duration", [])
+    ]
+    if len(durations) == len(latlon) - 1:
+        seconds = np.concatenate(([0.0], np.cumsum(durations)))
+    else:
+        # Simplified overview: spread the route duration over distance
+        seg = _haversine_m_np(latlon[:-1, 0], latlon[:-1, 1], latlon[1:, 0], latlon[1:, 1])
+        cum = np.concatenate(([0.0], np.cumsum(seg)))
+        total_s = float(route.get("duration") or 0.0)
+        seconds = cum / cum[-1] * total_s if cum[-1] > 0 else np.zeros(len(latlon))
+
+    return np.column_stack((latlon, seconds))
 
 
 if __name__ == "__main__":
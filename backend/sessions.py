@@ -0,0 +1,106 @@
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+# Idle sessions expire after this long
+SESSION_TTL_S = 30 * 60.0
+# Sessions kept in memory at once; the least recently used are dropped first
+SESSION_MAX = 10_000
+# Turns (user + assistant messages) remembered per session
+SESSION_MAX_TURNS = 20
+# Longest single message stored / sent to the model
+MAX_MESSAGE_CHARS = 2_000
+
+
+def empty_shipment() -> Dict[str, Any]:
+    return {"ship_from_city": None, "ship_to_city": None, "ship_date": None}
+
+
+@dataclass
+class Session:
+    id: str
+    turns: Deque[Dict[str, str]] = field(default_factory=lambda: deque(maxlen=SESSION_MAX_TURNS))
+    shipment: Dict[str, Any] = field(default_factory=empty_shipment)
+    last_seen: float = field(default_factory=time.time)
+
+    def add(self, role: str, content: str) -> None:
+        self.turns.append({"role": role, "content": content[:MAX_MESSAGE_CHARS]})
+
+    def recent(self, k: int) -> List[Dict[str, str]]:
+        """The last `k` turns, oldest first."""
+        return list(self.turns)[-k:] if k > 0 else []
+
+
+class SessionStore:
+    """
+    Server-side chat state: recent turns plus the extracted shipment.
+
+    Memory is bounded by `max_sessions` (LRU) and SESSION_MAX_TURNS per
+    session; sessions idle for `ttl_s` expire. Must be used from a single
+    event loop.
+    """
+
+    def __init__(self, ttl_s: float = SESSION_TTL_S, max_sessions: int = SESSION_MAX):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be >= 1")
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+        self.created = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, session_id: Optional[str]) -> Optional[Session]:
+        """Live session for `session_id` (refreshing its expiry), else None."""
+        if not session_id:
+            return None
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.time()
+        if now - session.last_seen > self.ttl_s:
+            del self._sessions[session_id]
+            self.expired += 1
+            return None
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def get_or_create(self, session_id: Optional[str]) -> Session:
+        """Unknown or expired ids get a fresh session with a new id."""
+        session = self.get(session_id)
+        if session is not None:
+            return session
+
+        self._prune()
+        session = Session(uuid.uuid4().hex)
+        self._sessions[session.id] = session
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return session
+
+    def _prune(self) -> None:
+        # Oldest-seen first, so stop at the first live one
+        cutoff = time.time() - self.ttl_s
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_seen >= cutoff:
+                break
+            del self._sessions[session.id]
+            self.expired += 1
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "created": self.created,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
@@ -2,6 +2,7 @@
 #include "models.h"
 
 #include <math.h>
+#include <stdlib.h>
 #include <string.h>
 
 // Must match Python COLUMN_NAMES order
@@ -19,10 +20,8 @@ enum {
     COL_WEATHERCODE = 10
 };
 
-static double clamp01(double x) {
-    if (x < 0.0) return 0.0;
-    if (x > 1.0) return 1.0;
-    return x;
+static inline double clamp01(double x) {
+    return x < 0.0 ? 0.0 : (x > 1.0 ? 1.0 : x);
 }
 
 static double weathercode_baseline(double code) {
@@ -38,6 +37,57 @@ static double weathercode_baseline(double code) {
     return 0.30;
 }
 
+static void swap_d(double* a, int i, int j) {
+    double t = a[i];
+    a[i] = a[j];
+    a[j] = t;
+}
+
+// k-th smallest of a[0..n-1] (0-based), partially reordering a.
+// Quickselect with median-of-three pivots: expected O(n).
+static double select_kth(double* a, int n, int k) {
+    int lo = 0, hi = n - 1;
+
+    while (lo < hi) {
+        int mid = lo + (hi - lo) / 2;
+        if (a[mid] < a[lo]) swap_d(a, lo, mid);
+        if (a[hi] < a[lo])  swap_d(a, lo, hi);
+        if (a[hi] < a[mid]) swap_d(a, mid, hi);
+        double pivot = a[mid];
+
+        int i = lo, j = hi;
+        while (i <= j) {
+            while (a[i] < pivot) i++;
+            while (a[j] > pivot) j--;
+            if (i <= j) {
+                swap_d(a, i, j);
+                i++;
+                j--;
+            }
+        }
+
+        if (k <= j) hi = j;
+        else if (k >= i) lo = i;
+        else return a[k];
+    }
+    return a[k];
+}
+
+// Rounded, saturating casts for the integer SegmentDetail/model fields:
+// NaN -> 0, out-of-range values clamp instead of wrapping (negative gusts -> 0, not 4e9)
+static uint32_t to_u32(double x) {
+    if (!(x > 0.0)) return 0;
+    if (x >= (double)UINT32_MAX) return UINT32_MAX;
+    return (uint32_t)llround(x);
+}
+
+static int32_t to_i32(double x) {
+    if (isnan(x)) return 0;
+    if (x <= (double)INT32_MIN) return INT32_MIN;
+    if (x >= (double)INT32_MAX) return INT32_MAX;
+    return (int32_t)llround(x);
+}
+
 static RiskLevel risk_level_from_point(double pr) {
     // Align to your policy bands (roughly): <50 OK, 50-69 delays, >=70 unsafe
     // Convert pr [0..1] to score [1..100], then map.
@@ -47,76 +97,147 @@ static RiskLevel risk_level_from_point(double pr) {
     return RISK_LOW;
 }
 
+// Row inputs after NaN defaults and unit correction (segment details report these)
+typedef struct {
+    double temp_min;
+    double precip;
+    double gusts;
+    double vis;
+} PointInputs;
+
+// Per-point risk [0..1] for one row of the weather matrix.
+// Branch-light so the scoring loop stays tight; `in` may be NULL.
+static inline double point_risk_row(const double* r, PointInputs* in) {
+    double temp_min = r[COL_TEMP_MIN];
+    double precip   = r[COL_PRECIP_MM];
+    double prob     = r[COL_PRECIP_PROB];
+    double snow     = r[COL_SNOW_MM];
+    double gusts    = r[COL_WIND_GUSTS];
+    double vis      = r[COL_VISIBILITY];
+    double wcode    = r[COL_WEATHERCODE];
+
+    // Defaults for NaNs
+    temp_min = isnan(temp_min) ? 5.0 : temp_min;
+    precip   = isnan(precip)   ? 0.0 : precip;
+    prob     = isnan(prob)     ? 0.0 : prob;
+    snow     = isnan(snow)     ? 0.0 : snow;
+    gusts    = isnan(gusts)    ? 0.0 : gusts;
+    vis      = isnan(vis)      ? 20000.0 : vis;
+
+    // Auto unit correction
+    // visibility: if looks like km, convert to meters
+    vis = (vis > 0.0 && vis < 200.0) ? vis * 1000.0 : vis;
+    // gusts: if looks like m/s, convert to km/h
+    gusts = (gusts > 0.0 && gusts < 30.0) ? gusts * 3.6 : gusts;
+
+    double base = weathercode_baseline(wcode);
+
+    // Less trigger-happy thresholds (calibrated)
+    double gust_r   = clamp01((gusts - 60.0) / 40.0);         // 60..100 km/h
+    double precip_r = clamp01((precip - 5.0) / 20.0);         // 5..25 mm/day
+    double vis_r    = clamp01((3000.0 - vis) / 2500.0);       // <3km matters
+    double ice_r    = (temp_min <= 0.0 && (precip > 0.2 || snow > 0.0)) ? 1.0 : 0.0;
+    double snow_r   = clamp01((snow - 5.0) / 20.0);           // 5..25 mm/day
+    double prob_r   = clamp01(prob / 100.0);
+
+    if (in) {
+        in->temp_min = temp_min;
+        in->precip = precip;
+        in->gusts = gusts;
+        in->vis = vis;
+    }
+
+    // Weighted sum (more stable than max)
+    double pr =
+        0.25 * base +
+        0.25 * gust_r +
+        0.20 * precip_r +
+        0.20 * vis_r +
+        0.15 * snow_r +
+        0.25 * ice_r +
+        0.05 * prob_r;
+
+    return clamp01(pr);
+}
+
+static int check_matrix(const double* weather, int rows, int cols) {
+    if (!weather || rows <= 0 || cols <= COL_WEATHERCODE) return SHIPPING_ERR_INVALID_ARG;
+    if ((size_t)rows > MAX_SEGMENTS) return SHIPPING_ERR_CAPACITY;
+    return 0;
+}
+
 EXPORT int score_route_from_weather_matrix(const double* weather, int rows, int cols) {
-    if (!weather || rows <= 0 || cols <= COL_WEATHERCODE) return -1;
-    if (rows > MAX_SEGMENTS) return -2; // your C model supports up to 32 segments
+    int err = check_matrix(weather, rows, cols);
+    if (err) return err;
+
+    // Per-point risk array
+    double* prisk = (double*)malloc((size_t)rows * sizeof(double));
+    if (!prisk) return SHIPPING_ERR_NOMEM;
+
+    // Lean pass: no Route/RouteSegment construction (see route_segments_from_weather_matrix)
+    for (int i = 0; i < rows; i++) {
+        prisk[i] = point_risk_row(weather + (size_t)i * (size_t)cols, NULL);
+    }
+
+    // Aggregate risk across route points: 75th percentile (good balance)
+    int idx = (int)floor(0.75 * (rows - 1));
+    double route_risk = select_kth(prisk, rows, idx);
+    free(prisk);
+
+    // Calibration: weight the final score lower (tune here)
+    const double RISK_GAMMA = 1.6;
+    const double RISK_SCALE = 0.75;
 
-    // Per-point risk array (small)
-    double prisk[ MAX_SEGMENTS ];
+    double calibrated = pow(route_risk, RISK_GAMMA) * RISK_SCALE;
+    calibrated = clamp01(calibrated);
+
+    int score = (int)llround(1.0 + calibrated * 99.0);
+    if (score < 1) score = 1;
+    if (score > 100) score = 100;
 
-    // Build a Route using your existing models (optional but “uses your C files” properly)
+    return score;
+}
+
+EXPORT int segment_detail_size(void) {
+    return (int)sizeof(SegmentDetail);
+}
+
+EXPORT int route_segments_from_weather_matrix(const double* weather,
+                                              int rows,
+                                              int cols,
+                                              uint32_t delay_cost_per_minute_cents,
+                                              SegmentDetail* out,
+                                              int out_len) {
+    int err = check_matrix(weather, rows, cols);
+    if (err) return err;
+    if (!out || out_len < rows) return SHIPPING_ERR_INVALID_ARG;
+
+    // Build a Route using the models so segment costs/levels come from models.c
     Route route;
     route_init(&route, "PY-ROUTE");
+    if (route_reserve(&route, (size_t)rows) != ROUTE_OK) return SHIPPING_ERR_NOMEM;
+
+    double* prisk = (double*)malloc((size_t)rows * sizeof(double));
+    if (!prisk) {
+        route_free(&route);
+        return SHIPPING_ERR_NOMEM;
+    }
 
     for (int i = 0; i < rows; i++) {
-        const double* r = weather + (i * cols);
-
-        double temp_min = r[COL_TEMP_MIN];
-        double precip   = r[COL_PRECIP_MM];
-        double prob     = r[COL_PRECIP_PROB];
-        double snow     = r[COL_SNOW_MM];
-        double gusts    = r[COL_WIND_GUSTS];
-        double vis      = r[COL_VISIBILITY];
-        double wcode    = r[COL_WEATHERCODE];
-
-        // Defaults for NaNs
-        if (isnan(temp_min)) temp_min = 5.0;
-        if (isnan(precip))   precip = 0.0;
-        if (isnan(prob))     prob = 0.0;
-        if (isnan(snow))     snow = 0.0;
-        if (isnan(gusts))    gusts = 0.0;
-        if (isnan(vis))      vis = 20000.0;
-
-        // Auto unit correction
-        // visibility: if looks like km, convert to meters
-        if (vis > 0.0 && vis < 200.0) vis *= 1000.0;
-        // gusts: if looks like m/s, convert to km/h
-        if (gusts > 0.0 && gusts < 30.0) gusts *= 3.6;
-
-        double base = weathercode_baseline(wcode);
-
-        // Less trigger-happy thresholds (calibrated)
-        double gust_r   = clamp01((gusts - 60.0) / 40.0);         // 60..100 km/h
-        double precip_r = clamp01((precip - 5.0) / 20.0);         // 5..25 mm/day
-        double vis_r    = clamp01((3000.0 - vis) / 2500.0);       // <3km matters
-        double ice_r    = (temp_min <= 0.0 && (precip > 0.2 || snow > 0.0)) ? 1.0 : 0.0;
-        double snow_r   = clamp01((snow - 5.0) / 20.0);           // 5..25 mm/day
-        double prob_r   = clamp01(prob / 100.0);
-
-        // Weighted sum (more stable than max)
-        double pr =
-            0.25 * base +
-            0.25 * gust_r +
-            0.20 * precip_r +
-            0.20 * vis_r +
-            0.15 * snow_r +
-            0.25 * ice_r +
-            0.05 * prob_r;
-
-        pr = clamp01(pr);
+        PointInputs in;
+        double pr = point_risk_row(weather + (size_t)i * (size_t)cols, &in);
         prisk[i] = pr;
 
-        // Populate your RouteSegment (so we really use models.c/h)
         RouteSegment seg;
         memset(&seg, 0, sizeof(seg));
         region_init(&seg.region, "AUTO", "Auto Segment");
         seg.distance_km = 1;                 // placeholder (optional)
         seg.cost.base_cost_cents = 0;         // placeholder (optional)
 
-        seg.weather.temperature_c = (int32_t)llround(temp_min);
-        seg.weather.wind_kph = (uint32_t)llround(gusts);
-        seg.weather.precipitation_mm = (uint32_t)llround(precip);
-        seg.weather.visibility_km = (uint32_t)llround(vis / 1000.0);
+        seg.weather.temperature_c = to_i32(in.temp_min);
+        seg.weather.wind_kph = to_u32(in.gusts);
+        seg.weather.precipitation_mm = to_u32(in.precip);
+        seg.weather.visibility_km = to_u32(in.vis / 1000.0);
         seg.weather.flags = 0;
         seg.weather.risk = risk_level_from_point(pr);
 
@@ -125,43 +246,70 @@ EXPORT int score_route_from_weather_matrix(const double* weather, int rows, int
         route_add_segment(&route, &seg);
     }
 
-    // Aggregate risk across route points: 75th percentile (good balance)
-    // sort prisk in-place (rows <= 32 => insertion sort is fine)
-    for (int i = 1; i < rows; i++) {
-        double key = prisk[i];
-        int j = i - 1;
-        while (j >= 0 && prisk[j] > key) {
-            prisk[j + 1] = prisk[j];
-            j--;
-        }
-        prisk[j + 1] = key;
+    route_recalculate_totals(&route, delay_cost_per_minute_cents);
+
+    for (int i = 0; i < rows; i++) {
+        const RouteSegment* s = &route.segments[i];
+        SegmentDetail* d = &out[i];
+
+        d->risk = prisk[i];
+        d->risk_level = (int32_t)s->weather.risk;
+        d->temperature_c = s->weather.temperature_c;
+        d->wind_kph = s->weather.wind_kph;
+        d->precipitation_mm = s->weather.precipitation_mm;
+        d->visibility_km = s->weather.visibility_km;
+        d->distance_km = s->distance_km;
+        d->expected_delay_minutes = s->expected_delay_minutes;
+        d->base_cost_cents = s->cost.base_cost_cents;
+        d->delay_cost_cents = s->cost.delay_cost_cents;
+        d->expected_segment_cost_cents = s->cost.expected_segment_cost_cents;
     }
-    int idx = (int)floor(0.75 * (rows - 1));
-    double route_risk = prisk[idx];
 
-    // Calibration: weight the final score lower (tune here)
-    const double RISK_GAMMA = 1.6;
-    const double RISK_SCALE = 0.75;
+    free(prisk);
+    route_free(&route);
+    return rows;
+}
 
-    double calibrated = pow(route_risk, RISK_GAMMA) * RISK_SCALE;
-    calibrated = clamp01(calibrated);
+EXPORT int score_routes_from_weather_matrix_batch(const double* weather,
+                                                  const int64_t* offsets,
+                                                  int n_routes,
+                                                  int cols,
+                                                  int* out_scores,
+                                                  int* out_label_codes) {
+    if (!weather || !offsets || n_routes < 0 || !out_scores || !out_label_codes) return -1;
+    if (offsets[0] != 0) return -1;
 
-    int score = (int)llround(1.0 + calibrated * 99.0);
-    if (score < 1) score = 1;
-    if (score > 100) score = 100;
+    for (int r = 0; r < n_routes; r++) {
+        int64_t begin = offsets[r];
+        int64_t end = offsets[r + 1];
+        int score = -1;
 
-    // Recalculate route totals (optional; uses your model)
-    route_recalculate_totals(&route, 20u);
+        if (end >= begin && end - begin <= INT32_MAX) {
+            score = score_route_from_weather_matrix(weather + begin * cols, (int)(end - begin), cols);
+        }
 
-    return score;
+        out_scores[r] = score;
+        out_label_codes[r] = score < 0 ? -1 : risk_label_code_from_score(score);
+    }
+    return 0;
+}
+
+static const char* const RISK_LABELS[] = {
+    "OK TO TRAVEL",
+    "DELAYS LIKELY",
+    "NOT SAFE TO TRAVEL"
+};
+
+EXPORT int risk_label_code_from_score(int score) {
+    if (score >= 70) return 2;
+    if (score >= 50) return 1;
+    return 0;
 }
 
 EXPORT int risk_label_from_score(int score, char* out_buf, int out_buf_len) {
     if (!out_buf || out_buf_len <= 0) return -1;
 
-    const char* label = "OK TO TRAVEL";
-    if (score >= 70) label = "NOT SAFE TO TRAVEL";
-    else if (score >= 50) label = "DELAYS LIKELY";
+    const char* label = RISK_LABELS[risk_label_code_from_score(score)];
 
     strncpy(out_buf, label, (size_t)out_buf_len - 1);
     out_buf[out_buf_len - 1] = '\0';
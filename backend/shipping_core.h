@@ -1,6 +1,8 @@
 #ifndef SHIPPING_CORE_H
 #define SHIPPING_CORE_H
 
+#include <stdint.h>
+
 #ifdef _WIN32
   #define EXPORT __declspec(dllexport)
 #else
@@ -11,13 +13,61 @@
 extern "C" {
 #endif
 
+// Error codes returned instead of a score
+#define SHIPPING_ERR_INVALID_ARG  (-1)   // null matrix, rows <= 0 or too few columns
+#define SHIPPING_ERR_CAPACITY     (-2)   // rows > MAX_SEGMENTS (see models.h)
+#define SHIPPING_ERR_NOMEM        (-3)   // scratch/route allocation failed
+
 // Input: weather matrix (row-major) of shape [rows, cols], dtype double
-// Output: route risk score 1..100 (negative on error)
+// Output: route risk score 1..100 (negative SHIPPING_ERR_* on error)
 EXPORT int score_route_from_weather_matrix(const double* weather, int rows, int cols);
 
+// Per-segment detail row for route_segments_from_weather_matrix.
+// Mirrored by SEGMENT_DETAIL_DTYPE in c_risk.py (check with segment_detail_size).
+typedef struct {
+    double   risk;                         // per-point risk 0..1
+    int32_t  risk_level;                   // RiskLevel: 0 low, 1 medium, 2 high
+    int32_t  temperature_c;
+    uint32_t wind_kph;
+    uint32_t precipitation_mm;
+    uint32_t visibility_km;
+    uint32_t distance_km;
+    uint32_t expected_delay_minutes;
+    uint32_t base_cost_cents;
+    uint32_t delay_cost_cents;
+    uint32_t expected_segment_cost_cents;
+} SegmentDetail;
+
+// Builds the full Route model for the matrix and writes one SegmentDetail per row
+// into out[0..rows-1] (out_len must be >= rows).
+// Returns rows written, or a negative SHIPPING_ERR_* code.
+EXPORT int route_segments_from_weather_matrix(const double* weather,
+                                              int rows,
+                                              int cols,
+                                              uint32_t delay_cost_per_minute_cents,
+                                              SegmentDetail* out,
+                                              int out_len);
+
+EXPORT int segment_detail_size(void);
+
+// Batch: route r is rows offsets[r] .. offsets[r+1]-1 of one row-major weather
+// matrix of shape [offsets[n_routes], cols] (offsets has n_routes + 1 entries).
+// Writes out_scores[r] (1..100, negative on error for that route) and
+// out_label_codes[r] (see risk_label_code_from_score, -1 on error).
+// Returns 0, or -1 if the arguments themselves are invalid.
+EXPORT int score_routes_from_weather_matrix_batch(const double* weather,
+                                                  const int64_t* offsets,
+                                                  int n_routes,
+                                                  int cols,
+                                                  int* out_scores,
+                                                  int* out_label_codes);
+
 // Output: policy label string for a score (>=70 unsafe, >=50 delays)
 EXPORT int risk_label_from_score(int score, char* out_buf, int out_buf_len);
 
+// Output: policy label code for a score: 0 OK TO TRAVEL, 1 DELAYS LIKELY, 2 NOT SAFE TO TRAVEL
+EXPORT int risk_label_code_from_score(int score);
+
 #ifdef __cplusplus
 }
 #endif
@@ -0,0 +1,73 @@
+from datetime import date
+
+import pytest
+
+from extractor import (
+    certain_shipment,
+    extract_shipment,
+    find_date,
+    is_complete,
+    merge_shipments,
+    roles_are_certain,
+    unknown_place_words,
+)
+from geocode import Gazetteer
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer.load()
+
+
+def test_three_places_are_not_certain(gazetteer):
+    text = "Reading the docs, I need Leeds to Bath on 2026-03-01"
+    shipment = extract_shipment(text, gazetteer)
+    assert shipment["ship_to_city"] == "Bath"
+    assert shipment["ship_date"] == "2026-03-01"
+    # 'Reading' is a place in the gazetteer too: the origin is only a guess
+    assert not roles_are_certain(text, gazetteer)
+
+
+@pytest.mark.parametrize(
+    "text, certain",
+    [
+        ("from Leeds to Bath on 2026-03-01", True),
+        ("Leeds to Bath on 2026-03-01", True),
+        ("to Bath from Leeds", True),
+        ("Leeds Bath 2026-03-01", False),
+        ("from Leeds from Bath", False),
+        ("Bath", False),
+        ("to Bath", True),
+        ("on 2026-03-01", True),
+    ],
+)
+def test_roles_are_certain(gazetteer, text, certain):
+    assert roles_are_certain(text, gazetteer) is certain
+
+
+def test_follow_up_naming_unknown_city_is_not_certain(gazetteer):
+    known = extract_shipment("from Leeds to Bath on 2026-03-01", gazetteer)
+    follow_up = "actually make it Bordeaux, on 2 March 2026"
+    # Merged with the session it looks complete, but the message alone is not
+    assert is_complete(merge_shipments(known, extract_shipment(follow_up, gazetteer)))
+    assert certain_shipment(follow_up, gazetteer) is None
+    assert unknown_place_words(follow_up, gazetteer) == ["Bordeaux"]
+    assert certain_shipment("from Leeds to Bath via Bordeaux on 2 March 2026", gazetteer) is None
+
+
+def test_certain_shipment(gazetteer):
+    shipment = certain_shipment("Ship from Leeds to Bath on 2 March 2027", gazetteer)
+    assert shipment == {"ship_from_city": "Leeds", "ship_to_city": "Bath", "ship_date": "2027-03-02"}
+
+
+@pytest.mark.parametrize(
+    "text, iso",
+    [
+        ("3rd of March", "2027-03-03"),
+        ("October 20th", "2026-10-20"),
+        ("3rd of March 2026", "2026-03-03"),
+        ("29 Feb", "2028-02-29"),
+    ],
+)
+def test_date_without_year_is_next_occurrence(text, iso):
+    assert find_date(text, today=date(2026, 10, 17)) == iso
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from weather_on_route import COLUMN_NAMES
+from risk import score_routes_batch
+
+# Files inside an archive directory
+ARCHIVE_DATA_FILE = "weather.f32"
+ARCHIVE_INDEX_FILE = "index.sqlite"
+
+_DTYPE = np.dtype(np.float32)
+
+
+class WeatherArchive:
+    """
+    Append-only on-disk archive of route weather matrices for backtesting.
+
+    Each analysis's (n_points, len(COLUMN_NAMES)) matrix is appended as
+    float32 rows to one flat data file; a SQLite index records
+    (route key, date, score, row offset, row count) per entry. Readers
+    memory-map the data file, so matrix() and batch() return views into
+    the page cache instead of copies, and batch() feeds score_routes_batch
+    directly.
+
+    Rows are written before their index row is committed. An append that
+    fails truncates its rows again; rows left behind by a crash between the
+    two are truncated on the next open. One writing process per archive;
+    safe to share between threads.
+    """
+
+    def __init__(self, path: str, column_names: Sequence[str] = COLUMN_NAMES):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.column_names = list(column_names)
+        self._width = len(self.column_names)
+        self._data_path = os.path.join(path, ARCHIVE_DATA_FILE)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, ARCHIVE_INDEX_FILE), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS archive_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS archive_entries (
+                id INTEGER PRIMARY KEY,
+                route_key TEXT NOT NULL,
+                date TEXT NOT NULL,
+                score INTEGER,
+                row_offset INTEGER NOT NULL,
+                n_rows INTEGER NOT NULL,
+                stored_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS archive_route_date ON archive_entries (route_key, date);
+            CREATE INDEX IF NOT EXISTS archive_date ON archive_entries (date);
+            """
+        )
+        row = self._db.execute("SELECT value FROM archive_meta WHERE key='columns'").fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO archive_meta VALUES ('columns', ?)", (json.dumps(self.column_names),))
+        elif json.loads(row[0]) != self.column_names:
+            raise ValueError(f"Archive {path} was written with columns {json.loads(row[0])}")
+        self._db.commit()
+
+        end = self._db.execute("SELECT COALESCE(MAX(row_offset + n_rows), 0) FROM archive_entries").fetchone()[0]
+        self._rows = int(end)
+        # Drop rows whose index entry never got committed
+        with open(self._data_path, "ab") as f:
+            if f.tell() > self._rows * self._row_bytes:
+                f.truncate(self._rows * self._row_bytes)
+
+        self._out = None
+        self._map: Optional[np.ndarray] = None
+
+    @property
+    def _row_bytes(self) -> int:
+        return self._width * _DTYPE.itemsize
+
+    def append(self, route_key: str, date: str, weather: np.ndarray, score: Optional[int] = None) -> int:
+        """Archive one (n_points, columns) matrix; returns its entry id."""
+        rows = np.ascontiguousarray(weather, dtype=np.float32)
+        if rows.ndim != 2 or rows.shape[1] != self._width:
+            raise ValueError(f"weather must have shape (n_points, {self._width})")
+        with self._lock:
+            if self._out is None:
+                self._out = open(self._data_path, "ab")
+            try:
+                self._out.write(rows.tobytes())
+                self._out.flush()
+                cur = self._db.execute(
+                    "INSERT INTO archive_entries (route_key, date, score, row_offset, n_rows, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (route_key, date, None if score is None else int(score), self._rows, len(rows), time.time()),
+                )
+                self._db.commit()
+            except BaseException:
+                # Keep the data file in step with the index, or later entries would read back shifted
+                self._db.rollback()
+                self._out.truncate(self._rows * self._row_bytes)
+                self._out.seek(0, os.SEEK_END)
+                raise
+            self._rows += len(rows)
+            return int(cur.lastrowid)
+
+    def entries(
+        self,
+        route_key: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Index rows (oldest first), optionally filtered by route and inclusive YYYY-MM-DD range."""
+        where, args = [], []
+        if route_key is not None:
+            where.append("route_key = ?")
+            args.append(route_key)
+        if date_from is not None:
+            where.append("date >= ?")
+            args.append(date_from)
+        if date_to is not None:
+            where.append("date <= ?")
+            args.append(date_to)
+        sql = "SELECT id, route_key, date, score, row_offset, n_rows FROM archive_entries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY id", args).fetchall()
+        keys = ("id", "route_key", "date", "score", "row_offset", "n_rows")
+        return [dict(zip(keys, r)) for r in rows]
+
+    def data(self) -> np.ndarray:
+        """Every archived row as one read-only (total_rows, columns) memory-mapped array."""
+        with self._lock:
+            rows = self._rows
+            if self._map is None or len(self._map) < rows:
+                # Remap after appends; readers holding the old map keep a valid view
+                self._map = (
+                    np.memmap(self._data_path, dtype=np.float32, mode="r", shape=(rows, self._width))
+                    if rows
+                    else np.empty((0, self._width), dtype=np.float32)
+                )
+            return self._map[:rows]
+
+    def matrix(self, entry: Dict[str, Any]) -> np.ndarray:
+        """Zero-copy view of one entry's (n_points, columns) matrix."""
+        start = entry["row_offset"]
+        return self.data()[start : start + entry["n_rows"]]
+
+    def batch(self, entries: Optional[List[Dict[str, Any]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (weather, offsets) for score_routes_batch(weather, COLUMN_NAMES, offsets=offsets).
+
+        With no `entries` this covers the whole archive and `weather` is a
+        view of the mapped file (no copy). A filtered selection is gathered
+        into a new array unless its entries are already one contiguous run.
+        """
+        if entries is None:
+            entries = self.entries()
+        lens = np.array([e["n_rows"] for e in entries], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lens))).astype(np.int64)
+        data = self.data()
+        if not entries:
+            return data[:0], offsets
+        start = entries[0]["row_offset"]
+        if all(e["row_offset"] == start + o for e, o in zip(entries, offsets[:-1])):
+            return data[start : start + offsets[-1]], offsets
+        return np.concatenate([data[e["row_offset"] : e["row_offset"] + e["n_rows"]] for e in entries]), offsets
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM archive_entries").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._out is not None:
+                self._out.close()
+                self._out = None
+            self._map = None
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        entries = len(self)
+        with self._lock:
+            return {"entries": entries, "rows": self._rows, "bytes": self._rows * self._row_bytes}
+
+
+_default_archive: Optional[WeatherArchive] = None
+_default_lock = threading.Lock()
+
+
+def get_weather_archive() -> Optional[WeatherArchive]:
+    """
+    Process-wide archive written by analysis_pipeline, or None when disabled.
+    Set WEATHER_ARCHIVE_DIR to a directory to record every analysed route.
+    """
+    global _default_archive
+    path = os.getenv("WEATHER_ARCHIVE_DIR")
+    if not path:
+        return None
+    with _default_lock:
+        if _default_archive is None:
+            _default_archive = WeatherArchive(path)
+        return _default_archive
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Re-score an archive of route weather (backtest).")
+    parser.add_argument("path", help="archive directory (WEATHER_ARCHIVE_DIR)")
+    parser.add_argument("--route", help="only this route key ('from|to')")
+    parser.add_argument("--from-date", help="first ship date, YYYY-MM-DD")
+    parser.add_argument("--to-date", help="last ship date, YYYY-MM-DD")
+    args = parser.parse_args()
+
+    archive = WeatherArchive(args.path)
+    entries = archive.entries(args.route, args.from_date, args.to_date)
+    start = time.perf_counter()
+    weather, offsets = archive.batch(entries)
+    scores = score_routes_batch(weather, archive.column_names, offsets=offsets) if entries else np.zeros(0, np.int64)
+    elapsed = time.perf_counter() - start
+
+    stored = np.array([-1 if e["score"] is None else e["score"] for e in entries], dtype=np.int64)
+    changed = int(np.sum((stored >= 0) & (stored != scores)))
+    print(json.dumps({
+        "entries": len(entries),
+        "rows": int(offsets[-1]),
+        "seconds": round(elapsed, 4),
+        "scores_changed": changed,
+        "mean_score": float(scores.mean()) if len(scores) else None,
+    }))
+    archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Grid cell size in degrees (~5.5 km N/S in the UK); points in one cell share weather
+WEATHER_CACHE_GRID_DEG = 0.05
+# Forecasts are refreshed a few times a day upstream
+WEATHER_CACHE_TTL_S = 3 * 3600.0
+WEATHER_CACHE_MAX_ENTRIES = 50_000
+
+# Daily variables we agreed earlier (Open-Meteo daily); cached values are in this order
+DAILY_VARS = [
+    "temperature_2m_min",
+    "temperature_2m_max",
+    "precipitation_sum",
+    "precipitation_probability_max",
+    "snowfall_sum",
+    "wind_speed_10m_max",
+    "wind_gusts_10m_max",
+    "visibility_min",
+    "weathercode",
+]
+
+CacheKey = Tuple[int, int, str]  # (lat cell, lon cell, YYYY-MM-DD)
+
+
+def grid_cell(lat: float, lon: float, grid_deg: float = WEATHER_CACHE_GRID_DEG) -> Tuple[int, int]:
+    """Quantise a coordinate to integer grid-cell indices."""
+    return (int(round(lat / grid_deg)), int(round(lon / grid_deg)))
+
+
+class WeatherCache:
+    """
+    Two-tier cache for per-point daily weather.
+
+    Keys are (grid cell, date) so nearby route points share one entry.
+    Tier 1 is a bounded in-memory LRU with a per-entry TTL; tier 2 is an
+    optional SQLite file that survives restarts. Values are any JSON-able
+    object (weather_on_route stores the daily values in DAILY_VARS order).
+    Safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = WEATHER_CACHE_MAX_ENTRIES,
+        ttl_s: float = WEATHER_CACHE_TTL_S,
+        grid_deg: float = WEATHER_CACHE_GRID_DEG,
+        db_path: Optional[str] = None,
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.grid_deg = grid_deg
+        self.db_path = db_path
+
+        self._mem: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS weather_cache (
+                    cell_lat INTEGER NOT NULL,
+                    cell_lon INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (cell_lat, cell_lon, date)
+                )
+                """
+            )
+            self._db.commit()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, lat: float, lon: float, date_yyyy_mm_dd: str) -> CacheKey:
+        c_lat, c_lon = grid_cell(lat, lon, self.grid_deg)
+        return (c_lat, c_lon, date_yyyy_mm_dd)
+
+    def get(self, lat: float, lon: float, date_yyyy_mm_dd: str) -> Optional[Any]:
+        return self.get_key(self.key(lat, lon, date_yyyy_mm_dd))
+
+    def put(self, lat: float, lon: float, date_yyyy_mm_dd: str, value: Any) -> None:
+        self.put_key(self.key(lat, lon, date_yyyy_mm_dd), value)
+
+    @property
+    def on_disk(self) -> bool:
+        """True when the SQLite tier is enabled, so lookups and stores may block on disk I/O."""
+        return self._db is not None
+
+    def get_key(self, key: CacheKey) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            return self._get_locked(key, now)
+
+    def get_many(self, keys: Sequence[CacheKey]) -> List[Optional[Any]]:
+        """get_key for every key, under one lock acquisition."""
+        now = time.time()
+        with self._lock:
+            return [self._get_locked(key, now) for key in keys]
+
+    def _get_locked(self, key: CacheKey, now: float) -> Optional[Any]:
+        entry = self._mem.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if now - stored_at <= self.ttl_s:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._mem[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT stored_at, payload FROM weather_cache WHERE cell_lat=? AND cell_lon=? AND date=?",
+                key,
+            ).fetchone()
+            if row is not None and now - row[0] <= self.ttl_s:
+                value = json.loads(row[1])
+                self._mem_put(key, row[0], value)
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def put_key(self, key: CacheKey, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._mem_put(key, now, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO weather_cache VALUES (?, ?, ?, ?, ?)",
+                    (*key, now, json.dumps(value)),
+                )
+                self._db.commit()
+
+    def put_many(self, items: Iterable[Tuple[CacheKey, Any]]) -> None:
+        """put_key for every (key, value); the SQLite tier is written in one transaction."""
+        now = time.time()
+        items = list(items)
+        with self._lock:
+            for key, value in items:
+                self._mem_put(key, now, value)
+            if self._db is not None and items:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO weather_cache VALUES (?, ?, ?, ?, ?)",
+                    [(*key, now, json.dumps(value)) for key, value in items],
+                )
+                self._db.commit()
+
+    def _mem_put(self, key: CacheKey, stored_at: float, value: Any) -> None:
+        self._mem[key] = (stored_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM weather_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._mem),
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+_default_cache: Optional[WeatherCache] = None
+_default_lock = threading.Lock()
+
+
+def get_weather_cache() -> WeatherCache:
+    """
+    Process-wide cache used by weather_on_route.
+    Set WEATHER_CACHE_DB to a file path to enable the SQLite tier.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = WeatherCache(db_path=os.getenv("WEATHER_CACHE_DB") or None)
+        return _default_cache
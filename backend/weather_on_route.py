@@ -1,27 +1,19 @@
 import time
+import asyncio
+from datetime import date, datetime, timedelta, timezone
 import requests
+import httpx
 import numpy as np
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Awaitable, Iterable, Callable
+from urllib.parse import urlsplit
 from route_find import city_to_coordinates, osrm_route_100_points
 from risk import score_route_risk
+from weather_cache import WeatherCache, get_weather_cache, WEATHER_CACHE_GRID_DEG, DAILY_VARS
 
 
 
 Coord = Tuple[float, float]  # (lat, lon)
 
-# Daily variables we agreed earlier (Open-Meteo daily)
-DAILY_VARS = [
-    "temperature_2m_min",
-    "temperature_2m_max",
-    "precipitation_sum",
-    "precipitation_probability_max",
-    "snowfall_sum",
-    "wind_speed_10m_max",
-    "wind_gusts_10m_max",
-    "visibility_min",
-    "weathercode",
-]
-
 # Output column order (you can change / extend this)
 COLUMN_NAMES = [
     "lat",
@@ -37,24 +29,116 @@ COLUMN_NAMES = [
     "weathercode",
 ]
 
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Async engine defaults: max in-flight requests and per-host request rate (req/s, 0 = off)
+WEATHER_CONCURRENCY = 16
+WEATHER_RATE_PER_HOST = 50.0
+# Locations per multi-location Open-Meteo request (<= 1 = one request per point)
+WEATHER_BATCH_SIZE = 50
+
+# DAILY_VARS -> column index in COLUMN_NAMES
+DAILY_COLUMNS = [
+    ("temperature_2m_min", 2),
+    ("temperature_2m_max", 3),
+    ("precipitation_sum", 4),
+    ("precipitation_probability_max", 5),
+    ("snowfall_sum", 6),
+    ("wind_speed_10m_max", 7),
+    ("wind_gusts_10m_max", 8),
+    ("visibility_min", 9),
+    ("weathercode", 10),
+]
+_DAILY_COLS = [col for _, col in DAILY_COLUMNS]
+
+# Hourly variables for time-aware route weather (Open-Meteo hourly)
+HOURLY_VARS = [
+    "temperature_2m",
+    "precipitation",
+    "precipitation_probability",
+    "snowfall",
+    "wind_speed_10m",
+    "wind_gusts_10m",
+    "visibility",
+    "weathercode",
+]
+
+# Hours of forecast aggregated around each point's arrival time. The risk
+# thresholds are per day (e.g. precipitation in mm/day), so the timed path
+# scores daily-equivalent values over this window rather than a single hour.
+TIMED_WINDOW_HOURS = 24
+
+# HOURLY_VARS -> (column index in COLUMN_NAMES, aggregation over the arrival
+# window), mirroring the daily variables: temperature_2m_min/max,
+# precipitation_sum, precipitation_probability_max, ... visibility_min
+HOURLY_COLUMNS = [
+    ("temperature_2m", 2, "min"),
+    ("temperature_2m", 3, "max"),
+    ("precipitation", 4, "sum"),
+    ("precipitation_probability", 5, "max"),
+    ("snowfall", 6, "sum"),
+    ("wind_speed_10m", 7, "max"),
+    ("wind_gusts_10m", 8, "max"),
+    ("visibility", 9, "min"),
+    ("weathercode", 10, "max"),
+]
+_HOURLY_DST = [col for _, col, _ in HOURLY_COLUMNS]
+
 
 def fetch_daily_weather_open_meteo(
     lat: float,
     lon: float,
     date_yyyy_mm_dd: str,
     *,
-    base_url: str = "https://api.open-meteo.com/v1/forecast",
+    base_url: str = OPEN_METEO_URL,
     timeout: float = 20.0,
     retries: int = 2,
     # Per-request throttling. Set to 0.0 for fastest runtime.
     sleep_between: float = 0.0,
+    use_cache: bool = True,
 ) -> Dict[str, Any]:
     """
     Fetch one-day daily weather for a single lat/lon from Open-Meteo.
     Returns a dict with keys matching DAILY_VARS, plus lat/lon.
     Missing values become np.nan in later processing.
+    Served from the shared weather cache when the grid cell/date is cached.
     """
-    params = {
+    cache = get_weather_cache() if use_cache else None
+    if cache is not None:
+        values = cache.get(lat, lon, date_yyyy_mm_dd)
+        if values is not None:
+            return {"lat": lat, "lon": lon, **dict(zip(DAILY_VARS, values))}
+
+    params = _daily_params(lat, lon, date_yyyy_mm_dd)
+
+    last_exc: Optional[Exception] = None
+    for attempt in range(retries + 1):
+        try:
+            r = requests.get(base_url, params=params, timeout=timeout)
+            r.raise_for_status()
+            out = _parse_single_day(r.json(), lat, lon)
+            values = [_to_float(out[k]) for k in DAILY_VARS]
+            if cache is not None and not np.isnan(values).all():
+                cache.put(lat, lon, date_yyyy_mm_dd, values)
+            return out
+
+        except Exception as e:
+            last_exc = e
+            if attempt < retries:
+                time.sleep(0.5 * (attempt + 1))
+            else:
+                raise
+
+        finally:
+            if sleep_between and sleep_between > 0:
+                time.sleep(sleep_between)
+
+    # Should never hit here
+    raise RuntimeError(f"Weather fetch failed: {last_exc}")
+
+
+def _daily_params(lat: float, lon: float, date_yyyy_mm_dd: str) -> Dict[str, Any]:
+    return {
         "latitude": lat,
         "longitude": lon,
         "daily": ",".join(DAILY_VARS),
@@ -63,71 +147,647 @@ def fetch_daily_weather_open_meteo(
         "timezone": "UTC",
     }
 
+
+def _multi_daily_params(coords: List[Coord], start_date: str, end_date: str) -> Dict[str, Any]:
+    return {
+        "latitude": ",".join(f"{lat:.5f}" for lat, _ in coords),
+        "longitude": ",".join(f"{lon:.5f}" for _, lon in coords),
+        "daily": ",".join(DAILY_VARS),
+        "start_date": start_date,
+        "end_date": end_date,
+        "timezone": "UTC",
+    }
+
+
+def _multi_hourly_params(coords: List[Coord], start_date: str, end_date: str) -> Dict[str, Any]:
+    return {
+        "latitude": ",".join(f"{lat:.5f}" for lat, _ in coords),
+        "longitude": ",".join(f"{lon:.5f}" for _, lon in coords),
+        "hourly": ",".join(HOURLY_VARS),
+        "start_date": start_date,
+        "end_date": end_date,
+        "timezone": "UTC",
+    }
+
+
+def _parse_single_day(data: Dict[str, Any], lat: float, lon: float) -> Dict[str, Any]:
+    daily = data.get("daily", {})
+    # daily values come back as arrays (length 1 because start=end)
+    out = {"lat": lat, "lon": lon}
+    for k in DAILY_VARS:
+        arr = daily.get(k)
+        out[k] = arr[0] if isinstance(arr, list) and len(arr) > 0 else None
+    return out
+
+
+class AsyncRateLimiter:
+    """
+    Per-host request pacing for the async weather engine.
+    Spaces request start times so each host sees at most `rate_per_sec` requests/second.
+    A rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate_per_sec: float = WEATHER_RATE_PER_HOST):
+        self.min_interval = 1.0 / rate_per_sec if rate_per_sec and rate_per_sec > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, url: str) -> None:
+        if self.min_interval <= 0:
+            return
+        host = urlsplit(url).netloc
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def make_async_client(concurrency: int = WEATHER_CONCURRENCY, timeout: float = 20.0) -> httpx.AsyncClient:
+    """Pooled HTTP client sized for `concurrency` keep-alive connections."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+async def _get_json_with_retries(
+    client: httpx.AsyncClient,
+    url: str,
+    params: Dict[str, Any],
+    *,
+    timeout: float,
+    retries: int,
+    sleep_between: float,
+    limiter: Optional[AsyncRateLimiter],
+) -> Any:
+    """Async counterpart of the retry loop in fetch_daily_weather_open_meteo."""
     last_exc: Optional[Exception] = None
     for attempt in range(retries + 1):
         try:
-            r = requests.get(base_url, params=params, timeout=timeout)
+            if limiter is not None:
+                await limiter.acquire(url)
+            r = await client.get(url, params=params, timeout=timeout)
             r.raise_for_status()
-            data = r.json()
-
-            daily = data.get("daily", {})
-            # daily values come back as arrays (length 1 because start=end)
-            out = {"lat": lat, "lon": lon}
-            for k in DAILY_VARS:
-                arr = daily.get(k)
-                out[k] = arr[0] if isinstance(arr, list) and len(arr) > 0 else None
-
-            return out
+            return r.json()
 
         except Exception as e:
             last_exc = e
             if attempt < retries:
-                time.sleep(0.5 * (attempt + 1))
+                await asyncio.sleep(0.5 * (attempt + 1))
             else:
                 raise
 
         finally:
             if sleep_between and sleep_between > 0:
-                time.sleep(sleep_between)
+                await asyncio.sleep(sleep_between)
 
     # Should never hit here
     raise RuntimeError(f"Weather fetch failed: {last_exc}")
 
 
+async def fetch_daily_weather_open_meteo_async(
+    client: httpx.AsyncClient,
+    lat: float,
+    lon: float,
+    date_yyyy_mm_dd: str,
+    *,
+    base_url: str = OPEN_METEO_URL,
+    timeout: float = 20.0,
+    retries: int = 2,
+    sleep_between: float = 0.0,
+    limiter: Optional[AsyncRateLimiter] = None,
+) -> Dict[str, Any]:
+    """
+    Async version of fetch_daily_weather_open_meteo using a shared (pooled) client.
+    Same retry/backoff semantics and the same return dict.
+    """
+    data = await _get_json_with_retries(
+        client,
+        base_url,
+        _daily_params(lat, lon, date_yyyy_mm_dd),
+        timeout=timeout,
+        retries=retries,
+        sleep_between=sleep_between,
+        limiter=limiter,
+    )
+    return _parse_single_day(data, lat, lon)
+
+
+async def fetch_daily_weather_chunk_async(
+    client: httpx.AsyncClient,
+    coords: List[Coord],
+    start_date: str,
+    end_date: str,
+    *,
+    base_url: str = OPEN_METEO_URL,
+    timeout: float = 20.0,
+    retries: int = 2,
+    sleep_between: float = 0.0,
+    limiter: Optional[AsyncRateLimiter] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fetch daily weather for many locations in ONE Open-Meteo request.
+
+    Open-Meteo takes comma-separated latitude/longitude lists and answers with a
+    list of per-location objects (a single object for one location).
+    Returns one `daily` dict per input coordinate, in input order; each value is
+    the per-day list for start_date..end_date.
+    """
+    data = await _get_json_with_retries(
+        client,
+        base_url,
+        _multi_daily_params(coords, start_date, end_date),
+        timeout=timeout,
+        retries=retries,
+        sleep_between=sleep_between,
+        limiter=limiter,
+    )
+    locations = data if isinstance(data, list) else [data]
+    if len(locations) != len(coords):
+        raise ValueError(f"Open-Meteo returned {len(locations)} locations for {len(coords)} requested")
+    return [loc.get("daily") or {} for loc in locations]
+
+
+async def fetch_hourly_weather_chunk_async(
+    client: httpx.AsyncClient,
+    coords: List[Coord],
+    start_date: str,
+    end_date: str,
+    *,
+    base_url: str = OPEN_METEO_URL,
+    timeout: float = 20.0,
+    retries: int = 2,
+    sleep_between: float = 0.0,
+    limiter: Optional[AsyncRateLimiter] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Hourly counterpart of fetch_daily_weather_chunk_async: one `hourly` dict per
+    input coordinate, each value the UTC hour-by-hour list from 00:00 on
+    start_date to 23:00 on end_date.
+    """
+    data = await _get_json_with_retries(
+        client,
+        base_url,
+        _multi_hourly_params(coords, start_date, end_date),
+        timeout=timeout,
+        retries=retries,
+        sleep_between=sleep_between,
+        limiter=limiter,
+    )
+    locations = data if isinstance(data, list) else [data]
+    if len(locations) != len(coords):
+        raise ValueError(f"Open-Meteo returned {len(locations)} locations for {len(coords)} requested")
+    return [loc.get("hourly") or {} for loc in locations]
+
+
+def _scatter_daily(out: np.ndarray, rows: np.ndarray, dailies: List[Dict[str, Any]], day: int = 0) -> None:
+    """Write day `day` of each location's daily arrays into `out[rows]`, one column at a time."""
+    for var, col in DAILY_COLUMNS:
+        out[rows, col] = [_day_value(d.get(var), day) for d in dailies]
+
+
+def _hour_values(arr: Any, n_hours: int) -> np.ndarray:
+    out = np.full(n_hours, np.nan, dtype=np.float32)
+    if isinstance(arr, list):
+        values = [np.nan if v is None else v for v in arr[:n_hours]]
+        out[: len(values)] = np.asarray(values, dtype=np.float32)
+    return out
+
+
+def _day_value(arr: Any, day: int) -> float:
+    if isinstance(arr, list) and len(arr) > day:
+        return _to_float(arr[day])
+    return float("nan")
+
+
+async def _gather_or_cancel(aws: Iterable[Awaitable[Any]]) -> List[Any]:
+    """asyncio.gather that cancels the remaining tasks as soon as one fails."""
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def cell_index(coords: Any, grid_deg: float = WEATHER_CACHE_GRID_DEG) -> Tuple[List[Coord], np.ndarray]:
+    """
+    Spatial index of points by weather grid cell (the weather cache's grid).
+
+    Returns (reps, inverse): one representative (lat, lon) per distinct cell, in
+    first-seen order, and for every input point the index of its cell in reps,
+    so per-cell results expand back to points with `values[inverse]`.
+    """
+    pts = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(pts) == 0:
+        return [], np.empty(0, dtype=np.intp)
+    cells = np.round(pts / grid_deg).astype(np.int64)
+    _, first, inverse = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    # np.unique sorts cells; renumber them in first-seen order
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    reps = [(float(lat), float(lon)) for lat, lon in pts[first[order]]]
+    return reps, rank[inverse.reshape(-1)]
+
+
+def date_range(start_date: str, end_date: str) -> List[str]:
+    """Inclusive list of YYYY-MM-DD dates from start_date to end_date."""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    if end < start:
+        raise ValueError("end_date must not be before start_date")
+    return [(start + timedelta(days=d)).isoformat() for d in range((end - start).days + 1)]
+
+
+async def _fetch_points_async(
+    coords: List[Coord],
+    start_date: str,
+    end_date: str,
+    *,
+    concurrency: int,
+    rate_per_sec: float,
+    batch_size: int,
+    client: Optional[httpx.AsyncClient],
+) -> np.ndarray:
+    """Network half of weather_for_route_range_to_numpy_async (no cache); returns (days, n, m)."""
+    n_days = len(date_range(start_date, end_date))
+    n = len(coords)
+    out = np.full((n_days, n, len(COLUMN_NAMES)), np.nan, dtype=np.float64)
+    if n == 0:
+        return out
+
+    out[:, :, :2] = coords
+
+    def scatter(rows: np.ndarray, dailies: List[Dict[str, Any]]) -> None:
+        for d in range(n_days):
+            _scatter_daily(out[d], rows, dailies, day=d)
+
+    async def fetch(client: httpx.AsyncClient, chunk: List[Coord], limiter: AsyncRateLimiter) -> List[Dict[str, Any]]:
+        return await fetch_daily_weather_chunk_async(client, chunk, start_date, end_date, limiter=limiter)
+
+    await _fetch_in_chunks(
+        coords,
+        fetch,
+        scatter,
+        concurrency=concurrency,
+        rate_per_sec=rate_per_sec,
+        batch_size=batch_size,
+        client=client,
+    )
+    return out
+
+
+async def _fetch_in_chunks(
+    coords: List[Coord],
+    fetch: Callable[[httpx.AsyncClient, List[Coord], AsyncRateLimiter], Awaitable[List[Dict[str, Any]]]],
+    scatter: Callable[[np.ndarray, List[Dict[str, Any]]], None],
+    *,
+    concurrency: int,
+    rate_per_sec: float,
+    batch_size: int,
+    client: Optional[httpx.AsyncClient],
+) -> None:
+    """
+    Shared fan-out of the multi-location fetchers.
+
+    `await fetch(client, chunk_coords, limiter)` is issued for every chunk of
+    `batch_size` coordinates and `scatter(rows, results)` stores its answer;
+    a chunk that fails is retried one point at a time.
+    """
+    n = len(coords)
+    sem = asyncio.Semaphore(concurrency)
+    limiter = AsyncRateLimiter(rate_per_sec)
+    owns_client = client is None
+    if owns_client:
+        client = make_async_client(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            results = await fetch(client, [coords[i]], limiter)
+        scatter(np.array([i]), results)
+
+    async def chunk(rows: np.ndarray) -> None:
+        try:
+            async with sem:
+                results = await fetch(client, [coords[i] for i in rows], limiter)
+        except Exception as e:
+            print(f"Weather batch of {len(rows)} failed ({e!r}); falling back to per-point requests")
+            await _gather_or_cancel(one(i) for i in rows)
+            return
+        scatter(rows, results)
+
+    try:
+        if batch_size > 1:
+            chunks = [np.arange(s, min(s + batch_size, n)) for s in range(0, n, batch_size)]
+            await _gather_or_cancel(chunk(rows) for rows in chunks)
+        else:
+            await _gather_or_cancel(one(i) for i in range(n))
+    finally:
+        if owns_client:
+            await client.aclose()
+
+
+async def hourly_weather_cube_async(
+    coords: List[Coord],
+    start_date: str,
+    end_date: str,
+    *,
+    concurrency: int = WEATHER_CONCURRENCY,
+    rate_per_sec: float = WEATHER_RATE_PER_HOST,
+    batch_size: int = WEATHER_BATCH_SIZE,
+    client: Optional[httpx.AsyncClient] = None,
+) -> np.ndarray:
+    """
+    Hourly weather for every coordinate from 00:00 UTC on start_date to 23:00 UTC
+    on end_date, as a float32 cube of shape (len(coords), hours, len(HOURLY_VARS)).
+
+    float32 keeps a two-day, 100-point cube around 150 KB, so many analyses can
+    hold one at a time. Requests are batched, bounded and paced exactly like
+    weather_for_route_range_to_numpy_async (no cache: hourly values go stale fast).
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be >= 1")
+
+    n_hours = 24 * len(date_range(start_date, end_date))
+    cube = np.full((len(coords), n_hours, len(HOURLY_VARS)), np.nan, dtype=np.float32)
+    if not coords:
+        return cube
+
+    def scatter(rows: np.ndarray, hourlies: List[Dict[str, Any]]) -> None:
+        for k, var in enumerate(HOURLY_VARS):
+            cube[rows, :, k] = [_hour_values(h.get(var), n_hours) for h in hourlies]
+
+    async def fetch(client: httpx.AsyncClient, chunk: List[Coord], limiter: AsyncRateLimiter) -> List[Dict[str, Any]]:
+        return await fetch_hourly_weather_chunk_async(client, chunk, start_date, end_date, limiter=limiter)
+
+    await _fetch_in_chunks(
+        coords,
+        fetch,
+        scatter,
+        concurrency=concurrency,
+        rate_per_sec=rate_per_sec,
+        batch_size=batch_size,
+        client=client,
+    )
+    return cube
+
+
+def aggregate_hourly_window(window: np.ndarray) -> np.ndarray:
+    """
+    (n, hours, len(HOURLY_VARS)) hourly values -> (n, len(HOURLY_COLUMNS))
+    daily-equivalent values (min/max/sum per HOURLY_COLUMNS). Missing hours
+    are skipped; a variable missing for the whole window stays NaN.
+    """
+    valid = ~np.isnan(window)
+    present = valid.any(axis=1)
+    agg = {
+        "min": np.where(valid, window, np.inf).min(axis=1),
+        "max": np.where(valid, window, -np.inf).max(axis=1),
+        "sum": np.where(valid, window, 0.0).sum(axis=1),
+    }
+    out = np.empty((window.shape[0], len(HOURLY_COLUMNS)), dtype=np.float64)
+    for j, (var, _, how) in enumerate(HOURLY_COLUMNS):
+        k = HOURLY_VARS.index(var)
+        out[:, j] = np.where(present[:, k], agg[how][:, k], np.nan)
+    return out
+
+
+def _as_utc(departure: datetime) -> datetime:
+    # Naive datetimes are taken to be UTC, matching the Open-Meteo requests
+    if departure.tzinfo is None:
+        return departure.replace(tzinfo=timezone.utc)
+    return departure.astimezone(timezone.utc)
+
+
+async def weather_for_route_timed_to_numpy_async(
+    coords: List[Coord],
+    offsets_s: Any,
+    departure: datetime,
+    *,
+    concurrency: int = WEATHER_CONCURRENCY,
+    rate_per_sec: float = WEATHER_RATE_PER_HOST,
+    batch_size: int = WEATHER_BATCH_SIZE,
+    client: Optional[httpx.AsyncClient] = None,
+) -> np.ndarray:
+    """
+    Weather each point will see when the shipment gets there.
+
+    `offsets_s[i]` is the travel time in seconds from departure to coords[i]
+    (see route_find.osrm_route_points_with_times). The hourly cube is fetched
+    once per grid cell for the days the trip spans, then the TIMED_WINDOW_HOURS
+    around every point's arrival hour are gathered with one fancy-indexing
+    step and aggregated to daily-equivalent values (aggregate_hourly_window),
+    so scores are on the same scale as the daily path. Returns the same
+    (len(coords), len(COLUMN_NAMES)) layout as weather_for_route_to_numpy.
+    """
+    offsets = np.asarray(offsets_s, dtype=np.float64).reshape(-1)
+    n = len(coords)
+    if offsets.shape[0] != n:
+        raise ValueError("offsets_s must have one entry per coordinate")
+
+    out = np.full((n, len(COLUMN_NAMES)), np.nan, dtype=np.float64)
+    if n == 0:
+        return out
+    out[:, :2] = coords
+
+    dep = _as_utc(departure)
+    before = TIMED_WINDOW_HOURS // 2
+    first = dep - timedelta(hours=before)
+    day0 = datetime(first.year, first.month, first.day, tzinfo=timezone.utc)
+    arrival_h = (dep - day0).total_seconds() / 3600.0 + np.maximum(offsets, 0.0) / 3600.0
+    hour_idx = np.floor(arrival_h).astype(np.intp)
+    # Window of arrival hour h is h - before .. h - before + TIMED_WINDOW_HOURS - 1
+    window = hour_idx[:, None] + np.arange(-before, TIMED_WINDOW_HOURS - before)
+    last_day = (day0 + timedelta(hours=int(window[:, -1].max()))).date()
+
+    # Points in one grid cell share a cube row
+    reps, point_row = cell_index(coords)
+
+    cube = await hourly_weather_cube_async(
+        reps,
+        day0.date().isoformat(),
+        last_day.isoformat(),
+        concurrency=concurrency,
+        rate_per_sec=rate_per_sec,
+        batch_size=batch_size,
+        client=client,
+    )
+
+    window = np.clip(window, 0, cube.shape[1] - 1)
+    hourly = cube[point_row[:, None], window].astype(np.float64)  # (n, TIMED_WINDOW_HOURS, len(HOURLY_VARS))
+    out[:, _HOURLY_DST] = aggregate_hourly_window(hourly)
+    return out
+
+
+async def _cache_call(cache: WeatherCache, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a cache method in the default executor when it may block on the SQLite tier."""
+    if not cache.on_disk:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+async def weather_for_route_range_to_numpy_async(
+    coords: List[Coord],
+    start_date: str,
+    end_date: str,
+    *,
+    concurrency: int = WEATHER_CONCURRENCY,
+    rate_per_sec: float = WEATHER_RATE_PER_HOST,
+    batch_size: int = WEATHER_BATCH_SIZE,
+    client: Optional[httpx.AsyncClient] = None,
+    use_cache: bool = True,
+    cache: Optional[WeatherCache] = None,
+) -> np.ndarray:
+    """
+    Daily weather for every coordinate on every day from start_date to end_date,
+    as an array of shape (days, len(coords), len(COLUMN_NAMES)).
+
+    Each point's whole date range comes back in the same request (Open-Meteo
+    start_date/end_date). Points are first looked up in the weather cache
+    (shared process cache by default), one entry per (grid cell, day); points
+    in the same grid cell are fetched once. The cache is read and written in
+    one batch each, off the event loop when its SQLite tier is on; all-NaN
+    days are not cached. Misses are sent `batch_size` at a time as
+    multi-location requests; a chunk that fails falls back to one request
+    per point. At most `concurrency` requests are in flight and each
+    host is paced to `rate_per_sec`. Pass a long-lived `client` to reuse its
+    connection pool across routes; otherwise a pooled client is created for
+    this call.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be >= 1")
+
+    days = date_range(start_date, end_date)
+    fetch_kw = dict(concurrency=concurrency, rate_per_sec=rate_per_sec, batch_size=batch_size, client=client)
+    if not use_cache:
+        return await _fetch_points_async(coords, start_date, end_date, **fetch_kw)
+    if cache is None:
+        cache = get_weather_cache()
+
+    n = len(coords)
+    out = np.full((len(days), n, len(COLUMN_NAMES)), np.nan, dtype=np.float64)
+    if n == 0:
+        return out
+    out[:, :, :2] = coords
+
+    # grid cell -> rows in that cell; each cell is looked up (all days) once
+    cells: Dict[Any, List[int]] = {}
+    for i, (lat, lon) in enumerate(coords):
+        cells.setdefault(cache.key(lat, lon, days[0])[:2], []).append(i)
+    keys = [(*cell, day) for cell in cells for day in days]
+    cached = await _cache_call(cache, cache.get_many, keys)
+
+    # cell -> rows still to fetch; one fetch (all days) per cell
+    missing: Dict[Any, List[int]] = {}
+    for c, (cell, rows) in enumerate(cells.items()):
+        values = cached[c * len(days) : (c + 1) * len(days)]
+        if any(v is None for v in values):
+            missing[cell] = rows
+        else:
+            out[np.ix_(range(len(days)), rows, _DAILY_COLS)] = np.asarray(values, dtype=np.float64)[:, None, :]
+
+    if missing:
+        reps = [coords[rows[0]] for rows in missing.values()]
+        fetched = await _fetch_points_async(reps, start_date, end_date, **fetch_kw)
+        store = []
+        for j, (cell, rows) in enumerate(missing.items()):
+            for d, day in enumerate(days):
+                values = fetched[d, j, _DAILY_COLS]
+                out[d][np.ix_(rows, _DAILY_COLS)] = values
+                # A failed or partial upstream answer must not mask good data for the TTL
+                if not np.isnan(values).all():
+                    store.append(((*cell, day), values.tolist()))
+        await _cache_call(cache, cache.put_many, store)
+
+    return out
+
+
+async def weather_for_route_to_numpy_async(
+    coords: List[Coord],
+    date_yyyy_mm_dd: str,
+    *,
+    concurrency: int = WEATHER_CONCURRENCY,
+    rate_per_sec: float = WEATHER_RATE_PER_HOST,
+    batch_size: int = WEATHER_BATCH_SIZE,
+    client: Optional[httpx.AsyncClient] = None,
+    use_cache: bool = True,
+    cache: Optional[WeatherCache] = None,
+) -> np.ndarray:
+    """
+    Concurrent version of weather_for_route_to_numpy: the one-day case of
+    weather_for_route_range_to_numpy_async (see there for the options).
+    """
+    out = await weather_for_route_range_to_numpy_async(
+        coords,
+        date_yyyy_mm_dd,
+        date_yyyy_mm_dd,
+        concurrency=concurrency,
+        rate_per_sec=rate_per_sec,
+        batch_size=batch_size,
+        client=client,
+        use_cache=use_cache,
+        cache=cache,
+    )
+    return out[0]
+
+
+def weather_for_route_range_to_numpy(
+    coords: List[Coord],
+    start_date: str,
+    end_date: str,
+    **kwargs: Any,
+) -> np.ndarray:
+    """
+    Sync wrapper of weather_for_route_range_to_numpy_async:
+    returns (days, len(coords), len(COLUMN_NAMES)).
+    """
+    return asyncio.run(weather_for_route_range_to_numpy_async(coords, start_date, end_date, **kwargs))
+
+
 def weather_for_route_to_numpy(
     coords: List[Coord],
     date_yyyy_mm_dd: str,
+    *,
+    concurrency: int = WEATHER_CONCURRENCY,
+    rate_per_sec: float = WEATHER_RATE_PER_HOST,
+    batch_size: int = WEATHER_BATCH_SIZE,
+    use_cache: bool = True,
 ) -> np.ndarray:
     """
     Given a list of (lat, lon), fetch daily weather for each coordinate for one day,
     and return a numpy array of shape (len(coords), len(COLUMN_NAMES)).
 
     Column order is defined by COLUMN_NAMES.
+    Requests are fanned out concurrently (see weather_for_route_range_to_numpy_async);
+    must not be called from inside a running event loop — await the async version there.
     """
-    n = len(coords)
-    m = len(COLUMN_NAMES)
-    out = np.full((n, m), np.nan, dtype=np.float64)
-
     # weathercode is categorical-ish, but we still store as float for a single numeric array.
     # If you want mixed types, use a structured array instead.
-
-    for i, (lat, lon) in enumerate(coords):
-        w = fetch_daily_weather_open_meteo(lat, lon, date_yyyy_mm_dd)
-
-        # Fill row
-        out[i, 0] = lat
-        out[i, 1] = lon
-        out[i, 2] = _to_float(w.get("temperature_2m_min"))
-        out[i, 3] = _to_float(w.get("temperature_2m_max"))
-        out[i, 4] = _to_float(w.get("precipitation_sum"))
-        out[i, 5] = _to_float(w.get("precipitation_probability_max"))
-        out[i, 6] = _to_float(w.get("snowfall_sum"))
-        out[i, 7] = _to_float(w.get("wind_speed_10m_max"))
-        out[i, 8] = _to_float(w.get("wind_gusts_10m_max"))
-        out[i, 9] = _to_float(w.get("visibility_min"))
-        out[i, 10] = _to_float(w.get("weathercode"))
-
-    return out
+    return asyncio.run(
+        weather_for_route_to_numpy_async(
+            coords,
+            date_yyyy_mm_dd,
+            concurrency=concurrency,
+            rate_per_sec=rate_per_sec,
+            batch_size=batch_size,
+            use_cache=use_cache,
+        )
+    )
+
+
+def weather_for_route_timed_to_numpy(
+    coords: List[Coord],
+    offsets_s: Any,
+    departure: datetime,
+    **kwargs: Any,
+) -> np.ndarray:
+    """Sync wrapper of weather_for_route_timed_to_numpy_async."""
+    return asyncio.run(weather_for_route_timed_to_numpy_async(coords, offsets_s, departure, **kwargs))
 
 
 def _to_float(x: Any) -> float:
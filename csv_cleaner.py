@@ -1,54 +1,442 @@
+import io
+import os
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
-# Load the raw shipping data
-df = pd.read_csv('DataCoSupplyChainDataset.csv', encoding='latin-1')
-
-# 1. Create shipment_id using row index
-df['shipment_id'] = df.index + 1
-
-# 2. Compute delay_factor
-# Delay factor = (actual days - scheduled days) / scheduled days
-# If actual > scheduled, it's delayed; otherwise it's on time
-df['delay_days'] = df['Days for shipping (real)'] - df['Days for shipment (scheduled)']
-df['delay_days'] = df['delay_days'].clip(lower=0)
-df['delay_factor'] = df['delay_days'] / df['Days for shipment (scheduled)']
-# Clamp negative values (early deliveries) to 0
-df['delay_factor'] = df['delay_factor'].clip(lower=0)
-
-# 3. Compute congestion_factor
-# Based on product category - could be based on order volume per category
-category_counts = df['Category Name'].value_counts()
-df['congestion_factor'] = df['Category Name'].map(
-    lambda x: category_counts[x] / category_counts.max()
+from weather_index import (
+    WEATHER_FEATURES, WeatherIndex, build_weather_index, rebuild_weather_index, stale_sources, to_epoch_days,
 )
 
-# 4. Assign distance_factor
-# Simple approach: based on customer location uniqueness
-# Normalize by number of unique locations
-location_counts = df.groupby('Customer City').size()
-df['distance_factor'] = df['Customer City'].map(
-    lambda x: location_counts[x] / location_counts.max()
-)
+# Default input / output files (CLI defaults)
+INPUT_CSV = 'DataCoSupplyChainDataset.csv'
+WEATHER_CSV = 'weather.csv'
+WEATHER_INDEX = 'weather_index'  # .npy/.json pair, built from WEATHER_CSV if missing
+OUTPUT_CSV = 'cleaned_dataset.csv'
+INPUT_ENCODING = 'latin-1'
+
+# Rows per chunk; memory use is bounded by this, not by the file size
+CHUNK_ROWS = 250_000
+
+# Only these input columns are read
+CATEGORY_COLUMNS = ['Customer City', 'Category Name', 'Shipping Mode', 'Delivery Status']
+NUMERIC_DTYPES = {
+    'Order Id': 'Int64',
+    'Days for shipping (real)': 'Int64',
+    'Days for shipment (scheduled)': 'Int64',
+}
+# Weather is looked up for the customer city on the shipping date
+WEATHER_DATE_COLUMN = 'shipping date (DateOrders)'
+WEATHER_DATE_FORMAT = '%m/%d/%Y %H:%M'
+SOURCE_COLUMNS = list(NUMERIC_DTYPES) + CATEGORY_COLUMNS + [WEATHER_DATE_COLUMN]
 
-# 5. Join weather data (if weather file exists)
-try:
-    weather_df = pd.read_csv('weather.csv')
-    # Merge on customer city/date if available
-    df = df.merge(weather_df, left_on='Customer City', right_on='city', how='left')
-except FileNotFoundError:
-    print("Warning: weather.csv not found. Skipping weather join.")
-    # Create placeholder weather columns
-    df['weather'] = 'Unknown'
-    df['temperature'] = np.nan
-    df['precipitation'] = np.nan
-
-# 6. Select only needed columns and write output to input_to_c.csv
 columns_to_keep = [
     'shipment_id', 'delay_days', 'delay_factor', 'congestion_factor', 'distance_factor',
     'Order Id', 'Customer City', 'Category Name', 'Shipping Mode', 'Delivery Status'
-]
-df_output = df[columns_to_keep]
-output_csv = 'cleaned_dataset.csv'
-df_output.to_csv(output_csv, index=False)
\ No newline at end of file
+] + WEATHER_FEATURES
+
+
+def read_chunks(source, dtype=None, chunk_rows=CHUNK_ROWS, names=None):
+    """
+    Chunked read of just SOURCE_COLUMNS from a path or text file object.
+    Pass the header's column `names` when `source` starts after the header line.
+    """
+    return pd.read_csv(
+        source,
+        encoding=INPUT_ENCODING,
+        usecols=SOURCE_COLUMNS,
+        dtype=dtype or {**NUMERIC_DTYPES, **{c: 'str' for c in CATEGORY_COLUMNS}, WEATHER_DATE_COLUMN: 'str'},
+        chunksize=chunk_rows,
+        header=None if names is not None else 'infer',
+        names=names,
+    )
+
+
+def partial_counts(chunks):
+    """Row count and per-column value counts of CATEGORY_COLUMNS over `chunks`."""
+    rows = 0
+    counts = {c: pd.Series(dtype='int64') for c in CATEGORY_COLUMNS}
+    for chunk in chunks:
+        rows += len(chunk)
+        for c in CATEGORY_COLUMNS:
+            counts[c] = counts[c].add(chunk[c].value_counts(), fill_value=0)
+    return rows, counts
+
+
+def merge_counts(partials):
+    """Sum per-partition value counts from partial_counts."""
+    merged = {c: pd.Series(dtype='int64') for c in CATEGORY_COLUMNS}
+    for counts in partials:
+        for c in CATEGORY_COLUMNS:
+            merged[c] = merged[c].add(counts[c], fill_value=0)
+    return {c: s.astype('int64') for c, s in merged.items()}
+
+
+def count_categories(path, chunk_rows=CHUNK_ROWS):
+    """
+    Pass 1: value counts of every CATEGORY_COLUMNS column over the whole file.
+    Returns {column: pd.Series of counts}.
+    """
+    _, counts = partial_counts(read_chunks(path, chunk_rows=chunk_rows))
+    return merge_counts([counts])
+
+
+def build_dtypes(counts):
+    """
+    Explicit read dtypes for pass 2. Categories come from pass 1, so every
+    chunk shares the same categorical dtype (and Parquet dictionary schema).
+    """
+    dtypes = {**NUMERIC_DTYPES, WEATHER_DATE_COLUMN: 'str'}
+    for c in CATEGORY_COLUMNS:
+        dtypes[c] = pd.CategoricalDtype(categories=sorted(counts[c].index))
+    return dtypes
+
+
+def relative_frequency(counts):
+    # count / max count, as a plain dict for a vectorised Series.map
+    top = counts.max() if len(counts) else 1
+    return (counts / top).to_dict()
+
+
+def open_weather_index(index_path=WEATHER_INDEX, weather_csv=WEATHER_CSV):
+    """
+    The (city, day) weather index at `index_path`, building it from
+    `weather_csv` the first time and rebuilding it when one of its source
+    files changed. None (weather columns left empty) if neither exists.
+    """
+    if index_path and WeatherIndex.exists(index_path):
+        stale = stale_sources(index_path)
+        if stale:
+            print(f"Weather index {index_path} is older than {', '.join(stale)}; rebuilding.")
+            rebuild_weather_index(index_path)
+        return WeatherIndex.open(index_path)
+    if index_path and weather_csv and os.path.exists(weather_csv):
+        build_weather_index(index_path, weather_csv=weather_csv)
+        return WeatherIndex.open(index_path)
+    print("Warning: no weather index or weather.csv found. Weather columns will be empty.")
+    return None
+
+
+def weather_features(df, index):
+    """(rows, features) float32 weather for each row's customer city on its shipping date."""
+    if index is None:
+        return np.full((len(df), len(WEATHER_FEATURES)), np.nan, dtype=np.float32)
+    city = df['Customer City']
+    # City id per category, plus -1 at the end for missing cities (code -1)
+    lookup = np.append(index.city_ids(city.cat.categories), -1)
+    ids = lookup[city.cat.codes.to_numpy()]
+    days = to_epoch_days(df[WEATHER_DATE_COLUMN], WEATHER_DATE_FORMAT)
+    return index.gather(ids, days)
+
+
+def clean_chunk(df, first_id, congestion, distance, weather=None):
+    """Steps 1-5 for one chunk; `first_id` is the shipment_id of its first row."""
+    # 1. Create shipment_id using the global row number
+    df['shipment_id'] = np.arange(first_id, first_id + len(df), dtype=np.int64)
+
+    # 2. Compute delay_factor
+    # Delay factor = (actual days - scheduled days) / scheduled days
+    # If actual > scheduled, it's delayed; otherwise it's on time
+    df['delay_days'] = df['Days for shipping (real)'] - df['Days for shipment (scheduled)']
+    df['delay_days'] = df['delay_days'].clip(lower=0)
+    scheduled = df['Days for shipment (scheduled)'].astype('float64')
+    df['delay_factor'] = df['delay_days'].astype('float64') / scheduled
+    # Clamp negative values (early deliveries) to 0
+    df['delay_factor'] = df['delay_factor'].clip(lower=0)
+
+    # 3. congestion_factor: category order volume relative to the busiest category
+    df['congestion_factor'] = df['Category Name'].map(congestion).astype('float64')
+
+    # 4. distance_factor: customer city frequency relative to the most common city
+    df['distance_factor'] = df['Customer City'].map(distance).astype('float64')
+
+    # 5. Weather for (customer city, shipping date): integer gathers from the memory-mapped index
+    features = weather_features(df, weather)
+    for k, name in enumerate(WEATHER_FEATURES):
+        df[name] = features[:, k]
+
+    return df[columns_to_keep]
+
+
+class _ParquetSink:
+    """Appends chunks to one Parquet file (needs pyarrow)."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self._writer = None
+
+    def write(self, df):
+        table = self._pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _CsvSink:
+    """Appends chunks to one CSV file, header first."""
+
+    def __init__(self, path):
+        self.path = path
+        self._first = True
+
+    def write(self, df):
+        df.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._first:
+            # No rows: still write the header
+            pd.DataFrame(columns=columns_to_keep).to_csv(self.path, index=False)
+
+
+def open_sink(path, output_format=None):
+    """CSV or Parquet writer, by `output_format` or the file extension."""
+    fmt = output_format or ('parquet' if str(path).endswith(('.parquet', '.pq')) else 'csv')
+    if fmt == 'parquet':
+        return _ParquetSink(path)
+    if fmt == 'csv':
+        return _CsvSink(path)
+    raise ValueError(f"Unknown output format: {fmt}")
+
+
+def clean_dataset(input_csv, output_path, weather_csv=WEATHER_CSV, output_format=None,
+                  chunk_rows=CHUNK_ROWS, workers=1, keep_shards=False, weather_index=WEATHER_INDEX):
+    """
+    Clean `input_csv` into `output_path` (CSV, or Parquet by extension /
+    `output_format`). Returns the number of rows written.
+
+    Two streaming passes:
+      1. category / city frequency tables (and row counts)
+      2. per chunk: derived columns via dict maps on categoricals and weather
+         gathered from the (city, day) index, appended to the output
+
+    `weather_index` is the WeatherIndex path; it is built from `weather_csv`
+    when missing (see weather_index.py).
+
+    With workers > 1 the input is split into `workers` byte ranges on line
+    boundaries; both passes run in a process pool, partial counts are merged
+    between them, and each partition writes its own shard
+    (<output stem>.part-NNNNN<suffix>). Shards are then joined into
+    `output_path` unless `keep_shards` is set. Output is identical to the
+    single-process run. Byte-range splitting assumes no quoted field spans
+    lines (true for the DataCo exports).
+    """
+    if workers is None or workers < 1:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return _clean_sequential(input_csv, output_path, weather_csv, weather_index, output_format, chunk_rows)
+    return _clean_parallel(input_csv, output_path, weather_csv, weather_index, output_format, chunk_rows,
+                           workers, keep_shards)
+
+
+def _clean_sequential(input_csv, output_path, weather_csv, weather_index, output_format, chunk_rows):
+    # Fails fast (before pass 1) if Parquet is asked for without pyarrow
+    sink = open_sink(output_path, output_format)
+
+    counts = count_categories(input_csv, chunk_rows)
+    congestion = relative_frequency(counts['Category Name'])
+    distance = relative_frequency(counts['Customer City'])
+    weather = open_weather_index(weather_index, weather_csv)
+
+    next_id = 1
+    written = 0
+    try:
+        for chunk in read_chunks(input_csv, dtype=build_dtypes(counts), chunk_rows=chunk_rows):
+            n = len(chunk)
+            out = clean_chunk(chunk, next_id, congestion, distance, weather)
+            sink.write(out)
+            next_id += n
+            written += len(out)
+    finally:
+        sink.close()
+    return written
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        self._f = open(path, 'rb')
+        self._f.seek(start)
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._left <= 0:
+            return 0
+        n = self._f.readinto(memoryview(b)[:min(len(b), self._left)])
+        self._left -= n
+        return n
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def _open_range(path, start, end):
+    return io.TextIOWrapper(io.BufferedReader(_ByteRange(path, start, end)), encoding=INPUT_ENCODING, newline='')
+
+
+def partition_file(path, parts):
+    """
+    Header column names and `parts` line-aligned (start, end) byte ranges
+    covering everything after the header line. Empty ranges are dropped.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        bounds = [data_start]
+        for i in range(1, parts):
+            pos = max(data_start + (size - data_start) * i // parts, bounds[-1])
+            # A line belongs to the range holding its first byte
+            f.seek(pos - 1)
+            f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+        bounds.append(size)
+    names = list(pd.read_csv(io.StringIO(header.decode(INPUT_ENCODING)), nrows=0).columns)
+    ranges = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    return names, ranges
+
+
+def _count_partition(path, start, end, names, chunk_rows):
+    with _open_range(path, start, end) as f:
+        return partial_counts(read_chunks(f, chunk_rows=chunk_rows, names=names))
+
+
+def _clean_partition(path, start, end, names, chunk_rows, dtypes, first_id,
+                     congestion, distance, weather_index, shard_path, output_format):
+    sink = open_sink(shard_path, output_format)
+    # Each worker maps the same index file; pages are shared through the OS cache
+    weather = WeatherIndex.open(weather_index) if weather_index else None
+    next_id = first_id
+    written = 0
+    try:
+        with _open_range(path, start, end) as f:
+            for chunk in read_chunks(f, dtype=dtypes, chunk_rows=chunk_rows, names=names):
+                n = len(chunk)
+                out = clean_chunk(chunk, next_id, congestion, distance, weather)
+                sink.write(out)
+                next_id += n
+                written += len(out)
+    finally:
+        sink.close()
+    return written
+
+
+def shard_path(output_path, index):
+    p = Path(output_path)
+    return str(p.with_name(f"{p.stem}.part-{index:05d}{p.suffix}"))
+
+
+def _clean_parallel(input_csv, output_path, weather_csv, weather_index, output_format, chunk_rows,
+                    workers, keep_shards):
+    fmt = output_format or ('parquet' if str(output_path).endswith(('.parquet', '.pq')) else 'csv')
+    open_sink(output_path, fmt)  # fail fast on a missing Parquet dependency
+
+    names, ranges = partition_file(input_csv, workers)
+    # Built (if needed) once here; workers only open it
+    if open_weather_index(weather_index, weather_csv) is None:
+        weather_index = None
+
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(ranges), 1))) as pool:
+        # Pass 1: partial counts per partition, merged here
+        futures = [pool.submit(_count_partition, input_csv, a, b, names, chunk_rows) for a, b in ranges]
+        partials = [fut.result() for fut in futures]
+        counts = merge_counts([c for _, c in partials])
+        congestion = relative_frequency(counts['Category Name'])
+        distance = relative_frequency(counts['Customer City'])
+        dtypes = build_dtypes(counts)
+
+        # Pass 2: each partition writes its shard; ids continue across partitions
+        first_ids = np.concatenate(([1], 1 + np.cumsum([rows for rows, _ in partials]))).tolist()
+        shards = [shard_path(output_path, i) for i in range(len(ranges))]
+        futures = [
+            pool.submit(_clean_partition, input_csv, a, b, names, chunk_rows, dtypes, first_ids[i],
+                        congestion, distance, weather_index, shards[i], fmt)
+            for i, (a, b) in enumerate(ranges)
+        ]
+        written = sum(fut.result() for fut in futures)
+
+    if not keep_shards:
+        join_shards(shards, output_path, fmt)
+        for shard in shards:
+            os.remove(shard)
+    return written
+
+
+def join_shards(shards, output_path, output_format):
+    """Concatenate shard files in order into one output file."""
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            # One row group at a time, so memory stays at chunk size
+            for shard in shards:
+                pf = pq.ParquetFile(shard)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, pf.schema_arrow)
+                for i in range(pf.num_row_groups):
+                    writer.write_table(pf.read_row_group(i))
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    with open(output_path, 'wb') as out:
+        for i, shard in enumerate(shards):
+            with open(shard, 'rb') as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out, 1 << 20)
+    if not shards:
+        _CsvSink(output_path).close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean a DataCo supply-chain export for the C risk model.")
+    parser.add_argument('input', nargs='?', default=INPUT_CSV)
+    parser.add_argument('output', nargs='?', default=OUTPUT_CSV, help="CSV, or .parquet (needs pyarrow)")
+    parser.add_argument('--weather', default=WEATHER_CSV, help="weather CSV with city, date and feature columns")
+    parser.add_argument('--weather-index', default=WEATHER_INDEX, help="(city, day) weather index path, built if missing")
+    parser.add_argument('--format', choices=['csv', 'parquet'], help="output format (default: by extension)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=1, help="processes (0 = all cores)")
+    parser.add_argument('--keep-shards', action='store_true', help="leave per-partition shards instead of joining them")
+    args = parser.parse_args(argv)
+
+    start = datetime.now()
+    rows = clean_dataset(
+        args.input,
+        args.output,
+        weather_csv=args.weather,
+        weather_index=args.weather_index,
+        output_format=args.format,
+        chunk_rows=args.chunk_rows,
+        workers=args.workers,
+        keep_shards=args.keep_shards,
+    )
+    print(f"Wrote {rows} rows to {args.output} in {(datetime.now() - start).total_seconds():.1f}s")
+
+
+if __name__ == '__main__':
+    main()
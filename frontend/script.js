@@ -1,3 +1,5 @@
+const API_BASE = "http://localhost:8000";
+
 const chatBody = document.getElementById("chatBody");
 const chatForm = document.getElementById("chatForm");
 const chatInput = document.getElementById("chatInput");
@@ -9,9 +11,10 @@ const tplBotMsg  = document.getElementById("tplBotMsg");
 const fromCityEl = document.getElementById("fromCity");
 const toCityEl   = document.getElementById("toCity");
 const shipDateEl = document.getElementById("shipDate");
+const riskScoreEl = document.getElementById("riskScore");
 
-// Conversation memory (sent to backend each turn)
-const messages = [];
+// Server-side session (conversation + shipment state live on the backend)
+let sessionId = null;
 
 // Latest canonical shipment state
 let shipmentState = {
@@ -44,11 +47,81 @@ function appendBot(text) {
   scrollToBottom();
 }
 
-async function callBackend(messagesSoFar) {
-  const res = await fetch("http://localhost:8000/chat", {
+// Empty bot bubble whose text is filled in as reply tokens arrive
+function appendBotStreaming() {
+  const node = tplBotMsg.content.cloneNode(true);
+  const textEl = node.querySelector(".bubble-text");
+  textEl.textContent = "";
+  chatBody.appendChild(node);
+  scrollToBottom();
+  return textEl;
+}
+
+function renderRisk(text) {
+  riskScoreEl.textContent = text;
+}
+
+function showAnalysis(job) {
+  if (job.status === "done" && job.result) {
+    const { risk_score, risk_level } = job.result;
+    renderRisk(`${risk_score}/100 (${risk_level})`);
+    appendBot(`Route risk: ${risk_score}/100 (${risk_level}).`);
+  } else {
+    renderRisk("—");
+    appendBot("I couldn’t run route analysis right now (service error).");
+  }
+}
+
+// Follow a background analysis job: SSE stream, falling back to polling
+let analysisStream = null;
+
+function watchAnalysis(job) {
+  if (analysisStream) analysisStream.close();
+  renderRisk("checking…");
+
+  if (!window.EventSource) {
+    pollAnalysis(job.id);
+    return;
+  }
+
+  const es = new EventSource(`${API_BASE}/analysis/${job.id}/events`);
+  analysisStream = es;
+  es.addEventListener("result", (e) => {
+    es.close();
+    if (analysisStream === es) analysisStream = null;
+    showAnalysis(JSON.parse(e.data));
+  });
+  es.onerror = () => {
+    if (es.readyState === EventSource.CLOSED || analysisStream !== es) return;
+    es.close();
+    analysisStream = null;
+    pollAnalysis(job.id);
+  };
+}
+
+async function pollAnalysis(jobId, intervalMs = 1000, maxTries = 90) {
+  for (let i = 0; i < maxTries; i++) {
+    try {
+      const res = await fetch(`${API_BASE}/analysis/${jobId}`);
+      if (!res.ok) break;
+      const job = await res.json();
+      if (job.status === "done" || job.status === "error") {
+        showAnalysis(job);
+        return;
+      }
+    } catch (err) {
+      console.error(err);
+    }
+    await new Promise((r) => setTimeout(r, intervalMs));
+  }
+  showAnalysis({ status: "error" });
+}
+
+async function callBackend(message) {
+  const res = await fetch(`${API_BASE}/chat`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ messages: messagesSoFar })
+    body: JSON.stringify({ session_id: sessionId, message })
   });
 
   if (!res.ok) {
@@ -56,11 +129,66 @@ async function callBackend(messagesSoFar) {
     throw new Error(`Backend error ${res.status}: ${txt}`);
   }
 
-  return await res.json(); // { reply, shipment, (optional error) }
+  return await res.json(); // { reply, shipment, session_id, analysis_job, (optional error) }
+}
+
+// POST /chat/stream and dispatch its Server-Sent Events to handlers[event](data)
+async function streamBackend(message, handlers) {
+  const res = await fetch(`${API_BASE}/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ session_id: sessionId, message })
+  });
+
+  if (!res.ok || !res.body) {
+    const txt = await res.text();
+    throw new Error(`Backend error ${res.status}: ${txt}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line; keep any partial event for the next read
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) >= 0) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = "message";
+      const data = [];
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data.push(line.slice(6));
+      }
+      if (data.length && handlers[event]) handlers[event](JSON.parse(data.join("\n")));
+    }
+  }
+}
+
+function updateShipment(shipment) {
+  shipmentState = {
+    ship_from_city: shipment.ship_from_city ?? null,
+    ship_to_city: shipment.ship_to_city ?? null,
+    ship_date: shipment.ship_date ?? null
+  };
+  renderShipment();
 }
 
 let inFlight = false;
 
+function setInputLocked(locked) {
+  inFlight = locked;
+  chatInput.disabled = locked;
+  chatForm.querySelector("button[type='submit']").disabled = locked;
+  if (!locked) chatInput.focus();
+}
+
 chatForm.addEventListener("submit", async (e) => {
   e.preventDefault();
   if (inFlight) return;
@@ -68,42 +196,70 @@ chatForm.addEventListener("submit", async (e) => {
   const text = chatInput.value.trim();
   if (!text) return;
 
-  // record + render user
-  messages.push({ role: "user", content: text });
+  // render user
   appendUser(text);
   chatInput.value = "";
 
-  inFlight = true;
-  chatInput.disabled = true;
-  chatForm.querySelector("button[type='submit']").disabled = true;
+  setInputLocked(true);
+  // Unlock once per turn (early on streamed replies, else when the request ends)
+  let released = false;
+  const release = () => {
+    if (!released) {
+      released = true;
+      setInputLocked(false);
+    }
+  };
 
   try {
-    const result = await callBackend(messages);
-
-    // render bot reply
-    const reply = result.reply || "Temporary issue. Try again.";
-    messages.push({ role: "assistant", content: reply });
-    appendBot(reply);
-
-    // update shipment state
-    if (result.shipment) {
-      shipmentState = {
-        ship_from_city: result.shipment.ship_from_city ?? null,
-        ship_to_city: result.shipment.ship_to_city ?? null,
-        ship_date: result.shipment.ship_date ?? null
-      };
-      renderShipment();
-      console.log("analysis:", result.analysis);
+    if (window.ReadableStream && window.TextDecoder) {
+      // Streamed: reply text renders token by token, risk arrives on the same stream
+      let replyEl = null;
+      await streamBackend(text, {
+        session: (d) => { sessionId = d.session_id; },
+        token: (d) => {
+          if (!replyEl) replyEl = appendBotStreaming();
+          replyEl.textContent += d.text;
+          scrollToBottom();
+        },
+        reply: (d) => {
+          if (!replyEl) replyEl = appendBotStreaming();
+          replyEl.textContent = d.reply || "Temporary issue. Try again.";
+          // The stream stays open for the risk result; the user can type again now
+          release();
+        },
+        shipment: (d) => updateShipment(d.shipment),
+        analysis_job: () => {
+          if (analysisStream) analysisStream.close();
+          renderRisk("checking…");
+        },
+        analysis: (job) => showAnalysis(job),
+        error: (d) => {
+          if (!replyEl) replyEl = appendBotStreaming();
+          replyEl.textContent = d.reply;
+          if (d.shipment) updateShipment(d.shipment);
+        }
+      });
+    } else {
+      const result = await callBackend(text);
+      if (result.session_id) sessionId = result.session_id;
+
+      // render bot reply
+      appendBot(result.reply || "Temporary issue. Try again.");
+
+      // update shipment state
+      if (result.shipment) updateShipment(result.shipment);
+
+      // risk score arrives later from the background job
+      if (result.analysis_job) {
+        watchAnalysis(result.analysis_job);
+      }
     }
 
   } catch (err) {
     console.error(err);
     appendBot("Temporary connection issue. Send again.");
   } finally {
-    inFlight = false;
-    chatInput.disabled = false;
-    chatForm.querySelector("button[type='submit']").disabled = false;
-    chatInput.focus();
+    release();
   }
 });
 
@@ -0,0 +1,23 @@
+import numpy as np
+
+from csv_cleaner import open_weather_index
+from weather_index import stale_sources, to_epoch_days
+
+
+def test_index_rebuilt_when_csv_changes(tmp_path):
+    weather_csv = tmp_path / 'weather.csv'
+    weather_csv.write_text('city,date,temperature\nLeeds,2026-01-01,3\n', encoding='utf-8')
+    path = tmp_path / 'index'
+
+    index = open_weather_index(path, weather_csv)
+    assert stale_sources(path) == []
+    assert index.city_ids(['York'])[0] == -1
+
+    with open(weather_csv, 'a', encoding='utf-8') as f:
+        f.write('York,2026-01-02,5\n')
+    assert stale_sources(path) == [str(weather_csv.resolve())]
+
+    index = open_weather_index(path, weather_csv)
+    assert stale_sources(path) == []
+    day = to_epoch_days(['2026-01-02'])
+    assert index.gather(index.city_ids(['York']), day)[0, 0] == np.float32(5)
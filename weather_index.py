@@ -0,0 +1,260 @@
+import os
+import sys
+import csv
+import json
+import sqlite3
+import argparse
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# The backend modules are imported by bare name; appended so they never shadow this directory's
+BACKEND_DIR = Path(__file__).resolve().parent / 'backend'
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.append(str(BACKEND_DIR))
+
+from geocode import normalise_place  # noqa: E402
+from weather_cache import DAILY_VARS, grid_cell  # noqa: E402
+
+# Features stored per (city, day), in this order
+WEATHER_FEATURES = ['temperature', 'precipitation', 'wind_speed', 'weathercode']
+
+CHUNK_ROWS = 250_000
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def to_epoch_days(values, fmt=None):
+    """Parse dates to int64 days since 1970-01-01; unparseable values become -1."""
+    dt = pd.to_datetime(pd.Series(values), format=fmt, errors='coerce')
+    days = dt.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    days[dt.isna().to_numpy()] = -1
+    return days
+
+
+class WeatherIndex:
+    """
+    Daily weather features in a memory-mapped float32 array of shape
+    (cities, days, len(WEATHER_FEATURES)), addressed by (city id, day ordinal).
+
+    Files: <path>.npy (the array) and <path>.json (city names, first day,
+    feature names, source files). Missing values are NaN. Lookups are integer-array
+    gathers, so attaching weather to N rows is O(N) with no join tables.
+    """
+
+    def __init__(self, data, cities, day0, features=WEATHER_FEATURES):
+        self.data = data
+        self.cities = list(cities)
+        self.day0 = int(day0)  # days since 1970-01-01 of data[:, 0]
+        self.features = list(features)
+        self._ids = {normalise_place(c): i for i, c in enumerate(self.cities)}
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        path = Path(path)
+        meta = json.loads(path.with_suffix('.json').read_text(encoding='utf-8'))
+        data = np.load(path.with_suffix('.npy'), mmap_mode=mode)
+        return cls(data, meta['cities'], meta['day0'], meta['features'])
+
+    @staticmethod
+    def exists(path):
+        path = Path(path)
+        return path.with_suffix('.npy').exists() and path.with_suffix('.json').exists()
+
+    @property
+    def n_days(self):
+        return self.data.shape[1]
+
+    def city_ids(self, names):
+        """int64 city id per name, -1 for cities not in the index."""
+        return np.array([self._ids.get(normalise_place(n), -1) if isinstance(n, str) else -1 for n in names], dtype=np.int64)
+
+    def gather(self, city_ids, epoch_days):
+        """
+        Features for each (city id, day) pair as a (n, features) float32 array;
+        rows with an unknown city or a day outside the index are NaN.
+        """
+        city_ids = np.asarray(city_ids, dtype=np.int64)
+        day = np.asarray(epoch_days, dtype=np.int64) - self.day0
+        ok = (city_ids >= 0) & (day >= 0) & (day < self.n_days)
+        out = np.full((len(city_ids), len(self.features)), np.nan, dtype=np.float32)
+        out[ok] = self.data[city_ids[ok], day[ok]]
+        return out
+
+
+def _stamp(path):
+    """Source file record stored in the index metadata (path, mtime, size)."""
+    st = os.stat(path)
+    return {'path': str(Path(path).resolve()), 'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def index_sources(path):
+    """{kind: stamp} of the files the index at `path` was built from ('csv', 'cache_db', 'cities')."""
+    meta = json.loads(Path(path).with_suffix('.json').read_text(encoding='utf-8'))
+    return meta.get('sources', {})
+
+
+def stale_sources(path):
+    """
+    Source files of the index at `path` whose mtime or size changed since it
+    was built. Sources that no longer exist are ignored (nothing to rebuild from).
+    """
+    stale = []
+    for old in index_sources(path).values():
+        try:
+            if _stamp(old['path']) != old:
+                stale.append(old['path'])
+        except OSError:
+            pass
+    return stale
+
+
+def rebuild_weather_index(path):
+    """Rebuild the index at `path` from the sources recorded in its metadata."""
+    sources = index_sources(path)
+    csv_path = sources.get('csv', {}).get('path')
+    cache_db = sources.get('cache_db', {}).get('path')
+    cities = sources.get('cities', {}).get('path')
+    return build_weather_index(path, csv_path, cache_db, cities_csv=cities)
+
+
+def load_city_coords(path):
+    """{name: (lat, lon)} from a CSV with name, lat, lon and optional |-separated aliases (after their name)."""
+    coords = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            latlon = (float(row['lat']), float(row['lon']))
+            for n in [row['name']] + [a for a in (row.get('aliases') or '').split('|') if a]:
+                coords.setdefault(n, latlon)
+    return coords
+
+
+def _csv_chunks(weather_csv, chunk_rows):
+    return pd.read_csv(weather_csv, chunksize=chunk_rows)
+
+
+def _cache_rows(cache_db, city_cells):
+    """(city name, epoch day, features) from the weather_cache SQLite tier, for {name: cache cell}."""
+    con = sqlite3.connect(str(cache_db))
+    try:
+        for name, cell in city_cells.items():
+            rows = con.execute(
+                'SELECT date, payload FROM weather_cache WHERE cell_lat=? AND cell_lon=?', cell
+            ).fetchall()
+            for day, payload in rows:
+                v = dict(zip(DAILY_VARS, json.loads(payload)))
+                t = [x for x in (v.get('temperature_2m_min'), v.get('temperature_2m_max')) if x is not None]
+                feats = [
+                    sum(t) / len(t) if t else None,
+                    v.get('precipitation_sum'),
+                    v.get('wind_speed_10m_max'),
+                    v.get('weathercode'),
+                ]
+                yield name, date.fromisoformat(day).toordinal() - _EPOCH, feats
+    finally:
+        con.close()
+
+
+def build_weather_index(path, weather_csv=None, cache_db=None, city_coords=None, chunk_rows=CHUNK_ROWS,
+                        cities_csv=None):
+    """
+    Build <path>.npy / <path>.json from a weather CSV (columns city, date and
+    any of WEATHER_FEATURES) and/or the weather_on_route cache's SQLite tier.
+
+    Cache entries are matched to cities through `city_coords` ({name: (lat, lon)},
+    see load_city_coords; read from `cities_csv` if not given): every CSV city
+    with coordinates, plus the first listed name for each other cache cell.
+    They only fill values the CSV left empty. The CSV is read twice in chunks
+    (extent, then values). The source files' mtime and size are stored in the
+    .json so stale_sources can tell when to rebuild; returns the index.
+    """
+    # Stamped before reading, so a source changing mid-build counts as stale
+    sources = {kind: _stamp(p) for kind, p in
+               (('csv', weather_csv), ('cache_db', cache_db), ('cities', cities_csv)) if p is not None}
+    if city_coords is None and cities_csv is not None:
+        city_coords = load_city_coords(cities_csv)
+    coords = {normalise_place(n): ll for n, ll in reversed(list((city_coords or {}).items()))}
+    cities = {}
+    lo, hi = None, None
+
+    def see(day_min, day_max):
+        nonlocal lo, hi
+        lo = day_min if lo is None else min(lo, day_min)
+        hi = day_max if hi is None else max(hi, day_max)
+
+    # Pass 1: cities and date extent
+    if weather_csv is not None:
+        for chunk in _csv_chunks(weather_csv, chunk_rows):
+            days = to_epoch_days(chunk['date'])
+            valid = days >= 0
+            for c in chunk['city'][valid].dropna().unique():
+                cities.setdefault(normalise_place(str(c)), str(c))
+            if valid.any():
+                see(int(days[valid].min()), int(days[valid].max()))
+    cache_rows = []
+    if cache_db is not None:
+        city_cells = {n: grid_cell(*coords[k]) for k, n in cities.items() if k in coords}
+        used = set(city_cells.values())
+        for name, latlon in (city_coords or {}).items():
+            cell = grid_cell(*latlon)
+            if normalise_place(name) not in cities and cell not in used:
+                city_cells[name] = cell
+                used.add(cell)
+        cache_rows = list(_cache_rows(cache_db, city_cells))
+        for name, day, _ in cache_rows:
+            cities.setdefault(normalise_place(name), name)
+            see(day, day)
+
+    names = list(cities.values())
+    n_days = (hi - lo + 1) if lo is not None else 0
+    path = Path(path)
+    data = np.lib.format.open_memmap(
+        path.with_suffix('.npy'), mode='w+', dtype=np.float32,
+        shape=(len(names), n_days, len(WEATHER_FEATURES)),
+    )
+    data[:] = np.nan
+    index = WeatherIndex(data, names, lo if lo is not None else 0)
+
+    # Pass 2: scatter values by (city id, day)
+    if weather_csv is not None:
+        for chunk in _csv_chunks(weather_csv, chunk_rows):
+            ids = index.city_ids(chunk['city'])
+            day = to_epoch_days(chunk['date']) - index.day0
+            ok = (ids >= 0) & (day >= 0) & (day < n_days)
+            for k, feat in enumerate(WEATHER_FEATURES):
+                if feat in chunk:
+                    data[ids[ok], day[ok], k] = pd.to_numeric(chunk[feat], errors='coerce').to_numpy(np.float32)[ok]
+    if cache_rows:
+        ids = index.city_ids([r[0] for r in cache_rows])
+        day = np.array([r[1] for r in cache_rows], dtype=np.int64) - index.day0
+        values = np.array([[np.nan if x is None else x for x in r[2]] for r in cache_rows], dtype=np.float32)
+        current = data[ids, day]
+        data[ids, day] = np.where(np.isnan(current), values, current)
+
+    data.flush()
+    path.with_suffix('.json').write_text(
+        json.dumps({'cities': names, 'day0': index.day0, 'features': WEATHER_FEATURES, 'sources': sources}),
+        encoding='utf-8',
+    )
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the (city, day) weather index used by csv_cleaner.")
+    parser.add_argument('output', help="index path without extension (writes .npy and .json)")
+    parser.add_argument('--csv', help="weather CSV with city, date and feature columns")
+    parser.add_argument('--cache-db', help="weather_on_route cache SQLite file (WEATHER_CACHE_DB)")
+    parser.add_argument('--cities', default=str(Path(__file__).resolve().parent / 'backend' / 'data' / 'uk_cities.csv'),
+                        help="CSV of city name, lat, lon used to match cache cells to cities")
+    args = parser.parse_args(argv)
+    if not args.csv and not args.cache_db:
+        parser.error("give --csv and/or --cache-db")
+
+    cities = args.cities if args.cache_db else None
+    index = build_weather_index(args.output, args.csv, args.cache_db, cities_csv=cities)
+    print(f"Indexed {len(index.cities)} cities x {index.n_days} days to {Path(args.output).with_suffix('.npy')}")
+
+
+if __name__ == '__main__':
+    main()